@@ -1,7 +1,18 @@
 """
 Paquete principal de la aplicación FastAPI
+
+``app`` y ``THRESHOLD`` se cargan bajo demanda: los procesos del pool de
+features importan ``app.features`` sin cargar la API, el engine de base de
+datos ni el registro de modelos.
 """
-from .api import app
-from .ml_service import THRESHOLD
+__all__ = ["app", "THRESHOLD"]
+
 
-__all__ = ["app", "THRESHOLD"] 
\ No newline at end of file
+def __getattr__(name):
+    if name == "app":
+        from .api import app
+        return app
+    if name == "THRESHOLD":
+        from .ml_service import THRESHOLD
+        return THRESHOLD
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
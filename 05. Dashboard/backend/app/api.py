@@ -1,21 +1,42 @@
 """
 API FastAPI para el dashboard de predicción de seguros
 """
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import logging
 import os
+import asyncio
+import math
+import secrets
 import numpy as np
-from sqlalchemy import select, update, func, desc, text
+from sqlalchemy import select, update, func, desc, text, true, tuple_
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi import FastAPI, Depends, HTTPException, Query, Path, status, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, Query, Path, status, APIRouter, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from .database import get_db, Client, Prediction, Contact
-from .schemas import ClientOut, StatusIn, KPISummary, ClienteDetalle
-from .ml_service import THRESHOLD
+from .database import get_db, engine, check_indexes, Client, Prediction, Contact
+from .schemas import ClientOut, StatusIn, KPISummary, ClienteDetalle, OnlinePredictIn, OnlinePredictOut
+from .ml_service import THRESHOLD, registry, predict_online, online_batcher
+from .model_registry import ModelLoadError, MODEL_WATCH_INTERVAL
+from .inference_executor import inference_executor, InferenceOverloaded
+from .feature_cache import feature_cache
+from .observability import CONTENT_TYPE_LATEST, instrument_pool, metrics_middleware, render_metrics, mark_worker_dead
+from .query_tracing import QueryRouteMiddleware, query_stats
+from .response_cache import ResponseCacheMiddleware, response_cache, bump_data_version
+from .fast_json import V1_RESPONSE_CLASS, json_response
+from .pagination import CursorKey, encode_cursor, decode_cursor
+from .export import FORMATS, parse_columns, parse_statuses, export_stream
+from .feature_store import ensure_feature_state_tables
+from .heatmap_cube import (
+    AXES, query_cube, heatmap_matrix, cube_categories, cube_params, apply_client_delta, ensure_heatmap_cube_table,
+)
+from .snapshot import (
+    snapshot_builder, get_snapshot, apply_snapshot_headers, mark_dirty,
+    schedule_refresh, ensure_snapshot_table, CHANGE_PROBABILITY, CHANGE_STATUS,
+)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -32,6 +53,18 @@ app = FastAPI(
 app_environment = os.environ.get("APP_ENVIRONMENT", "development")
 logger.info(f"Aplicación iniciada en entorno: {app_environment}")
 
+# Caché de respuestas con ETag de los endpoints de métricas de solo lectura.
+# Se registra antes que el resto: es el middleware más interno, así CORS y las
+# métricas también se aplican a las respuestas servidas desde la caché
+CACHED_PATHS = [
+    "/api/v1/metrics/summary",
+    "/api/v1/metrics/probability-distribution",
+    "/api/v1/metrics/heatmap",
+    "/api/v1/metrics/heatmap/variables",
+    "/api/v1/contacts/progress",
+]
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, paths=CACHED_PATHS)
+
 # Configurar CORS con los dominios permitidos
 if app_environment == "production":
     # En producción, permitir solo dominios específicos
@@ -72,50 +105,142 @@ async def add_cors_headers(request, call_next):
     
     return response
 
+# Latencia por ruta y peticiones en curso para /metrics
+app.middleware("http")(metrics_middleware)
+
+# Ruta de la petición en curso para las trazas de consultas SQL
+app.add_middleware(QueryRouteMiddleware)
+
+# Métricas del pool solo en los workers que sirven peticiones (no en scripts
+# ni en los procesos del pool de features)
+@app.on_event("startup")
+async def start_pool_metrics():
+    instrument_pool(engine)
+
+# Asegurar la tabla de snapshots y verificar los índices suplementarios al arrancar
+@app.on_event("startup")
+async def ensure_storage():
+    try:
+        await ensure_snapshot_table(engine)
+        await ensure_feature_state_tables(engine)
+        await ensure_heatmap_cube_table(engine, THRESHOLD)
+        await check_indexes(engine)
+    except Exception as e:
+        logger.error(f"No se pudo verificar el esquema de la base de datos: {e}")
+
+# Vigilancia del registro de modelos: cada worker adopta la versión de CURRENT
+_model_watch_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_model_watch():
+    global _model_watch_task
+    if MODEL_WATCH_INTERVAL > 0:
+        _model_watch_task = asyncio.get_running_loop().create_task(registry.watch_current(MODEL_WATCH_INTERVAL))
+
+@app.on_event("shutdown")
+async def stop_model_watch():
+    if _model_watch_task is not None:
+        _model_watch_task.cancel()
+
+# Pools de inferencia: los procesos de features arrancan antes de la primera petición
+@app.on_event("startup")
+async def start_inference_executor():
+    try:
+        await asyncio.to_thread(inference_executor.warm_up)
+    except Exception as e:
+        logger.error(f"No se pudo iniciar el pool de features: {e}")
+
+@app.on_event("shutdown")
+async def stop_inference_executor():
+    await asyncio.to_thread(inference_executor.shutdown)
+
+# Retirar los gauges de este worker del agregado multiproceso
+@app.on_event("shutdown")
+async def release_worker_metrics():
+    mark_worker_dead()
+
+# Backpressure: con los pools de inferencia llenos se responde 503
+@app.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    logger.warning(f"Inferencia rechazada por backpressure: {exc}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
 # Endpoint raíz para mensaje de bienvenida
 @app.get("/")
 async def root():
     """Endpoint raíz que muestra un mensaje de bienvenida"""
     return {"message": "🚀 API Prometeo funcionando correctamente"}
 
+# Métricas de Prometheus (suma de todos los workers con PROMETHEUS_MULTIPROC_DIR)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Exposición de métricas en formato de texto de Prometheus"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # Router versionado
-api_v1 = APIRouter(prefix="/api/v1")
+api_v1 = APIRouter(prefix="/api/v1", default_response_class=V1_RESPONSE_CLASS)
+
+
+def kpi_summary_query():
+    """
+    Construye una única consulta agregada con todos los KPIs del resumen.
+
+    Cada tabla se recorre una sola vez: ``demographics`` con cláusulas FILTER
+    y ``contacts`` en un CTE independiente, unidos en una sola fila.
+    """
+    client_stats = (
+        select(
+            func.count().label("total_clients"),
+            func.avg(Client.probability).label("churn_risk_mean"),
+            func.count().filter(Client.probability >= THRESHOLD).label("at_risk_count"),
+        )
+        .select_from(Client)
+        .cte("client_stats")
+    )
+    contact_stats = (
+        select(func.count(Contact.id).label("contacted"))
+        .select_from(Contact)
+        .cte("contact_stats")
+    )
+    return select(
+        client_stats.c.total_clients,
+        client_stats.c.churn_risk_mean,
+        client_stats.c.at_risk_count,
+        contact_stats.c.contacted,
+    ).select_from(client_stats.join(contact_stats, true()))
+
+
+@snapshot_builder("metrics_summary", depends_on=(CHANGE_PROBABILITY, CHANGE_STATUS))
+async def build_metrics_summary(db: AsyncSession) -> dict:
+    """Calcula el resumen de KPIs desde las tablas de origen"""
+    # Un solo round trip para todos los KPIs
+    result = await db.execute(kpi_summary_query())
+    row = result.one()
+    
+    # Calcular tasa de conversión (si se tiene información)
+    conversion_rate = 0.0  # Valor por defecto
+    
+    return KPISummary(
+        total_clients=row.total_clients or 0,
+        churn_risk_mean=float(row.churn_risk_mean or 0.0),
+        contacted=row.contacted or 0,
+        at_risk_count=row.at_risk_count or 0,
+        conversion_rate=conversion_rate
+    ).model_dump()
 
 
 @api_v1.get("/metrics/summary", response_model=KPISummary)
-async def get_metrics_summary(db: AsyncSession = Depends(get_db)):
+async def get_metrics_summary(response: Response, db: AsyncSession = Depends(get_db)):
     """Obtiene un resumen de los indicadores clave de rendimiento"""
     try:
-        # Consultar total de clientes
-        query = select(func.count()).select_from(Client)
-        result = await db.execute(query)
-        total_clients = result.scalar() or 0
-        
-        # Consultar promedio de probabilidad (riesgo de abandono)
-        query = select(func.avg(Client.probability)).select_from(Client)
-        result = await db.execute(query)
-        churn_risk_mean = result.scalar() or 0.0
-        
-        # Consultar total de contactos
-        query = select(func.count(Contact.id)).select_from(Contact)
-        result = await db.execute(query)
-        contacted = result.scalar() or 0
-        
-        # Calcular clientes en riesgo (probability >= THRESHOLD)
-        query = select(func.count()).select_from(Client).where(Client.probability >= THRESHOLD)
-        result = await db.execute(query)
-        at_risk_count = result.scalar() or 0
-        
-        # Calcular tasa de conversión (si se tiene información)
-        conversion_rate = 0.0  # Valor por defecto
-        
-        return KPISummary(
-            total_clients=total_clients,
-            churn_risk_mean=float(churn_risk_mean),
-            contacted=contacted,
-            at_risk_count=at_risk_count,
-            conversion_rate=conversion_rate
-        )
+        payload, snapshot = await get_snapshot(db, "metrics_summary")
+        apply_snapshot_headers(response, snapshot)
+        # El payload se validó con KPISummary al construir el snapshot
+        return json_response(payload, response)
     
     except Exception as e:
         logger.error(f"Error al obtener métricas: {e}")
@@ -125,61 +250,132 @@ async def get_metrics_summary(db: AsyncSession = Depends(get_db)):
         )
 
 
+# Orden de la lista de prioridad; coincide con ix_demographics_probability_id
+PRIORITY_ORDER = (Client.probability.desc().nullslast(), Client.id.desc())
+
+
+def priority_cursor_param(
+    cursor: Optional[str] = Query(
+        None,
+        description="Cursor opaco de la página anterior (next_cursor). Vacío para pedir la primera página en modo cursor"
+    )
+) -> Optional[CursorKey]:
+    """Decodifica el cursor antes de abrir la sesión de base de datos"""
+    if not cursor:
+        return None
+    return decode_cursor(cursor)
+
+
+async def fetch_priority_page_offset(db: AsyncSession, page: int, size: int) -> List[Client]:
+    """Página de la lista de prioridad por OFFSET/LIMIT (modo compatible)"""
+    query = (
+        select(Client)
+        .order_by(*PRIORITY_ORDER)
+        .offset((page - 1) * size)
+        .limit(size)
+    )
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def fetch_priority_page_after(db: AsyncSession, after: Optional[CursorKey], size: int) -> List[Client]:
+    """
+    Página de la lista de prioridad posterior a la clave ``after`` (keyset).
+
+    Los clientes con probabilidad se recorren con una comparación de tupla
+    sobre el índice compuesto; los clientes sin probabilidad van al final.
+    """
+    base = select(Client).order_by(*PRIORITY_ORDER).limit(size)
+    
+    if after is None:
+        result = await db.execute(base)
+        return list(result.scalars().all())
+    
+    last_probability, last_id = after
+    clients: List[Client] = []
+    if last_probability is not None:
+        query = base.where(tuple_(Client.probability, Client.id) < tuple_(last_probability, last_id))
+        result = await db.execute(query)
+        clients = list(result.scalars().all())
+        if len(clients) == size:
+            return clients
+        # Se agotaron los clientes con probabilidad: continuar con los nulos
+        null_query = (
+            select(Client)
+            .where(Client.probability.is_(None))
+            .order_by(Client.id.desc())
+            .limit(size - len(clients))
+        )
+    else:
+        null_query = (
+            select(Client)
+            .where(Client.probability.is_(None), Client.id < last_id)
+            .order_by(Client.id.desc())
+            .limit(size)
+        )
+    result = await db.execute(null_query)
+    return clients + list(result.scalars().all())
+
+
+def priority_item(client: Client) -> dict:
+    """Serializa un cliente de la lista de prioridad"""
+    # Determinar la prioridad basada en la probabilidad
+    if client.probability is None:
+        priority = "low"
+        prob_value = 0.0
+    else:
+        prob_value = float(client.probability)
+        if prob_value > 0.7:
+            priority = "high"
+        elif prob_value > 0.4:
+            priority = "medium"
+        else:
+            priority = "low"
+    
+    return {
+        "id": client.id,
+        "user_id": client.user_id,
+        "probability": prob_value,
+        "status": client.status or "pending",
+        "age": client.age,
+        "risk_profile": client.risk_profile,
+        "income_range": client.income_range,
+        "priority": priority
+    }
+
+
 @api_v1.get("/clients/priority-list")
 async def get_priority_list(
-    page: int = Query(1, ge=1, description="Número de página"),
+    request: Request,
+    page: int = Query(1, ge=1, description="Número de página (modo compatible sin cursor)"),
     size: int = Query(10, ge=1, le=100, description="Tamaño de página"),
+    after: Optional[CursorKey] = Depends(priority_cursor_param),
     db: AsyncSession = Depends(get_db)
 ):
-    """Obtiene la lista de clientes ordenados por probabilidad de abandono"""
+    """
+    Obtiene la lista de clientes ordenados por probabilidad de abandono.
+
+    Sin ``cursor`` se pagina por ``page``/``size`` y se devuelve una lista.
+    Con ``cursor`` (vacío para la primera página) se usa paginación keyset y
+    se devuelve ``{"items": [...], "next_cursor": ...}``; ``next_cursor`` es
+    null cuando no hay más páginas.
+    """
     try:
-        # Calcular offset para paginación
-        offset = (page - 1) * size
-        
-        # Consultar clientes ordenados por probabilidad descendente
-        query = (
-            select(Client)
-            .order_by(desc(Client.probability))
-            .offset(offset)
-        .limit(size)
-    )
-        
-        result = await db.execute(query)
-        clients = result.scalars().all()
+        if "cursor" not in request.query_params:
+            clients = await fetch_priority_page_offset(db, page, size)
+            # Retornar una lista de diccionarios en lugar de modelos Pydantic
+            return json_response([priority_item(client) for client in clients])
         
-        if not clients:
-            return []
+        clients = await fetch_priority_page_after(db, after, size)
+        next_cursor = None
+        if len(clients) == size:
+            last = clients[-1]
+            next_cursor = encode_cursor(last.probability, last.id)
         
-        # Retornar una lista de diccionarios en lugar de modelos Pydantic
-        client_list = []
-        for client in clients:
-            # Determinar la prioridad basada en la probabilidad
-            if client.probability is None:
-                priority = "low"
-                prob_value = 0.0
-            else:
-                prob_value = float(client.probability)
-                if prob_value > 0.7:
-                    priority = "high"
-                elif prob_value > 0.4:
-                    priority = "medium"
-                else:
-                    priority = "low"
-            
-            # Crear un diccionario con los datos del cliente
-            client_dict = {
-                "id": client.id,
-                "user_id": client.user_id,
-                "probability": prob_value,
-                "status": client.status or "pending",
-                "age": client.age,
-                "risk_profile": client.risk_profile,
-                "income_range": client.income_range,
-                "priority": priority
-            }
-            client_list.append(client_dict)
-        
-        return client_list
+        return json_response({
+            "items": [priority_item(client) for client in clients],
+            "next_cursor": next_cursor
+        })
     
     except Exception as e:
         logger.error(f"Error al obtener lista de prioridad: {e}")
@@ -189,6 +385,35 @@ async def get_priority_list(
         )
 
 
+def export_columns(
+    columns: Optional[str] = Query(None, description="Columnas separadas por coma (todas si se omite)")
+) -> List[str]:
+    """Valida la proyección antes de empezar el stream"""
+    return parse_columns(columns)
+
+
+@api_v1.get("/export/clients")
+async def export_clients(
+    format: str = Query("arrow", pattern="^(arrow|parquet)$", description="arrow (IPC stream) o parquet"),
+    columns: List[str] = Depends(export_columns),
+    min_probability: Optional[float] = Query(None, ge=0, le=1, description="Solo clientes con probability >= este valor"),
+    statuses: Optional[str] = Query(None, alias="status", description="Estados separados por coma")
+):
+    """
+    Exporta demographics unido con prediction_results en formato columnar.
+
+    Reemplaza la descarga página a página de priority-list: el archivo se
+    genera por lotes desde un cursor del servidor y se envía a medida que se
+    codifica, así la memoria no crece con el número de clientes.
+    """
+    media_type, extension = FORMATS[format]
+    return StreamingResponse(
+        export_stream(columns, format, min_probability, parse_statuses(statuses)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="clients.{extension}"'}
+    )
+
+
 @api_v1.patch("/clients/{client_id}/status")
 async def update_client_status(
     status_data: StatusIn,
@@ -197,8 +422,9 @@ async def update_client_status(
 ):
     """Actualiza el estado de un cliente."""
     try:
-        # Verificar existencia del cliente
-        query = select(Client).where(Client.id == client_id)
+        # Verificar existencia del cliente y bloquear su fila: el delta del cubo
+        # resta el estado leído aquí y nadie más puede cambiarlo hasta el commit
+        query = select(Client).where(Client.id == client_id).with_for_update()
         result = await db.execute(query)
         client = result.scalars().first()
         if not client:
@@ -206,6 +432,8 @@ async def update_client_status(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Cliente con ID {client_id} no encontrado"
             )
+        # Cubo del mapa de calor: quitar la celda anterior del cliente
+        await apply_client_delta(db, [client.id], -1, THRESHOLD)
         # Actualizar estado y fecha
         client.status = status_data.new_status
         client.last_contact_date = datetime.now()
@@ -218,8 +446,17 @@ async def update_client_status(
                 notes="Actualización de estado vía API"
             )
             db.add(contact)
+        # ... y sumarlo en la celda de su nuevo estado
+        await db.flush()
+        await apply_client_delta(db, [client.id], 1, THRESHOLD)
+        # Invalidar los snapshots que dependen del estado junto con el cambio
+        await mark_dirty(db, CHANGE_STATUS)
         # Confirmar cambios en la base de datos
         await db.commit()
+        schedule_refresh()
+        bump_data_version()
+        # El cliente cambió: descartar su vector de features y su predicción en caché
+        feature_cache.invalidate([client.user_id])
         # Retornar respuesta sencilla
         return {
             "id": client.id,
@@ -238,40 +475,114 @@ async def update_client_status(
         )
 
 
-@api_v1.get("/metrics/probability-distribution", response_model=List[dict])
-async def get_probability_distribution(db: AsyncSession = Depends(get_db)):
+def distribution_edges(
+    buckets: int = Query(10, ge=1, le=100, description="Número de buckets uniformes entre 0 y 1"),
+    edges: Optional[str] = Query(None, description="Bordes explícitos separados por coma (reemplaza buckets)")
+) -> List[float]:
+    """
+    Obtiene los bordes de los buckets de probabilidad.
+
+    Se usa como dependencia para que los parámetros inválidos se rechacen
+    antes de abrir la sesión de base de datos.
+
+    Args:
+        buckets: Número de buckets uniformes entre 0 y 1 (si no hay edges)
+        edges: Bordes explícitos separados por coma, p. ej. "0,0.2,0.5,1"
+
+    Returns:
+        List[float]: Bordes estrictamente crecientes
+    """
+    if edges is None:
+        return [round(i / buckets, 6) for i in range(buckets + 1)]
+    try:
+        parsed = [float(e) for e in edges.split(",") if e.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="edges debe ser una lista de números separados por coma"
+        )
+    # NaN no falla ninguna comparación: se rechaza aparte junto con inf
+    if (len(parsed) < 2 or len(parsed) > 101 or not all(math.isfinite(e) for e in parsed)
+            or any(b <= a for a, b in zip(parsed, parsed[1:]))):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="edges debe tener entre 2 y 101 valores finitos estrictamente crecientes"
+        )
+    return parsed
+
+
+def probability_histogram_query(edges: List[float]):
+    """
+    Histograma de probabilidades agrupado en SQL con width_bucket.
+
+    Devuelve una fila por bucket no vacío con los conteos de clientes
+    contactados y no contactados; el último borde se incluye en el último
+    bucket y los valores fuera de [edges[0], edges[-1]] se descartan.
+    """
+    n_buckets = len(edges) - 1
+    bucket = func.least(func.width_bucket(Client.probability, array(edges)), n_buckets).label("bucket")
+    contacted = func.coalesce(Client.status, "pending") != "pending"
+    return (
+        select(
+            bucket,
+            func.count().filter(contacted).label("contacted"),
+            func.count().filter(~contacted).label("no_contacted"),
+        )
+        .where(Client.probability >= edges[0], Client.probability <= edges[-1])
+        .group_by(text("bucket"))
+    )
+
+
+def _pct_label(value: float) -> str:
+    return f"{value * 100:g}"
+
+
+@snapshot_builder("probability_distribution", depends_on=(CHANGE_PROBABILITY, CHANGE_STATUS))
+async def build_probability_distribution(db: AsyncSession, edges: List[float]) -> dict:
+    """Calcula la distribución de probabilidades desde demographics"""
+    result = await db.execute(probability_histogram_query(edges))
+    counts = {row.bucket: (row.contacted, row.no_contacted) for row in result}
+    total = sum(c + n for c, n in counts.values())
+    
+    buckets = []
+    for i, (low, high) in enumerate(zip(edges, edges[1:]), start=1):
+        contacted, no_contacted = counts.get(i, (0, 0))
+        count = contacted + no_contacted
+        buckets.append({
+            "range": f"{_pct_label(low)}-{_pct_label(high)}%",
+            "no_contacted": no_contacted,
+            "contacted": contacted,
+            "count": count,
+            "percentage": round(count / total * 100, 2) if total else 0
+        })
+    
+    return {"buckets": buckets, "threshold": float(THRESHOLD)}
+
+
+@api_v1.get("/metrics/probability-distribution")
+async def get_probability_distribution(
+    request: Request,
+    response: Response,
+    bucket_edges: List[float] = Depends(distribution_edges),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Obtener la distribución de probabilidades de clientes
+    Obtener la distribución de probabilidades de clientes, separando
+    contactados y no contactados
     
     Returns:
-        List[dict]: Lista con la distribución de probabilidades
+        dict: Buckets con conteos por estado de contacto y el umbral del modelo
     """
     try:
-        # Definir los rangos para la distribución
-        ranges = [
-            {"min": 0.0, "max": 0.2, "label": "0-20%"},
-            {"min": 0.2, "max": 0.4, "label": "20-40%"},
-            {"min": 0.4, "max": 0.6, "label": "40-60%"},
-            {"min": 0.6, "max": 0.8, "label": "60-80%"},
-            {"min": 0.8, "max": 1.0, "label": "80-100%"}
-        ]
+        if "edges" in request.query_params:
+            # Bordes arbitrarios: se calcula directamente para no multiplicar snapshots
+            return json_response(await build_probability_distribution(db, bucket_edges))
         
-        # Consulta para obtener todas las probabilidades
-        query = select(Client.probability)
-        result = await db.execute(query)
-        probabilities = [float(row[0]) for row in result.fetchall()]
-        
-        # Calcular la distribución
-        distribution = []
-        for r in ranges:
-            count = len([p for p in probabilities if r["min"] <= p < r["max"]])
-            distribution.append({
-                "range": r["label"],
-                "count": count,
-                "percentage": round(count / len(probabilities) * 100, 2) if probabilities else 0
-            })
-            
-        return distribution
+        distribution, snapshot = await get_snapshot(db, "probability_distribution", edges=bucket_edges)
+        apply_snapshot_headers(response, snapshot)
+        return json_response(distribution, response)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener distribución de probabilidades: {str(e)}")
         raise HTTPException(
@@ -280,79 +591,92 @@ async def get_probability_distribution(db: AsyncSession = Depends(get_db)):
         )
 
 
+# Métricas del mapa de calor: parámetro ``metric`` -> métrica del cubo
+HEATMAP_METRICS = {
+    "probability": "mean_probability",
+    "count": "count",
+    "conversion": "conversion",
+    "at_risk": "at_risk",
+}
+
+
 @api_v1.get("/metrics/heatmap/variables")
-async def get_heatmap_variables():
+async def get_heatmap_variables(response: Response, db: AsyncSession = Depends(get_db)):
     """
     Obtener las variables disponibles para el mapa de calor
-    
+
     Returns:
-        List[dict]: Lista de variables disponibles
+        dict: Variables (ejes), categorías de cada una y métricas disponibles
     """
-    # Definir variables disponibles para el mapa de calor
-    variables = [
-        {"id": "age", "name": "Edad", "type": "numeric"},
-        {"id": "income_range", "name": "Rango de Ingresos", "type": "categorical"},
-        {"id": "risk_profile", "name": "Perfil de Riesgo", "type": "categorical"},
-        {"id": "occupation", "name": "Ocupación", "type": "categorical"},
-        {"id": "segment", "name": "Segmento", "type": "categorical"},
-        {"id": "probability", "name": "Probabilidad", "type": "numeric"}
-    ]
-    
-    return variables
+    try:
+        # Las categorías salen del cubo: mismas cabeceras que /metrics/heatmap,
+        # así no se guardan en la caché mientras el cubo está invalidado
+        _, snapshot = await get_snapshot(db, "heatmap", **cube_params(THRESHOLD))
+        apply_snapshot_headers(response, snapshot)
+        return {
+            "variables": list(AXES),
+            "categories": await cube_categories(db),
+            "metrics": list(HEATMAP_METRICS),
+        }
+    except Exception as e:
+        logger.error(f"Error al obtener variables del mapa de calor: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener variables del mapa de calor: {str(e)}"
+        )
 
 
 @api_v1.get("/metrics/heatmap")
 async def get_heatmap_data(
-    x_var: str = Query(..., description="Variable para el eje X"),
-    y_var: str = Query(..., description="Variable para el eje Y"),
+    response: Response,
+    x: str = Query(..., description="Variable para el eje X"),
+    y: str = Query(..., description="Variable para el eje Y"),
+    metric: str = Query("probability", description="Métrica: probability, count, conversion o at_risk"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Obtener datos para el mapa de calor según variables seleccionadas
-    
+    Obtener el mapa de calor de dos variables
+
+    Edad y probabilidad se agrupan en rangos (``HEATMAP_AGE_EDGES``,
+    ``HEATMAP_PROBABILITY_EDGES``) y los valores salen del cubo preagregado.
+
     Args:
-        x_var: Variable para el eje X
-        y_var: Variable para el eje Y
-        
+        x: Variable para el eje X
+        y: Variable para el eje Y
+        metric: probability (probabilidad media), count (clientes), conversion
+            (convertidos / clientes) o at_risk (clientes sobre el umbral)
+
     Returns:
-        dict: Datos para el mapa de calor
+        dict: ``x_categories``, ``y_categories``, ``values`` (una fila por
+        categoría de Y) y ``threshold``
     """
     try:
-        # Validar variables
-        valid_vars = ["age", "income_range", "risk_profile", "occupation", "segment", "probability"]
-        if x_var not in valid_vars or y_var not in valid_vars:
+        # Validar variables y métrica
+        if x not in AXES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Variables no válidas. Debe ser una de: {', '.join(valid_vars)}"
+                detail=f"Variable 'x' no válida. Opciones: {', '.join(AXES)}"
             )
-        
-        # Consulta para obtener datos según las variables seleccionadas
-        query = select(getattr(Client, x_var), getattr(Client, y_var), func.count(Client.id))
-        query = query.group_by(getattr(Client, x_var), getattr(Client, y_var))
-        result = await db.execute(query)
-        
-        # Procesar resultados
-        heatmap_data = []
-        for row in result.fetchall():
-            x_value = str(row[0]) if row[0] is not None else "N/A"
-            y_value = str(row[1]) if row[1] is not None else "N/A"
-            count = row[2]
-            
-            heatmap_data.append({
-                "x": x_value,
-                "y": y_value,
-                "value": count
-            })
-        
-        # Obtener valores únicos para ejes X e Y
-        x_values = sorted(list(set(d["x"] for d in heatmap_data)))
-        y_values = sorted(list(set(d["y"] for d in heatmap_data)))
-        
-        return {
-            "data": heatmap_data,
-            "xAxis": x_values,
-            "yAxis": y_values
-        }
+        if y not in AXES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Variable 'y' no válida. Opciones: {', '.join(AXES)}"
+            )
+        if metric not in HEATMAP_METRICS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Métrica no válida. Debe ser una de: {', '.join(HEATMAP_METRICS)}"
+            )
+
+        # El snapshot "heatmap" es el cubo preagregado; se reconstruye si está
+        # invalidado y supera la antigüedad máxima
+        _, snapshot = await get_snapshot(db, "heatmap", **cube_params(THRESHOLD))
+        apply_snapshot_headers(response, snapshot)
+        cells = await query_cube(db, x, y)
+        return json_response(
+            {**heatmap_matrix(cells, x, y, HEATMAP_METRICS[metric]), "metric": metric, "threshold": THRESHOLD},
+            response,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -440,5 +764,120 @@ async def get_contacts_progress(
             detail=f"Error al procesar datos de progreso de contactos: {str(e)}"
         )
 
+@api_v1.post("/predict", response_model=OnlinePredictOut)
+async def predict_client(payload: OnlinePredictIn):
+    """
+    Probabilidad de un cliente a partir de sus features sin transformar.
+    Las peticiones concurrentes se agrupan en un único predict_proba
+    (PREDICT_BATCH_MAX_WAIT_MS, PREDICT_BATCH_MAX_ROWS).
+    """
+    try:
+        return await predict_online(payload.features, payload.user_id)
+    except InferenceOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error en predicción online: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al predecir: {str(e)}"
+        )
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Exige en X-Admin-Token el valor de ADMIN_TOKEN. Sin ADMIN_TOKEN las rutas
+    de administración quedan deshabilitadas y responden 404.
+    """
+    expected = os.environ.get("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administración inválido")
+
+
+@api_v1.get("/metrics/feature-cache")
+async def get_feature_cache_stats():
+    """Aciertos, fallos, tamaño y desalojos de la caché de features de este worker"""
+    return feature_cache.stats()
+
+
+@api_v1.get("/metrics/response-cache")
+async def get_response_cache_stats():
+    """Aciertos, fallos y 304 de la caché de respuestas de este worker"""
+    return response_cache.stats()
+
+
+# Rutas de diagnóstico: solo se registran con ADMIN_TOKEN configurado y
+# siempre exigen el token (exponen SQL normalizado, rutas, PIDs y tiempos)
+debug_router = APIRouter(prefix="/api/v1/debug", dependencies=[Depends(require_admin_token)])
+
+
+@debug_router.get("/queries")
+async def get_query_stats(
+    limit: int = Query(20, ge=1, le=500, description="Número de sentencias"),
+    order_by: str = Query("total_ms", description="total_ms, mean_ms, max_ms, calls o rows")
+):
+    """
+    Sentencias SQL de este worker con más tiempo acumulado (por huella) y las
+    consultas lentas recientes (SLOW_QUERY_MS).
+    """
+    if order_by not in query_stats.ORDER_BY:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"order_by debe ser uno de: {', '.join(query_stats.ORDER_BY)}"
+        )
+    return {
+        **query_stats.summary(),
+        "top": query_stats.top(limit, order_by),
+        "slow_queries": query_stats.slow_queries(),
+    }
+
+
+@debug_router.delete("/queries")
+async def reset_query_stats():
+    """Reinicia las estadísticas de consultas de este worker"""
+    query_stats.reset()
+    return {"success": True, "pid": os.getpid()}
+
+
+@api_v1.get("/model")
+async def get_model_status():
+    """Versión del modelo activa en este worker, tiempos de carga y versiones disponibles"""
+    return {**registry.status(), "executor": inference_executor.stats(), "batcher": online_batcher.stats()}
+
+
+@api_v1.post("/admin/model/reload", dependencies=[Depends(require_admin_token)])
+async def reload_model(
+    version: Optional[str] = Query(None, description="Versión del registro; por defecto la de CURRENT"),
+    publish: bool = Query(True, description="Reescribir CURRENT para que el resto de workers cambien de versión")
+):
+    """
+    Carga una versión en segundo plano, la calienta y la activa sin cortar
+    las peticiones en curso; si falla, la versión anterior sigue activa.
+    """
+    try:
+        target = version or registry.current_pointer()
+        if target is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="El registro de modelos no tiene una versión en CURRENT"
+            )
+        bundle = await registry.activate(target, publish=publish and version is not None)
+        return {"success": True, "pid": os.getpid(), **bundle.info()}
+    except HTTPException:
+        raise
+    except ModelLoadError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error al recargar el modelo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al recargar el modelo: {str(e)}"
+        )
+
 # Incluir router versionado
-app.include_router(api_v1)
\ No newline at end of file
+app.include_router(api_v1)
+if os.environ.get("ADMIN_TOKEN"):
+    app.include_router(debug_router)
+else:
+    logger.info("ADMIN_TOKEN no configurado: /api/v1/debug no se registra")
\ No newline at end of file
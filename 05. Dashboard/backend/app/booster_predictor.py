@@ -0,0 +1,121 @@
+"""
+Inferencia con el ``xgboost.Booster`` nativo.
+
+``XGBClassifier.predict_proba`` sobre un DataFrame valida nombres y tipos de
+columnas y convierte el DataFrame columna a columna en cada llamada.
+``BoosterPredictor`` extrae el Booster del modelo una sola vez y llama a
+``inplace_predict`` sobre una matriz float32 contigua con el orden de columnas
+fijado al cargar (``feature_names_in_`` o el esquema de la versión).
+
+Devuelve lo mismo que ``predict_proba`` (matriz n x 2) para poder sustituir al
+modelo sin cambiar a los llamadores. Solo se usa con clasificadores binarios
+de árboles; para cualquier otro modelo ``booster_predictor`` devuelve None y se
+mantiene el wrapper de sklearn.
+
+Variable de entorno:
+    INFERENCE_BACKEND   "booster" (por defecto), "flat" para el evaluador NumPy
+                        de app.flat_tree_predictor, o "sklearn" para usar
+                        siempre predict_proba del wrapper
+"""
+import os
+import logging
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "booster")
+
+# Objetivos con una sola salida de probabilidad (clase positiva)
+BINARY_OBJECTIVES = {"binary:logistic", "binary:logitraw", "binary:hinge"}
+
+
+def model_matrix(X, feature_names: Optional[List[str]], n_features: int) -> np.ndarray:
+    """Matriz float32 contigua en el orden de columnas del modelo"""
+    if isinstance(X, pd.DataFrame):
+        if feature_names is not None:
+            X = X[feature_names]
+        X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if X.ndim == 1:
+        X = X[np.newaxis, :]
+    if X.shape[1] != n_features:
+        raise ValueError(f"Se esperaban {n_features} columnas y llegaron {X.shape[1]}")
+    return X
+
+
+class BoosterPredictor:
+    """
+    ``predict_proba`` de un clasificador binario de XGBoost con el Booster nativo.
+
+    Args:
+        booster: ``xgboost.Booster`` entrenado
+        feature_names: Orden de columnas de entrada; None acepta solo matrices
+            ya ordenadas
+        missing: Valor que XGBoost trata como ausente (el del wrapper)
+        iteration_range: Árboles a usar (el del wrapper si hubo early stopping)
+    """
+
+    backend = "booster"
+
+    def __init__(
+        self,
+        booster,
+        feature_names: Optional[List[str]] = None,
+        missing: float = np.nan,
+        iteration_range: Tuple[int, int] = (0, 0),
+    ):
+        self.booster = booster
+        self.feature_names = list(feature_names) if feature_names else None
+        self.n_features_in_ = len(self.feature_names) if self.feature_names else booster.num_features()
+        self.missing = missing
+        self.iteration_range = iteration_range
+
+    def matrix(self, X) -> np.ndarray:
+        return model_matrix(X, self.feature_names, self.n_features_in_)
+
+    def predict_positive(self, X) -> np.ndarray:
+        """Probabilidad de la clase positiva (vector de n filas)"""
+        return self.booster.inplace_predict(
+            self.matrix(X),
+            iteration_range=self.iteration_range,
+            predict_type="value",
+            missing=self.missing,
+            validate_features=False,
+        )
+
+    def predict_proba(self, X) -> np.ndarray:
+        positive = self.predict_positive(X)
+        return np.column_stack([1.0 - positive, positive])
+
+
+def booster_predictor(model: Any, feature_names: Optional[List[str]] = None) -> Optional[BoosterPredictor]:
+    """
+    ``BoosterPredictor`` para ``model`` si es un clasificador binario de
+    árboles y el backend está activo; None en caso contrario.
+    """
+    if INFERENCE_BACKEND == "sklearn":
+        return None
+    try:
+        from xgboost import XGBClassifier
+    except ImportError:
+        return None
+    if not isinstance(model, XGBClassifier) or getattr(model, "booster", None) == "gblinear":
+        return None
+    try:
+        objective = model.get_xgb_params().get("objective") or "binary:logistic"
+        if objective not in BINARY_OBJECTIVES or getattr(model, "n_classes_", 2) != 2:
+            return None
+        return BoosterPredictor(
+            model.get_booster(),
+            feature_names=feature_names,
+            missing=model.missing if model.missing is not None else np.nan,
+            iteration_range=model._get_iteration_range(None),
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo usar el Booster nativo; se mantiene predict_proba: {e}")
+        return None
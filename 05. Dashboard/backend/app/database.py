@@ -2,14 +2,21 @@
 Configuración y modelos de base de datos utilizando SQLAlchemy 2.0 async
 """
 import os
+import time
 import logging
 import asyncio
+import uuid
+import asyncpg
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, event
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy.future import select
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.pool import NullPool
+
+from .observability import observe_pool_checkout
+from .query_tracing import instrument_engine
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -40,36 +47,84 @@ if not DATABASE_URL:
 
 logger.info(f"Conectando a la base de datos: {DATABASE_URL.split('@')[0].split(':')[0]}:****@{DATABASE_URL.split('@')[1]}")
 
-# Configuración de engine con parámetros de conexión optimizados
-engine = create_async_engine(
-    DATABASE_URL, 
-    echo=False,
-    pool_size=5,               # Tamaño inicial del pool de conexiones
-    max_overflow=10,           # Conexiones adicionales permitidas
-    pool_timeout=30,           # Tiempo máximo de espera para obtener una conexión (segundos)
-    pool_recycle=1800,         # Reciclar conexiones después de 30 minutos
-    pool_pre_ping=True,        # Verificar conexiones antes de usarlas
-    connect_args={
+# Presupuesto de conexiones: Postgres admite un número fijo de conexiones y
+# cada worker de uvicorn tiene su propio pool. El tamaño por worker se deriva
+# del total disponible en lugar de fijarse por proceso
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))          # workers de uvicorn
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "20"))   # conexiones para toda la API
+DB_RESERVED_CONNECTIONS = int(os.environ.get("DB_RESERVED_CONNECTIONS", "3"))  # scripts, psql, migraciones
+DB_POOL_SIZE = os.environ.get("DB_POOL_SIZE")                          # fija el pool por worker
+DB_MAX_OVERFLOW = os.environ.get("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+
+# Modo PgBouncer (pool_mode = transaction): sin sentencias preparadas con nombre
+# reutilizable entre transacciones; DB_NULL_POOL=1 deja el pooling solo a PgBouncer
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+DB_NULL_POOL = os.environ.get("DB_NULL_POOL", "0") == "1"
+
+def pool_settings(
+    workers: int = WEB_CONCURRENCY,
+    max_connections: int = DB_MAX_CONNECTIONS,
+    reserved: int = DB_RESERVED_CONNECTIONS,
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    pool_size y max_overflow por worker para que ``workers`` pools no superen
+    ``max_connections - reserved`` conexiones: dos tercios fijos y el resto
+    como overflow para picos. ``pool_size``/``max_overflow`` explícitos mandan.
+    """
+    per_worker = max(1, (max_connections - reserved) // max(1, workers))
+    if pool_size is None:
+        pool_size = max(1, per_worker - per_worker // 3)
+    if max_overflow is None:
+        max_overflow = max(0, per_worker - pool_size)
+    return {"pool_size": pool_size, "max_overflow": max_overflow}
+
+def engine_options(pgbouncer: bool = DB_PGBOUNCER, null_pool: bool = DB_NULL_POOL) -> Dict[str, Any]:
+    """Argumentos de create_async_engine según el presupuesto de conexiones y el modo PgBouncer"""
+    connect_args: Dict[str, Any] = {
         "timeout": 30,         # Timeout de conexión
         "command_timeout": 30  # Timeout de comandos
     }
+    if pgbouncer:
+        # PgBouncer reparte las transacciones entre conexiones del servidor: una
+        # sentencia preparada en una conexión no existe en la siguiente
+        connect_args.update({
+            "statement_cache_size": 0,             # caché de asyncpg
+            "prepared_statement_cache_size": 0,    # caché del dialecto de SQLAlchemy
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        })
+    options: Dict[str, Any] = {
+        "echo": False,
+        "pool_pre_ping": True,     # Única verificación de la conexión: al sacarla del pool
+        "connect_args": connect_args,
+    }
+    if null_pool:
+        options["poolclass"] = NullPool
+    else:
+        options.update(pool_settings(
+            pool_size=int(DB_POOL_SIZE) if DB_POOL_SIZE else None,
+            max_overflow=int(DB_MAX_OVERFLOW) if DB_MAX_OVERFLOW else None,
+        ))
+        options["pool_timeout"] = DB_POOL_TIMEOUT    # Espera máxima por una conexión (segundos)
+        options["pool_recycle"] = DB_POOL_RECYCLE    # Reciclar conexiones después de 30 minutos
+    return options
+
+_engine_options = engine_options()
+logger.info(
+    "Pool de conexiones por worker: "
+    + ("NullPool" if DB_NULL_POOL else f"pool_size={_engine_options['pool_size']}, max_overflow={_engine_options['max_overflow']}")
+    + f" ({WEB_CONCURRENCY} workers, presupuesto {DB_MAX_CONNECTIONS}, PgBouncer={'sí' if DB_PGBOUNCER else 'no'})"
 )
 
-# Evento para monitorear errores de conexión
-@event.listens_for(engine.sync_engine, "engine_connect")
-def ping_connection(connection, branch):
-    if branch:
-        # "branch" se refiere a una sub-conexión de un Connection a nivel de Engine
-        return
+engine = create_async_engine(DATABASE_URL, **_engine_options)
 
-    # Ping la base de datos
-    try:
-        connection.scalar("SELECT 1")
-    except:
-        # Conexión es inválida, será cerrada y reemplazada
-        logger.warning("Conexión a la base de datos inválida; será reciclada")
-        connection.close()
-        raise
+# Duración y ruta de cada consulta. Las métricas del pool se registran en el
+# startup de la API: este módulo también se importa desde scripts y procesos
+# auxiliares, que no deben sumar su pool a los gauges de los workers
+instrument_engine(engine)
 
 # Configuración más robusta de la sesión con retry
 SessionLocal = async_sessionmaker(
@@ -111,6 +166,13 @@ class Client(Base):
     def __repr__(self):
         return f"<Client(id={self.id}, user_id='{self.user_id}', probability={self.probability:.2f})>"
 
+# Soporta el orden de la lista de prioridad y su paginación por cursor
+ix_demographics_probability_id = Index(
+    "ix_demographics_probability_id",
+    Client.probability.desc().nullslast(),
+    Client.id.desc(),
+)
+
 class Prediction(Base):
     __tablename__ = "prediction_results"
     
@@ -130,6 +192,13 @@ class Prediction(Base):
     def __repr__(self):
         return f"<Prediction(id={self.id}, user_id='{self.user_id}', probability={self.probability:.2f})>"
 
+# Una predicción vigente por usuario; permite el upsert ON CONFLICT (user_id)
+uq_prediction_results_user_id = Index(
+    "uq_prediction_results_user_id",
+    Prediction.user_id,
+    unique=True,
+)
+
 class Contact(Base):
     __tablename__ = "contacts"
     
@@ -147,41 +216,160 @@ class Contact(Base):
     def __repr__(self):
         return f"<Contact(id={self.id}, client_id={self.client_id}, channel='{self.channel}')>"
 
-# Función para obtener una sesión de base de datos con reintentos
-async def get_db(max_retries=3, retry_delay=1):
-    """Obtener una sesión de base de datos con manejo de reintentos"""
-    attempt = 0
-    last_error = None
+class MetricSnapshot(Base):
+    __tablename__ = "metric_snapshots"
+    
+    key = Column(String, primary_key=True)          # builder + parámetros serializados
+    builder = Column(String, nullable=False)        # Nombre del builder registrado en app.snapshot
+    params = Column(String, nullable=True)          # Parámetros del builder en JSON
+    depends_on = Column(String, nullable=False)     # Tipos de cambio que invalidan el snapshot (csv)
+    payload = Column(String, nullable=False)        # Respuesta del endpoint en JSON
+    generation = Column(Integer, default=0)         # Se incrementa con cada invalidación
+    dirty = Column(Boolean, default=False)
+    refreshed_at = Column(DateTime, default=datetime.now)
     
-    while attempt < max_retries:
+    def __repr__(self):
+        return f"<MetricSnapshot(key='{self.key}', dirty={self.dirty}, refreshed_at={self.refreshed_at})>"
+
+# Estado de features por usuario (app.feature_store): parciales acumulados de
+# sus transacciones, actualizados de forma aditiva con cada batch nuevo
+class UserFeatureState(Base):
+    __tablename__ = "user_feature_state"
+
+    user_id = Column(String, primary_key=True)
+    n_tx = Column(Integer, nullable=False, default=0)            # transaction_id no nulos
+    amount_sum = Column(Float, nullable=False, default=0.0)
+    amount_n = Column(Integer, nullable=False, default=0)        # montos no nulos
+    last_date = Column(DateTime, nullable=True)                  # última transacción
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<UserFeatureState(user_id='{self.user_id}', n_tx={self.n_tx})>"
+
+class UserCategoryState(Base):
+    __tablename__ = "user_category_state"
+
+    user_id = Column(String, primary_key=True)
+    merchant_category = Column(String, primary_key=True)
+    n_tx = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(Float, nullable=False, default=0.0)
+
+class UserMonthState(Base):
+    __tablename__ = "user_month_state"
+
+    user_id = Column(String, primary_key=True)
+    mes = Column(DateTime, primary_key=True)                     # primer día del mes
+    n_tx = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(Float, nullable=False, default=0.0)
+
+# Cubo del mapa de calor (app.heatmap_cube): una celda por combinación de edad
+# agrupada, decil de probabilidad y columnas categóricas de demographics
+class HeatmapCell(Base):
+    __tablename__ = "heatmap_cube"
+
+    age_bin = Column(String, primary_key=True)
+    probability_bin = Column(String, primary_key=True)
+    income_range = Column(String, primary_key=True)
+    risk_profile = Column(String, primary_key=True)
+    occupation = Column(String, primary_key=True)
+    segment = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)                     # clientes
+    probability_n = Column(Integer, nullable=False, default=0)         # con probabilidad no nula
+    probability_sum = Column(Float, nullable=False, default=0.0)
+    probability_sq_sum = Column(Float, nullable=False, default=0.0)
+    at_risk = Column(Integer, nullable=False, default=0)               # probabilidad >= umbral
+
+    def __repr__(self):
+        return f"<HeatmapCell(age_bin='{self.age_bin}', probability_bin='{self.probability_bin}', n={self.n})>"
+
+# Índices agregados después del esquema inicial: create_all no los crea en
+# tablas que ya existen. Se crean con la migración ``scripts/migrate_indexes.py``
+# (CREATE INDEX CONCURRENTLY); la aplicación solo verifica que existan
+SUPPLEMENTARY_INDEXES = [
+    ix_demographics_probability_id,
+    uq_prediction_results_user_id,
+]
+
+def missing_indexes(sync_conn) -> List[Index]:
+    """Índices suplementarios que no existen o quedaron inválidos (CONCURRENTLY fallido)"""
+    valid = set(sync_conn.execute(
+        text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indisvalid AND c.relname = ANY(:names)"
+        ),
+        {"names": [index.name for index in SUPPLEMENTARY_INDEXES]},
+    ).scalars())
+    return [index for index in SUPPLEMENTARY_INDEXES if index.name not in valid]
+
+async def check_indexes(target_engine=None) -> List[str]:
+    """
+    Verifica los índices suplementarios sin modificar la base de datos.
+
+    Returns:
+        List[str]: Nombres de los índices que faltan (se registra un error por cada uno)
+    """
+    async with (target_engine or engine).connect() as conn:
+        missing = await conn.run_sync(missing_indexes)
+    for index in missing:
+        logger.error(
+            f"Falta el índice {index.name} en {index.table.name}; "
+            f"ejecutar la migración: python -m scripts.migrate_indexes"
+        )
+    return [index.name for index in missing]
+
+# Errores al obtener una conexión que justifican reintentar: red, timeout o
+# servidor que todavía no acepta conexiones. Los errores de las consultas de la
+# petición (SQL inválido, restricciones, etc.) nunca se reintentan
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.exceptions.PostgresConnectionError,
+    asyncpg.exceptions.CannotConnectNowError,
+    asyncpg.exceptions.TooManyConnectionsError,
+)
+
+def is_connection_error(exc: BaseException) -> bool:
+    """True si ``exc`` indica que no se pudo conectar (y tiene sentido reintentar)"""
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, CONNECTION_ERRORS)
+
+async def open_session(max_retries=3, retry_delay=1, session_factory=None) -> AsyncSession:
+    """
+    Abre una sesión con su conexión ya obtenida del pool.
+
+    ``pool_pre_ping`` es la única verificación de la conexión: la valida al
+    sacarla del pool y la reemplaza si el servidor la cerró. Solo los errores
+    de conexión se reintentan, hasta ``max_retries`` intentos.
+    """
+    factory = session_factory or SessionLocal
+    for attempt in range(1, max_retries + 1):
+        db = factory()
         try:
-            # Si no es el primer intento, esperar antes de reintentar
-            if attempt > 0:
-                await asyncio.sleep(retry_delay)
-                logger.warning(f"Reintentando conexión a la base de datos (intento {attempt+1}/{max_retries})")
-            
-            # Iniciar sesión
-            db = SessionLocal()
-            # Verificar conexión con una consulta simple
-            await db.execute(select(1))
-            # Si llegamos aquí, la conexión es buena
-            try:
-                yield db
-            finally:
-                await db.close()
-            return  # Salir después de yield exitoso
-            
+            # Obtener la conexión del pool midiendo la espera
+            checkout_started = time.perf_counter()
+            await db.connection()
+            observe_pool_checkout(time.perf_counter() - checkout_started)
+            return db
         except Exception as e:
-            attempt += 1
-            last_error = e
-            logger.error(f"Error de conexión a la base de datos: {str(e)}")
-            # Si estamos usando una sesión, asegurarse de cerrarla
             try:
                 await db.close()
-            except:
+            except Exception:
                 pass
-    
-    # Si llegamos aquí, todos los intentos fallaron
-    logger.critical(f"No se pudo establecer conexión a la base de datos después de {max_retries} intentos.")
-    logger.critical(f"Último error: {str(last_error)}")
-    raise last_error
\ No newline at end of file
+            if not is_connection_error(e):
+                raise
+            if attempt == max_retries:
+                logger.critical(f"No se pudo establecer conexión a la base de datos después de {max_retries} intentos: {e}")
+                raise
+            logger.warning(f"Error de conexión a la base de datos (intento {attempt}/{max_retries}): {e}")
+            await asyncio.sleep(retry_delay)
+
+# Función para obtener una sesión de base de datos con reintentos
+async def get_db(max_retries=3, retry_delay=1):
+    """Sesión de base de datos por petición; reintenta solo al conectar"""
+    db = await open_session(max_retries, retry_delay)
+    try:
+        yield db
+    finally:
+        await db.close()
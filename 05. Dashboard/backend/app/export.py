@@ -0,0 +1,206 @@
+"""
+Exportación masiva de clientes y predicciones en formato columnar.
+
+Devuelve demographics unido con prediction_results como un stream de Apache
+Arrow IPC o como Parquet, en lugar de miles de páginas de priority-list. Las
+filas se leen de un cursor del servidor (``AsyncSession.stream`` con
+``yield_per``) y cada lote se codifica y se envía antes de leer el siguiente,
+así la memoria del servidor depende del tamaño del lote y no del total de
+clientes. En Parquet cada lote es un row group.
+
+Variables de entorno:
+    EXPORT_BATCH_SIZE  Filas por lote leído del cursor (10000 por defecto)
+"""
+import os
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException, status
+from sqlalchemy import func, or_, select
+
+from .database import Client, Prediction, open_session
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "10000"))
+
+# Columna exportada -> (expresión SQL, tipo Arrow)
+COLUMNS: Dict[str, Tuple[Any, pa.DataType]] = {
+    "id": (Client.id, pa.int32()),
+    "user_id": (Client.user_id, pa.string()),
+    "age": (Client.age, pa.int32()),
+    "income_range": (Client.income_range, pa.string()),
+    "risk_profile": (Client.risk_profile, pa.string()),
+    "occupation": (Client.occupation, pa.string()),
+    "profile_category": (Client.profile_category, pa.string()),
+    "segment": (Client.segment, pa.string()),
+    "status": (func.coalesce(Client.status, "pending"), pa.string()),
+    "priority": (Client.priority, pa.string()),
+    "acquisition_date": (Client.acquisition_date, pa.timestamp("us")),
+    "last_contact_date": (Client.last_contact_date, pa.timestamp("us")),
+    "probability": (Client.probability, pa.float64()),
+    "prediction_probability": (Prediction.probability, pa.float64()),
+    "is_target": (Prediction.is_target, pa.bool_()),
+    "prediction_date": (Prediction.prediction_date, pa.timestamp("us")),
+    "actual_conversion": (Prediction.actual_conversion, pa.bool_()),
+}
+
+# Columnas que requieren unir prediction_results
+PREDICTION_COLUMNS = {"prediction_probability", "is_target", "prediction_date", "actual_conversion"}
+
+# Formato -> (media type, extensión del archivo)
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    """
+    Columnas a exportar separadas por coma; todas si no se indican.
+
+    Raises:
+        HTTPException: 400 si alguna columna no existe
+    """
+    selected = _split(columns) or list(COLUMNS)
+    unknown = [c for c in selected if c not in COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Columnas no válidas: {', '.join(unknown)}. Opciones: {', '.join(COLUMNS)}"
+        )
+    # Sin duplicados, en el orden pedido
+    return list(dict.fromkeys(selected))
+
+
+def parse_statuses(statuses: Optional[str]) -> List[str]:
+    """Estados separados por coma para el filtro ``status`` (vacío = todos)"""
+    return list(dict.fromkeys(_split(statuses)))
+
+
+def export_schema(columns: Sequence[str]) -> pa.Schema:
+    return pa.schema([pa.field(name, COLUMNS[name][1]) for name in columns])
+
+
+def export_query(columns: Sequence[str], min_probability: Optional[float] = None,
+                 statuses: Sequence[str] = ()):
+    """
+    Consulta de la exportación: solo las columnas pedidas, ordenada por id.
+
+    Args:
+        columns: Columnas de ``COLUMNS`` a seleccionar
+        min_probability: Solo clientes con probability >= este valor
+        statuses: Solo clientes con estos estados (NULL cuenta como "pending")
+    """
+    query = select(*(COLUMNS[name][0].label(name) for name in columns)).select_from(Client)
+    if PREDICTION_COLUMNS.intersection(columns):
+        # prediction_results tiene una fila por user_id (uq_prediction_results_user_id)
+        query = query.outerjoin(Prediction, Prediction.user_id == Client.user_id)
+    if min_probability is not None:
+        query = query.where(Client.probability >= min_probability)
+    if statuses:
+        condition = Client.status.in_(statuses)
+        if "pending" in statuses:
+            condition = or_(condition, Client.status.is_(None))
+        query = query.where(condition)
+    return query.order_by(Client.id)
+
+
+class _ChunkSink:
+    """Archivo de solo escritura que acumula los bytes hasta que se drenan"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _writer(fmt: str, sink: _ChunkSink, schema: pa.Schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="snappy")
+    return pa.ipc.new_stream(sink, schema)
+
+
+async def encode_batches(partitions: AsyncIterator[Sequence[Sequence[Any]]], columns: Sequence[str],
+                         fmt: str = "arrow") -> AsyncIterator[bytes]:
+    """
+    Codifica lotes de filas (tuplas en el orden de ``columns``) en Arrow IPC o
+    Parquet y entrega los bytes de cada lote en cuanto se escriben.
+
+    Sin filas se entrega igual un archivo válido con el esquema y cero filas.
+    """
+    schema = export_schema(columns)
+    sink = _ChunkSink()
+    writer = _writer(fmt, sink, schema)
+    try:
+        async for rows in partitions:
+            if not rows:
+                continue
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+async def export_stream(columns: Sequence[str], fmt: str = "arrow", min_probability: Optional[float] = None,
+                        statuses: Sequence[str] = (), batch_size: int = EXPORT_BATCH_SIZE,
+                        session_factory=None) -> AsyncIterator[bytes]:
+    """
+    Stream de la exportación leído de un cursor del servidor.
+
+    La sesión se abre aquí y no con ``Depends(get_db)``: FastAPI cierra las
+    dependencias antes de enviar el cuerpo de una ``StreamingResponse``.
+    """
+    db = await open_session(session_factory=session_factory)
+    exported = 0
+    try:
+        query = export_query(columns, min_probability, statuses).execution_options(yield_per=batch_size)
+        result = await db.stream(query)
+
+        async def partitions():
+            nonlocal exported
+            async for rows in result.partitions():
+                exported += len(rows)
+                yield rows
+
+        async for chunk in encode_batches(partitions(), columns, fmt):
+            yield chunk
+        logger.info(f"Exportación {fmt}: {exported} filas, {len(columns)} columnas")
+    except Exception as e:
+        # El código HTTP ya se envió: el cliente recibe un archivo truncado
+        logger.error(f"Error durante la exportación tras {exported} filas: {e}")
+        raise
+    finally:
+        await db.close()
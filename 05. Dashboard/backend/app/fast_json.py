@@ -0,0 +1,89 @@
+"""
+Serialización JSON rápida para el router v1.
+
+``FastJSONResponse`` renderiza con orjson: varias veces más rápido que
+``json.dumps`` y serializa directamente arrays y escalares de NumPy, fechas y
+UUID. Los NaN e infinitos salen como ``null`` (JSON válido) en lugar de un
+error.
+
+Es opcional: solo con ``FAST_JSON_ENABLED=1`` el router v1 la usa como
+``default_response_class``. Aun así FastAPI pasa lo que devuelve el endpoint
+por ``jsonable_encoder`` (y por el ``response_model``, si lo hay) antes de
+renderizar. Los endpoints con respuestas grandes o ya validadas devuelven
+``json_response(payload, response)``: con la opción activa FastAPI entrega la
+respuesta tal cual, sin recorrer el payload de nuevo, y el ``response_model``
+queda solo para la documentación de OpenAPI; sin ella ``json_response``
+devuelve el payload y FastAPI lo valida y serializa como siempre.
+
+Variables de entorno:
+    FAST_JSON_ENABLED  "0" (por defecto) o "1" para renderizar con orjson
+"""
+import os
+import decimal
+from typing import Any, Optional
+
+import numpy as np
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_ENABLED", "0") == "1"
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que orjson no serializa por sí solo"""
+    if isinstance(obj, np.ndarray):
+        # Arrays no contiguos o de dtype object
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse renderizada con orjson, con soporte de NumPy"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Clase de respuesta del router v1
+V1_RESPONSE_CLASS = FastJSONResponse if FAST_JSON_ENABLED else JSONResponse
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> Any:
+    """
+    Respuesta ya renderizada para devolver desde un endpoint sin pasar por
+    ``jsonable_encoder`` ni por el ``response_model``.
+
+    Con ``FAST_JSON_ENABLED`` desactivado devuelve ``content`` sin cambios:
+    FastAPI lo valida contra el ``response_model`` y agrega por sí mismo las
+    cabeceras de la ``Response`` inyectada.
+
+    Args:
+        content: Payload (dicts, listas, NumPy, modelos de Pydantic)
+        response: ``Response`` inyectada en el endpoint; se copian las
+            cabeceras que se le hayan agregado (p. ej. las de los snapshots)
+        status_code: Código HTTP
+    """
+    if not FAST_JSON_ENABLED:
+        return content
+    result = V1_RESPONSE_CLASS(content, status_code=status_code)
+    if response is not None:
+        result.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers if name not in (b"content-length", b"content-type")
+        )
+    return result
@@ -0,0 +1,260 @@
+"""
+Caché de vectores de features y predicciones por cliente.
+
+Volver a puntuar un cliente cuyos demographics, productos y transacciones no
+cambiaron recalcula todo ``generate_features``. ``FeatureCache`` guarda, por
+user_id, la fila de entrada del modelo y la probabilidad junto con la versión
+de los datos de origen con que se calcularon:
+
+- la versión es un hash del contenido de las filas de origen del cliente
+  (``source_versions``): si cualquiera cambia, la entrada deja de coincidir y
+  se recalcula, sin depender de que el escritor avise;
+- la entrada también registra la versión del modelo (el transformador y el
+  modelo forman parte del resultado).
+
+Es un LRU por proceso acotado en entradas y en bytes, con TTL. Las escrituras
+que conocemos invalidan explícitamente: ``update_client_status`` borra la
+entrada del cliente y ``seed_data`` reescribe el archivo de época
+(``FEATURE_CACHE_EPOCH_FILE``), que cada worker revisa antes de consultar la
+caché para vaciarla.
+
+Solo se usa con un FeatureTransformer ajustado: sin él, el escalado se ajusta
+sobre cada batch y el vector de un cliente depende del resto del batch.
+
+Variables de entorno:
+    FEATURE_CACHE_ENABLED       "1" (por defecto) o "0"
+    FEATURE_CACHE_MAX_ENTRIES   Clientes en caché (por defecto 100000)
+    FEATURE_CACHE_MAX_MB        Memoria máxima aproximada (por defecto 64)
+    FEATURE_CACHE_TTL           Segundos de vida de una entrada (por defecto 3600)
+    FEATURE_CACHE_EPOCH_FILE    Archivo de época compartido por los workers
+"""
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE_ENABLED = os.environ.get("FEATURE_CACHE_ENABLED", "1") != "0"
+FEATURE_CACHE_MAX_ENTRIES = int(os.environ.get("FEATURE_CACHE_MAX_ENTRIES", "100000"))
+FEATURE_CACHE_MAX_MB = float(os.environ.get("FEATURE_CACHE_MAX_MB", "64"))
+FEATURE_CACHE_TTL = float(os.environ.get("FEATURE_CACHE_TTL", "3600"))
+FEATURE_CACHE_EPOCH_FILE = Path(os.environ.get(
+    "FEATURE_CACHE_EPOCH_FILE", Path(__file__).parent.parent / "data" / "feature_cache.epoch"
+))
+
+# Bytes estimados por entrada además del vector (clave, tupla, nodo del LRU)
+ENTRY_OVERHEAD_BYTES = 240
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Vector de entrada del modelo y probabilidad de un cliente"""
+    data_version: int
+    model_version: str
+    features: np.ndarray
+    probability: float
+    expires_at: float
+
+
+def _row_hashes(df: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+def _per_user_hash(df: Optional[pd.DataFrame], user_ids: pd.Index) -> np.ndarray:
+    """Suma (módulo 2^64) de los hashes de las filas de cada usuario; 0 si no tiene"""
+    if df is None or len(df) == 0 or "user_id" not in df.columns:
+        return np.zeros(len(user_ids), dtype=np.uint64)
+    hashes = _row_hashes(df).groupby(df["user_id"].astype(str).to_numpy()).sum()
+    return hashes.reindex(user_ids, fill_value=0).to_numpy(dtype=np.uint64)
+
+
+def source_versions(
+    demographics: pd.DataFrame,
+    products: Optional[pd.DataFrame] = None,
+    transactions: Optional[pd.DataFrame] = None,
+    transaction_aggregates=None,
+    demographic_columns: Optional[Iterable[str]] = None,
+    salt: str = "",
+) -> np.ndarray:
+    """
+    Versión de los datos de origen de cada fila de ``demographics``: hash del
+    contenido de su fila, sus productos y sus transacciones (o sus agregados).
+
+    Args:
+        demographic_columns: Columnas de demographics que entran al pipeline;
+            por defecto todas. Excluir columnas como status o probability evita
+            invalidar por cambios que no afectan a las features.
+        salt: Texto que se mezcla en todas las versiones (p. ej. la fecha de referencia)
+    """
+    user_ids = pd.Index(demographics["user_id"].astype(str), dtype=object)
+    columns = [c for c in (demographic_columns or demographics.columns) if c in demographics.columns]
+    parts = {
+        "demographics": _row_hashes(demographics[columns]).to_numpy(dtype=np.uint64),
+        "products": _per_user_hash(products, user_ids),
+    }
+    if transaction_aggregates is not None:
+        for name in ("users", "by_category", "by_month"):
+            frame = getattr(transaction_aggregates, name).reset_index()
+            parts[f"tx_{name}"] = _per_user_hash(frame, user_ids)
+    else:
+        parts["transactions"] = _per_user_hash(transactions, user_ids)
+    parts["salt"] = np.full(len(user_ids), pd.util.hash_array(np.array([salt], dtype=object))[0], dtype=np.uint64)
+    return _row_hashes(pd.DataFrame(parts)).to_numpy(dtype=np.uint64)
+
+
+class FeatureCache:
+    """
+    LRU con TTL de ``CacheEntry`` por user_id, acotado en entradas y bytes.
+
+    Args:
+        max_entries: Número máximo de clientes
+        max_bytes: Memoria máxima aproximada (vectores + sobrecarga por entrada)
+        ttl: Segundos de vida de una entrada
+        epoch_file: Archivo cuya modificación vacía la caché (None lo desactiva)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = FEATURE_CACHE_MAX_ENTRIES,
+        max_bytes: int = int(FEATURE_CACHE_MAX_MB * 1024 * 1024),
+        ttl: float = FEATURE_CACHE_TTL,
+        epoch_file: Optional[Path] = FEATURE_CACHE_EPOCH_FILE,
+        enabled: bool = FEATURE_CACHE_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.epoch_file = Path(epoch_file) if epoch_file else None
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._epoch = self._read_epoch()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _read_epoch(self) -> Optional[Tuple[int, int]]:
+        if self.epoch_file is None:
+            return None
+        try:
+            st = os.stat(self.epoch_file)
+            return st.st_mtime_ns, st.st_ino
+        except OSError:
+            return None
+
+    def check_epoch(self):
+        """Vacía la caché si otro proceso publicó una época nueva"""
+        epoch = self._read_epoch()
+        if epoch != self._epoch:
+            self._epoch = epoch
+            if self._entries:
+                logger.info("Época de la caché de features cambió; se vacía la caché")
+                self.clear()
+
+    def get(self, user_id: str, data_version: int, model_version: str) -> Optional[CacheEntry]:
+        """Entrada vigente del cliente para esa versión de datos y modelo"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.data_version != data_version or entry.model_version != model_version:
+            self.stale += 1
+            self.misses += 1
+            self._remove(user_id)
+            return None
+        if entry.expires_at < time.monotonic():
+            self.expired += 1
+            self.misses += 1
+            self._remove(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def put(self, user_id: str, data_version: int, model_version: str, features: np.ndarray, probability: float):
+        if user_id in self._entries:
+            self._remove(user_id)
+        entry = CacheEntry(
+            data_version=int(data_version),
+            model_version=model_version,
+            features=features,
+            probability=float(probability),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries[user_id] = entry
+        self.bytes += features.nbytes + ENTRY_OVERHEAD_BYTES
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, user_id: str):
+        entry = self._entries.pop(user_id)
+        self.bytes -= entry.features.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def invalidate(self, user_ids: Iterable[str]) -> int:
+        """Borra las entradas de ``user_ids``; devuelve cuántas había"""
+        removed = 0
+        for user_id in user_ids:
+            if str(user_id) in self._entries:
+                self._remove(str(user_id))
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale": self.stale,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "pid": os.getpid(),
+        }
+
+
+def bump_feature_cache_epoch(epoch_file: Path = FEATURE_CACHE_EPOCH_FILE):
+    """
+    Publica una época nueva (escritura atómica): todos los workers vacían su
+    caché en su próxima consulta. Lo llaman los procesos que reescriben los
+    datos de origen fuera de la API (seed_data).
+    """
+    epoch_file = Path(epoch_file)
+    epoch_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = epoch_file.with_name(f".{epoch_file.name}.{os.getpid()}")
+    tmp.write_text(uuid.uuid4().hex + "\n")
+    os.replace(tmp, epoch_file)
+
+
+# Caché compartida por ml_service en este proceso
+feature_cache = FeatureCache()
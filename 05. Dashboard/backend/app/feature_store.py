@@ -0,0 +1,166 @@
+"""
+Estado de features por usuario persistido en la base de datos.
+
+Guarda los parciales de ``TransactionAggregates`` (conteos, sumas, gasto por
+categoría, buckets mensuales y última fecha de transacción) en las tablas
+``user_feature_state``, ``user_category_state`` y ``user_month_state``. Un batch
+nuevo de transacciones se reduce a parciales y se suma al estado con upserts
+aditivos, de modo que solo se tocan los usuarios afectados; sus features se
+derivan después con ``transaction_features`` igual que en un recálculo completo.
+
+Cada batch debe contener solo transacciones nuevas: volver a aplicar el mismo
+batch las contaría dos veces. Para reconstruir el estado desde cero usar
+``replace_feature_state``.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import String, select, delete, func, any_, bindparam
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import UserFeatureState, UserCategoryState, UserMonthState
+from .features.transaction_aggregates import TransactionAggregates, transaction_features
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Filas por executemany al escribir el estado
+FEATURE_STATE_CHUNK_SIZE = int(os.environ.get("FEATURE_STATE_CHUNK_SIZE", "5000"))
+
+# Modelo de cada tabla de estado -> atributo de TransactionAggregates
+FEATURE_STATE_TABLES = (
+    (UserFeatureState, "users"),
+    (UserCategoryState, "by_category"),
+    (UserMonthState, "by_month"),
+)
+
+
+def state_upsert_statement(model):
+    """
+    INSERT ... ON CONFLICT (clave) DO UPDATE que suma los parciales del batch
+    al estado existente (y conserva la fecha de transacción más reciente).
+    """
+    table = model.__table__
+    stmt = insert(table)
+    set_ = {
+        "n_tx": table.c.n_tx + stmt.excluded.n_tx,
+        "amount_sum": table.c.amount_sum + stmt.excluded.amount_sum,
+    }
+    if model is UserFeatureState:
+        set_["amount_n"] = table.c.amount_n + stmt.excluded.amount_n
+        # GREATEST ignora NULL: un batch sin fechas no borra la última conocida
+        set_["last_date"] = func.greatest(table.c.last_date, stmt.excluded.last_date)
+        set_["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=list(table.primary_key.columns), set_=set_)
+
+
+def feature_state_records(aggs: TransactionAggregates) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+    """Convierte los parciales en (modelo, parámetros) para cada tabla de estado"""
+    out = []
+    for model, attr in FEATURE_STATE_TABLES:
+        frame = getattr(aggs, attr).reset_index()
+        frame = frame.astype(object).where(frame.notna(), None)
+        out.append((model, frame.to_dict("records")))
+    return out
+
+
+async def apply_aggregates(
+    db: AsyncSession,
+    aggs: TransactionAggregates,
+    chunk_size: Optional[int] = None
+) -> List[str]:
+    """
+    Suma parciales ya calculados al estado persistido, sin confirmar la transacción.
+
+    Returns:
+        List[str]: user_id afectados, ordenados
+    """
+    chunk_size = chunk_size or FEATURE_STATE_CHUNK_SIZE
+    for model, records in feature_state_records(aggs):
+        stmt = state_upsert_statement(model)
+        for start in range(0, len(records), chunk_size):
+            await db.execute(stmt, records[start:start + chunk_size])
+    return sorted(aggs.users.index.astype(str))
+
+
+async def apply_transactions(
+    db: AsyncSession,
+    transactions_df: pd.DataFrame,
+    chunk_size: Optional[int] = None
+) -> List[str]:
+    """
+    Incorpora un batch de transacciones nuevas al estado, sin confirmar la transacción.
+
+    Args:
+        db: Sesión de SQLAlchemy async
+        transactions_df: Transacciones nuevas (transaction_id, user_id, date, amount, merchant_category)
+        chunk_size: Filas por executemany (por defecto FEATURE_STATE_CHUNK_SIZE)
+
+    Returns:
+        List[str]: user_id cuyo estado cambió
+    """
+    affected = await apply_aggregates(db, TransactionAggregates.from_transactions(transactions_df), chunk_size)
+    logger.info(f"Estado de features actualizado para {len(affected)} usuarios")
+    return affected
+
+
+def _user_filter(model, user_ids: Optional[Sequence[str]]):
+    """WHERE user_id = ANY(:user_ids) con un único parámetro array"""
+    return model.user_id == any_(bindparam("user_ids", list(user_ids), type_=ARRAY(String)))
+
+
+async def load_feature_state(db: AsyncSession, user_ids: Optional[Sequence[str]] = None) -> TransactionAggregates:
+    """
+    Lee el estado persistido como ``TransactionAggregates``.
+
+    Args:
+        db: Sesión de SQLAlchemy async
+        user_ids: Usuarios a cargar; None carga el estado completo
+    """
+    empty = TransactionAggregates.empty()
+    frames = {}
+    for model, attr in FEATURE_STATE_TABLES:
+        template = getattr(empty, attr)
+        keys = list(template.index.names)
+        query = select(*(getattr(model, c) for c in keys + list(template.columns)))
+        if user_ids is not None:
+            query = query.where(_user_filter(model, user_ids))
+        rows = (await db.execute(query)).all()
+        frame = pd.DataFrame(rows, columns=keys + list(template.columns)) if rows else template.reset_index()
+        frames[attr] = frame.astype(template.reset_index().dtypes.to_dict()).set_index(keys)
+    return TransactionAggregates(**frames)
+
+
+async def user_transaction_features(
+    db: AsyncSession,
+    user_ids: Sequence[str],
+    reference_date=None
+) -> pd.DataFrame:
+    """Features de transacciones de ``user_ids`` derivadas del estado persistido"""
+    aggs = await load_feature_state(db, user_ids)
+    return transaction_features(aggs, pd.Timestamp(reference_date or "2024-01-01"))
+
+
+def replace_feature_state(conn, aggs: TransactionAggregates, chunk_size: Optional[int] = None):
+    """
+    Reemplaza el estado completo con ``aggs`` usando una conexión síncrona
+    (scripts de carga como seed_data), sin confirmar la transacción.
+    """
+    chunk_size = chunk_size or FEATURE_STATE_CHUNK_SIZE
+    for model, records in feature_state_records(aggs):
+        model.__table__.create(conn, checkfirst=True)
+        conn.execute(delete(model))
+        stmt = insert(model.__table__)
+        for start in range(0, len(records), chunk_size):
+            conn.execute(stmt, records[start:start + chunk_size])
+
+
+async def ensure_feature_state_tables(engine):
+    """Crea las tablas de estado de features si la base de datos aún no las tiene"""
+    async with engine.begin() as conn:
+        for model, _ in FEATURE_STATE_TABLES:
+            await conn.run_sync(lambda sync_conn, table=model.__table__: table.create(sync_conn, checkfirst=True))
@@ -0,0 +1,30 @@
+"""
+Trabajos del pool de procesos de features (``inference_executor``).
+
+Los procesos hijos (spawn) deserializan las funciones por módulo: este módulo
+solo depende de ``app.features``, así un hijo no importa ``ml_service`` ni,
+con él, la API, el engine de base de datos, el modelo o las métricas del
+proceso servidor.
+"""
+import os
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from app.features.pipeline_featureengineering_func import generate_features
+
+
+def preload():
+    """Inicializador de cada proceso: el import del módulo ya cargó pandas y el pipeline"""
+
+
+def ready() -> int:
+    """Trabajo vacío del calentamiento; devuelve el PID del proceso que lo ejecutó"""
+    return os.getpid()
+
+
+def generate_features_timed(**kwargs) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """generate_features devolviendo también los segundos de cada etapa"""
+    stage_timings: Dict[str, float] = {}
+    features_df = generate_features(stage_timings=stage_timings, **kwargs)
+    return features_df, stage_timings
@@ -2,5 +2,6 @@
 Re-export de generate_features desde el módulo local pipeline_featureengineering_func
 """
 from app.features.pipeline_featureengineering_func import generate_features
+from app.features.feature_transformer import FeatureTransformer
 
-__all__ = ["generate_features"] 
\ No newline at end of file
+__all__ = ["generate_features", "FeatureTransformer"]
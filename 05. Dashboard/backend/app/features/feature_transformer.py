@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Transformador de features ajustado una sola vez (fit-once, transform-many).
+
+Encapsula la etapa final de ``generate_features``: escalado estándar de las
+variables numéricas, ``log1p`` del gasto en la categoría favorita y la
+codificación de etiquetas de las variables categóricas. Se ajusta con los
+datos de entrenamiento, se serializa a JSON junto a ``xgb_model.pkl`` y en
+scoring solo se aplica ``transform``: el resultado de un cliente ya no depende
+de con qué otros clientes se puntúe (un batch de una fila ya no escala a cero).
+
+Uso básico:
+    from app.features import generate_features, FeatureTransformer
+
+    raw = generate_features(demog, prod, tx, raw=True)          # entrenamiento
+    transformer = FeatureTransformer().fit(raw)
+    transformer.save("feature_transformer.json")
+
+    transformer = FeatureTransformer.load("feature_transformer.json")
+    df = generate_features(demog, prod, tx, transformer=transformer)
+    row = transformer.transform_row(raw_row_dict)               # scoring online
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+# Variables numéricas con escalado estándar
+SCALE_COLUMNS = [
+    "age", "dias_entre_productos", "antiguedad_cliente",
+    "numero_productos", "recencia_transaccion",
+    "variacion_mensual_promedio", "variacion_mensual_promedio_pct"
+]
+
+# Variables con transformación log1p
+LOG_COLUMNS = ["total_spend_fav"]
+
+# Variables categóricas codificadas como enteros
+CATEGORICAL_COLUMNS = [
+    "income_range", "risk_profile", "occupation", "age_range_sturges",
+    "primer_producto", "segundo_producto", "combinacion_productos",
+    "categoria_favorita_monto"
+]
+
+# Variables que se usan para derivar otras pero no entran al modelo
+DROP_COLUMNS = ["combinacion_productos"]
+
+# Etiqueta de los valores nulos en columnas no categóricas
+UNKNOWN_LABEL = "unknown"
+
+# Etiqueta que ``astype(str)`` da a los nulos de las columnas de tipo category
+CATEGORY_NULL_LABEL = "nan"
+
+# Código para etiquetas que no se vieron durante el ajuste
+UNSEEN_CODE = -1
+
+
+def _as_labels(series: pd.Series) -> pd.Series:
+    """
+    Convierte una columna a etiquetas de texto igual que la codificación
+    original: las categóricas pasan por ``astype(str)`` (los nulos quedan como
+    "nan") y el resto rellena nulos con "unknown".
+    """
+    if series.dtype.name == "category":
+        series = series.astype(str)
+    if series.isna().any():
+        series = series.fillna(UNKNOWN_LABEL)
+    return series.astype(str)
+
+
+def _null_label(series: pd.Series) -> str:
+    """Etiqueta que ``_as_labels`` da a los nulos de esta columna"""
+    return CATEGORY_NULL_LABEL if series.dtype.name == "category" else UNKNOWN_LABEL
+
+
+def _is_null(value: Any) -> bool:
+    return value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+
+class FeatureTransformer:
+    """
+    Escalado, log1p y codificación de etiquetas con parámetros fijos.
+
+    Atributos tras ``fit``:
+        scale_params: columna -> (media, escala) del StandardScaler
+        label_codes: columna -> {etiqueta: código}, códigos en orden alfabético
+            como los de LabelEncoder
+        null_labels: columna -> etiqueta de sus nulos ("nan" si era category)
+        columns: columnas de salida en orden
+    """
+
+    def __init__(self):
+        self.scale_params: Dict[str, List[float]] = {}
+        self.label_codes: Dict[str, Dict[str, int]] = {}
+        self.null_labels: Dict[str, str] = {}
+        self.columns: List[str] = []
+
+    @property
+    def is_fitted(self) -> bool:
+        return bool(self.columns)
+
+    def fit(self, df: pd.DataFrame) -> "FeatureTransformer":
+        """Aprende media/escala y vocabularios a partir de features sin transformar"""
+        present = [c for c in SCALE_COLUMNS if c in df.columns]
+        self.scale_params = {}
+        if present:
+            scaler = StandardScaler().fit(df[present])
+            self.scale_params = {
+                c: [float(m), float(s)] for c, m, s in zip(present, scaler.mean_, scaler.scale_)
+            }
+
+        self.label_codes = {}
+        self.null_labels = {}
+        for c in CATEGORICAL_COLUMNS:
+            if c in df.columns:
+                classes = sorted(_as_labels(df[c]).unique())
+                self.label_codes[c] = {label: code for code, label in enumerate(classes)}
+                self.null_labels[c] = _null_label(df[c])
+
+        self.columns = [c for c in df.columns if c not in DROP_COLUMNS]
+        return self
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Aplica la transformación ajustada a un DataFrame (no modifica el original)"""
+        if not self.is_fitted:
+            raise ValueError("FeatureTransformer no está ajustado; llamar a fit() o load()")
+        df = df.copy()
+
+        present = [c for c in self.scale_params if c in df.columns]
+        if present:
+            mean = np.array([self.scale_params[c][0] for c in present])
+            scale = np.array([self.scale_params[c][1] for c in present])
+            values = df[present].to_numpy(dtype=np.float64, copy=True)
+            values -= mean
+            values /= scale
+            df[present] = values
+
+        for c in LOG_COLUMNS:
+            if c in df.columns:
+                df[c] = np.log1p(df[c])
+
+        for c, codes in self.label_codes.items():
+            if c in df.columns:
+                df[c] = _as_labels(df[c]).map(codes).fillna(self._unseen_code(c)).astype(np.int64)
+
+        return df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def transform_row(self, row: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Transforma un único cliente (dict columna -> valor sin transformar) en
+        tiempo constante, sin pandas. Devuelve las columnas en el orden de ``columns``.
+        """
+        if not self.is_fitted:
+            raise ValueError("FeatureTransformer no está ajustado; llamar a fit() o load()")
+        out = {}
+        for c in self.columns:
+            value = row.get(c)
+            if c in self.label_codes:
+                label = self.null_labels.get(c, UNKNOWN_LABEL) if _is_null(value) else str(value)
+                out[c] = self.label_codes[c].get(label, self._unseen_code(c))
+                continue
+            if c in self.scale_params:
+                mean, scale = self.scale_params[c]
+                value = (float("nan") if value is None else float(value) - mean) / scale
+            elif c in LOG_COLUMNS:
+                value = float("nan") if value is None else math.log1p(value)
+            # El resto de columnas (user_id, flags, timestamps) pasa sin cambios
+            out[c] = value
+        return out
+
+    def _unseen_code(self, column: str) -> int:
+        """Código para etiquetas desconocidas: el de "unknown" si se aprendió, si no -1"""
+        return self.label_codes[column].get(UNKNOWN_LABEL, UNSEEN_CODE)
+
+    # ------------------------------------------------------------------
+    # Serialización
+    # ------------------------------------------------------------------
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "scale_params": self.scale_params,
+            "label_codes": self.label_codes,
+            "null_labels": self.null_labels,
+            "columns": self.columns,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeatureTransformer":
+        transformer = cls()
+        transformer.scale_params = {c: list(v) for c, v in data["scale_params"].items()}
+        transformer.label_codes = {c: dict(v) for c, v in data["label_codes"].items()}
+        # Archivos sin null_labels: "nan" solo aparece si la columna era category
+        transformer.null_labels = data.get("null_labels") or {
+            c: CATEGORY_NULL_LABEL if CATEGORY_NULL_LABEL in codes else UNKNOWN_LABEL
+            for c, codes in transformer.label_codes.items()
+        }
+        transformer.columns = list(data["columns"])
+        return transformer
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    @classmethod
+    def load(cls, path) -> "FeatureTransformer":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def load_feature_transformer(path) -> Optional[FeatureTransformer]:
+    """Carga el transformador si el archivo existe; None en caso contrario"""
+    path = Path(path)
+    if path.is_file():
+        return FeatureTransformer.load(path)
+    return None
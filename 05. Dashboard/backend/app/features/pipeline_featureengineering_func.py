@@ -17,17 +17,27 @@ Uso básico:
         transactions_df=my_transactions,
         output_file=None  # No guardar archivo, solo devolver DataFrame
     )
+
+    # Leyendo transactions.csv por chunks (archivos que no caben en memoria)
+    df_features = generate_features(transactions_chunksize=500_000)
 """
 
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from sklearn.preprocessing import StandardScaler, LabelEncoder
 import logging
 import gc      # Para gestión de memoria
+import time
 from functools import partial
 import warnings
 
+from .feature_transformer import FeatureTransformer
+from .transaction_aggregates import (
+    TransactionAggregates,
+    aggregate_transactions_csv,
+    transaction_features,
+)
+
 # Suprimir advertencias que no son críticas
 warnings.filterwarnings('ignore', category=pd.errors.PerformanceWarning)
 
@@ -37,7 +47,12 @@ def generate_features(
     transactions_df=None,
     data_raw_path=None,
     output_file=None,
-    reference_date=None
+    reference_date=None,
+    transaction_aggregates=None,
+    transactions_chunksize=None,
+    transformer=None,
+    raw=False,
+    stage_timings=None
 ):
     """
     Genera características para el modelo de predicción a partir de datos demográficos,
@@ -57,6 +72,22 @@ def generate_features(
         Ruta donde guardar el archivo CSV final. Si es None, no se guarda archivo.
     reference_date : pandas.Timestamp, optional
         Fecha de referencia para cálculos. Por defecto es "2024-01-01".
+    transaction_aggregates : TransactionAggregates, optional
+        Agregados de transacciones ya calculados (p. ej. en streaming). Si se
+        proporcionan, se ignoran transactions_df y el CSV de transacciones.
+    transactions_chunksize : int, optional
+        Si se indica y transactions_df es None, transactions.csv se lee por
+        chunks de este tamaño en lugar de cargarse completo en memoria.
+    transformer : FeatureTransformer, optional
+        Transformador ya ajustado (escalado y codificación). Si es None se
+        ajusta uno nuevo sobre este batch.
+    raw : bool, optional
+        Si es True devuelve el dataset antes de escalar y codificar (entrada
+        de FeatureTransformer.fit). No se guarda en output_file.
+    stage_timings : dict, optional
+        Si se proporciona, se llena con los segundos de cada etapa del
+        pipeline (carga, demographics, products, transactions, dataset_final,
+        transform). Ver benchmarks/profile_feature_pipeline.py.
         
     Returns
     -------
@@ -77,6 +108,15 @@ def generate_features(
         REFERENCE_DATE = pd.Timestamp(reference_date)
     
     # Funciones auxiliares
+    stage_start = [time.perf_counter()]
+
+    def mark_stage(name):
+        """Registra en stage_timings el tiempo desde la etapa anterior."""
+        now = time.perf_counter()
+        if stage_timings is not None:
+            stage_timings[name] = now - stage_start[0]
+        stage_start[0] = now
+
     def read_with_dtypes(filepath, date_cols=None, cat_cols=None):
         """Lee CSV con tipos de datos optimizados."""
         dtypes = {}
@@ -91,7 +131,15 @@ def generate_features(
     # ------------------------------------------------------------------
     # 1. Carga de datos (si no se proporcionaron DataFrames)
     # ------------------------------------------------------------------
-    if transactions_df is None:
+    if transaction_aggregates is not None:
+        transactions = None
+    elif transactions_df is None and transactions_chunksize:
+        transaction_aggregates = aggregate_transactions_csv(
+            DATA_RAW / "transactions.csv",
+            chunksize=transactions_chunksize
+        )
+        transactions = None
+    elif transactions_df is None:
         transactions = read_with_dtypes(
             DATA_RAW / "transactions.csv",
             date_cols=["date"],
@@ -134,6 +182,7 @@ def generate_features(
             products["product_type"] = products["product_type"].astype('category')
 
     logging.info("Datos preparados para procesamiento")
+    mark_stage("carga")
 
     # ------------------------------------------------------------------
     # 2. DEMOGRAPHICS – age_range_sturges
@@ -151,6 +200,7 @@ def generate_features(
         include_lowest=True
     )
     demographics["age_range_sturges"] = demographics["age_range_sturges"].astype('category')
+    mark_stage("demographics")
 
     # ------------------------------------------------------------------
     # 3. PRODUCTS – flags, fechas y métricas
@@ -223,9 +273,7 @@ def generate_features(
     prod_agg["numero_productos"] = prod_agg[flag_cols].sum(axis=1).astype('int8')
 
     # Combinación de productos
-    def _combo(row):
-        activos = [c for c in flag_cols if row[c]]
-        
+    def _combo(activos):
         # Sin productos
         if not activos:
             return "sin_productos"
@@ -241,9 +289,6 @@ def generate_features(
         # Si hay más de 2 productos (caso no esperado), usar "multi_producto"
         return "multi_producto"
 
-    # Usar procesamiento normal para esta operación
-    prod_agg["combinacion_productos"] = prod_agg.apply(_combo, axis=1)
-
     # Mapeo completo para todas las combinaciones de dos productos
     mapeo_completo = {
         # Combinaciones con checking_account
@@ -273,138 +318,33 @@ def generate_features(
         # Caso contrario, mantener el valor original
         return x
 
-    prod_agg["combinacion_productos"] = prod_agg["combinacion_productos"].map(aplicar_mapeo_completo)
+    # Vectorizado: cada cliente se resume en una máscara de bits de sus flags y
+    # la etiqueta (ya mapeada) se toma de una tabla con una entrada por máscara
+    combo_table = np.array([
+        aplicar_mapeo_completo(_combo([c for bit, c in enumerate(flag_cols) if mask >> bit & 1]))
+        for mask in range(1 << len(flag_cols))
+    ], dtype=object)
+    flag_mask = prod_agg[flag_cols].to_numpy(dtype=bool).astype(np.int64) @ (1 << np.arange(len(flag_cols)))
+    prod_agg["combinacion_productos"] = combo_table[flag_mask]
     prod_agg["combinacion_productos"] = prod_agg["combinacion_productos"].astype('category')
 
     del prod_sorted, first_products, second_products, prod_pivoted, prod_with_rank
     gc.collect()  # Liberar memoria
+    mark_stage("products")
 
     # ------------------------------------------------------------------
     # 4. TRANSACTIONS – estadísticas por usuario
     # ------------------------------------------------------------------
-    # Conteos por categoría usando pivot_table (más eficiente)
-    cat_counts = transactions.pivot_table(
-        index="user_id",
-        columns="merchant_category",
-        values="transaction_id",
-        aggfunc="count",
-        fill_value=0
-    ).add_suffix("_count").reset_index()
-
-    # Calcular estadísticas básicas (vectorizado)
-    tx_basic = (
-        transactions.groupby("user_id")
-          .agg(
-              total_transacciones        = ("transaction_id", "count"),
-              monto_promedio_transaccion = ("amount", "mean"),
-              total_spend                = ("amount", "sum"),
-              n_meses_activos            = ("date", lambda s: s.dt.to_period("M").nunique()),
-              recencia_transaccion       = ("date", lambda s: (REFERENCE_DATE - s.max()).days)
-          )
-          .reset_index()
-    )
-
-    # Obtener categoría favorita de forma más eficiente
-    cnt_cols = [c for c in cat_counts.columns if c.endswith("_count")]
-    
-    # Verificar que hay columnas de conteo antes de proceder
-    if cnt_cols:
-        # Usar argmax() en lugar de idxmax() para mayor velocidad
-        cat_counts["categoria_favorita"] = cat_counts[cnt_cols].values.argmax(axis=1)
-        # Mapear índices a nombres de categorías
-        cat_names = [c.replace("_count", "") for c in cnt_cols]
-        cat_counts["categoria_favorita"] = cat_counts["categoria_favorita"].apply(
-            lambda idx: cat_names[idx]
-        )
-
-    # Análisis de gastos por categoría vectorizado
-    sp_by_cat = transactions.pivot_table(
-        index="user_id", 
-        columns="merchant_category", 
-        values="amount", 
-        aggfunc="sum",
-        fill_value=0
-    )
-
-    # Asegurar que hay valores antes de proceder
-    if not sp_by_cat.empty and sp_by_cat.shape[1] > 0:
-        # Estas operaciones son más rápidas que usar idxmax con series
-        fav_idx = sp_by_cat.values.argmax(axis=1)
-        sp_fav = np.take_along_axis(sp_by_cat.values, fav_idx[:, np.newaxis], axis=1).squeeze()
-
-        # Crear DataFrame con los resultados
-        tx_money = pd.DataFrame({
-            "user_id": sp_by_cat.index,
-            "categoria_favorita_monto": [sp_by_cat.columns[i] for i in fav_idx],
-            "total_spend_fav": sp_fav
-        })
-
-        # Calcular HHI de forma vectorizada
-        row_sums = sp_by_cat.sum(axis=1)
-        hhi = ((sp_by_cat.div(row_sums, axis=0))**2).sum(axis=1)
-        tx_money["hhi"] = hhi.values
-    else:
-        # Crear un DataFrame vacío con las columnas correctas
-        tx_money = pd.DataFrame(columns=["user_id", "categoria_favorita_monto", "total_spend_fav", "hhi"])
-
-    # Análisis temporal por mes
-    tx_month = transactions.copy()
-    tx_month["mes"] = tx_month["date"].dt.to_period("M").dt.to_timestamp()
-
-    # Agrupación por mes (vectorizado)
-    month_agg = tx_month.groupby(["user_id", "mes"]).agg(
-        monto_mes=("amount", "sum"),
-        transacciones_mes=("transaction_id", "count")
-    ).reset_index()
-
-    # Verificar que hay datos antes de proceder
-    if not month_agg.empty:
-        # Encontrar meses con más transacciones y mayor monto
-        user_max_tx = month_agg.loc[month_agg.groupby("user_id")["transacciones_mes"].idxmax()]
-        m_best = user_max_tx[["user_id", "mes"]].rename(columns={"mes": "mes_mas_compras"})
-
-        user_max_amt = month_agg.loc[month_agg.groupby("user_id")["monto_mes"].idxmax()]
-        m_best_amt = user_max_amt[["user_id", "mes"]].rename(columns={"mes": "mes_mayor_monto"})
-
-        # Calcular diferencias entre meses
-        month_agg = month_agg.sort_values(["user_id", "mes"])
-        month_diffs = month_agg.groupby("user_id")["monto_mes"].diff().fillna(0)
-        month_pcts = month_agg.groupby("user_id")["monto_mes"].pct_change().fillna(0)
-
-        diffs = pd.DataFrame({
-            "user_id": month_agg["user_id"].unique(),
-            "variacion_mensual_promedio": month_diffs.groupby(month_agg["user_id"]).mean().values,
-            "variacion_mensual_promedio_pct": month_pcts.groupby(month_agg["user_id"]).mean().values
-        })
-    else:
-        # Crear DataFrames vacíos con las columnas correctas
-        m_best = pd.DataFrame(columns=["user_id", "mes_mas_compras"])
-        m_best_amt = pd.DataFrame(columns=["user_id", "mes_mayor_monto"])
-        diffs = pd.DataFrame(columns=["user_id", "variacion_mensual_promedio", "variacion_mensual_promedio_pct"])
-
-    # Combinar todos los resultados
-    tx_full = (tx_basic
-        .merge(cat_counts, on="user_id", how="left")
-        .merge(tx_money,   on="user_id", how="left")
-        .merge(m_best,     on="user_id", how="left")
-        .merge(m_best_amt, on="user_id", how="left")
-        .merge(diffs,      on="user_id", how="left")
-    )
-
-    # Calcular share_fav solo si total_spend y total_spend_fav existen y no son cero
-    if "total_spend_fav" in tx_full.columns and "total_spend" in tx_full.columns:
-        tx_full["share_fav"] = tx_full["total_spend_fav"] / tx_full["total_spend"].replace(0, np.nan)
-    
-    # Convertir a categórico si existe
-    if "categoria_favorita_monto" in tx_full.columns:
-        tx_full["categoria_favorita_monto"] = tx_full["categoria_favorita_monto"].astype('category')
-
-    del tx_month, month_agg
-    if 'user_max_tx' in locals():
-        del user_max_tx, user_max_amt, month_diffs, month_pcts
+    # Los agregados por usuario/categoría/mes se combinan por chunks, de modo
+    # que el mismo cálculo sirve para el DataFrame completo y para el streaming
+    if transaction_aggregates is None:
+        transaction_aggregates = TransactionAggregates.from_transactions(transactions)
+        del transactions
+    tx_full = transaction_features(transaction_aggregates, REFERENCE_DATE)
     gc.collect()  # Liberar memoria
 
     logging.info("Transacciones agregadas de forma optimizada")
+    mark_stage("transactions")
 
     # ------------------------------------------------------------------
     # 5. DATASET FINAL y transformaciones
@@ -439,43 +379,26 @@ def generate_features(
     df["variacion_mensual_promedio"] = df["variacion_mensual_promedio"].fillna(0)
     df["variacion_mensual_promedio_pct"] = df["variacion_mensual_promedio_pct"].fillna(0)
 
-    # Escalado
-    scaler = StandardScaler()
-    to_scale = [
-        "age", "dias_entre_productos", "antiguedad_cliente",
-        "numero_productos", "recencia_transaccion",
-        "variacion_mensual_promedio", "variacion_mensual_promedio_pct"
-    ]
-    present = [c for c in to_scale if c in df.columns]
-    # Usar un subset en lugar de crear copias
-    if present:
-        df[present] = scaler.fit_transform(df[present])
-
-    # Log1p (vectorizado)
-    if "total_spend_fav" in df.columns:
-        df["total_spend_fav"] = np.log1p(df["total_spend_fav"])
-
-    # Label encoding (vectorizado) - CON CAMBIO PARA MANEJAR CATEGORICAL
-    cat_vars = [
-        "income_range", "risk_profile", "occupation", "age_range_sturges",
-        "primer_producto", "segundo_producto", "combinacion_productos",
-        "categoria_favorita_monto"
-    ]
-
-    for c in cat_vars:
-        if c in df.columns:
-            # Primero convertir a string para evitar problemas con tipo 'category'
-            if df[c].dtype.name == 'category':
-                df[c] = df[c].astype(str)
-                
-            # Manejar valores nulos
-            if df[c].isna().any():
-                df[c] = df[c].fillna('unknown')
-                
-            le = LabelEncoder()
-            df[c] = le.fit_transform(df[c].astype(str))
+    mark_stage("dataset_final")
+    if raw:
+        return df
 
-    df.drop(columns=["combinacion_productos"], errors="ignore", inplace=True)
+    # Escalado, log1p y label encoding. Sin transformador ajustado se ajusta
+    # sobre este mismo batch (comportamiento original, usado en entrenamiento)
+    if transformer is None:
+        transformer = FeatureTransformer().fit(df)
+    else:
+        # Un batch sin transacciones de alguna categoría no genera su columna
+        # _count: vale 0 para quien tiene transacciones (como en el batch
+        # completo) y queda nula para quien no tiene ninguna
+        count_cols = [c for c in df.columns if c.endswith("_count")]
+        missing_counts = [c for c in transformer.columns if c.endswith("_count") and c not in df.columns]
+        if missing_counts:
+            has_tx = df[count_cols].notna().any(axis=1).to_numpy() if count_cols else np.zeros(len(df), dtype=bool)
+            for c in missing_counts:
+                df[c] = np.where(has_tx, 0.0, np.nan)
+    df = transformer.transform(df)
+    mark_stage("transform")
 
     # ------------------------------------------------------------------
     # 6. Guardar si se proporcionó output_file
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Agregados de transacciones por usuario combinables por partes.
+
+Permite procesar ``transactions.csv`` en modo streaming: el archivo se lee en
+chunks con tipos explícitos (sin la columna ``description``) y cada chunk se
+reduce a sumas y conteos por usuario, categoría y mes. Como esos parciales se
+combinan sumando, la memoria pico depende del tamaño del chunk y del número de
+usuarios, no del tamaño del archivo.
+
+Uso básico:
+    from app.features.transaction_aggregates import aggregate_transactions_csv
+    from app.features import generate_features
+
+    aggs = aggregate_transactions_csv("data/raw/transactions.csv", chunksize=500_000)
+    df_features = generate_features(transaction_aggregates=aggs, output_file=None)
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+# Columnas que usa el pipeline; ``description`` (texto libre) nunca se carga
+TRANSACTION_COLUMNS = ["transaction_id", "user_id", "date", "amount", "merchant_category"]
+TRANSACTION_DTYPES = {
+    "transaction_id": "string",
+    "user_id": "string",
+    "amount": "float64",
+    "merchant_category": "category",
+}
+
+# Filas por chunk por defecto en modo streaming
+DEFAULT_CHUNKSIZE = 250_000
+
+
+def iter_transaction_chunks(source, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """
+    Lee un CSV de transacciones por chunks con tipos explícitos.
+
+    Parameters
+    ----------
+    source : str, Path o buffer
+        Ruta del CSV o cualquier objeto de lectura aceptado por ``pd.read_csv``.
+    chunksize : int
+        Número de filas por chunk.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Chunk con las columnas de TRANSACTION_COLUMNS y ``date`` como datetime.
+    """
+    reader = pd.read_csv(
+        source,
+        usecols=TRANSACTION_COLUMNS,
+        dtype=TRANSACTION_DTYPES,
+        parse_dates=["date"],
+        chunksize=chunksize,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+@dataclass
+class TransactionAggregates:
+    """
+    Parciales por usuario a partir de los cuales se derivan las features de
+    transacciones de ``generate_features``.
+
+    - ``users``: por user_id -> n_tx, amount_sum, amount_n, last_date
+    - ``by_category``: por (user_id, merchant_category) -> n_tx, amount_sum
+    - ``by_month``: por (user_id, mes) -> n_tx, amount_sum
+
+    ``n_tx`` cuenta ``transaction_id`` no nulos y ``amount_n`` montos no nulos,
+    igual que los ``count``/``mean`` del cálculo sobre el DataFrame completo.
+    """
+    users: pd.DataFrame
+    by_category: pd.DataFrame
+    by_month: pd.DataFrame
+
+    @classmethod
+    def empty(cls) -> "TransactionAggregates":
+        """Agregados sin transacciones"""
+        return cls.from_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))
+
+    @classmethod
+    def from_transactions(cls, transactions: pd.DataFrame) -> "TransactionAggregates":
+        """
+        Reduce un DataFrame (o un chunk) de transacciones a sus parciales.
+
+        user_id, categoría y mes se factorizan una sola vez y las agrupaciones se
+        hacen sobre claves enteras compuestas (agrupar por strings es el costo
+        dominante); las claves se decodifican al final.
+        """
+        user_codes, user_ids = pd.factorize(transactions["user_id"].astype(object), sort=True)
+        cat_codes, categories = pd.factorize(transactions["merchant_category"].astype(object), sort=True)
+        dates = pd.to_datetime(transactions["date"])
+        months = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]")
+        has_month = ~np.isnat(months)
+        month_codes = months.astype(np.int64)
+        first_month = month_codes[has_month].min() if has_month.any() else 0
+        n_months = int(month_codes[has_month].max() - first_month + 1) if has_month.any() else 1
+
+        tx = pd.DataFrame({
+            "user": user_codes.astype(np.int64),
+            "has_id": transactions["transaction_id"].notna().to_numpy(dtype=np.int64),
+            "amount": pd.to_numeric(transactions["amount"]).to_numpy(dtype=np.float64),
+            "has_amount": transactions["amount"].notna().to_numpy(dtype=np.int64),
+            "date": dates.to_numpy(),
+        })
+        valid = user_codes >= 0
+
+        # sort=False + sort_index: ordenar los grupos ya reducidos es más barato
+        # que ordenar las claves de todas las filas
+        users = tx[valid].groupby("user", sort=False).agg(
+            n_tx=("has_id", "sum"),
+            amount_sum=("amount", "sum"),
+            amount_n=("has_amount", "sum"),
+            last_date=("date", "max"),
+        ).sort_index()
+        users.index = pd.Index(user_ids.take(users.index.to_numpy()), dtype=object, name="user_id")
+
+        sums = {"n_tx": ("has_id", "sum"), "amount_sum": ("amount", "sum")}
+
+        n_cats = max(len(categories), 1)
+        in_cat = valid & (cat_codes >= 0)
+        by_category = tx.loc[in_cat, ["has_id", "amount"]].groupby(
+            tx["user"].to_numpy()[in_cat] * n_cats + cat_codes[in_cat], sort=False
+        ).agg(**sums).sort_index()
+        keys = by_category.index.to_numpy()
+        by_category.index = pd.MultiIndex.from_arrays(
+            [user_ids.take(keys // n_cats), categories.take(keys % n_cats)],
+            names=["user_id", "merchant_category"],
+        )
+
+        in_month = valid & has_month
+        by_month = tx.loc[in_month, ["has_id", "amount"]].groupby(
+            tx["user"].to_numpy()[in_month] * n_months + (month_codes[in_month] - first_month), sort=False
+        ).agg(**sums).sort_index()
+        keys = by_month.index.to_numpy()
+        by_month.index = pd.MultiIndex.from_arrays(
+            [
+                user_ids.take(keys // n_months),
+                pd.DatetimeIndex((first_month + keys % n_months).astype("datetime64[M]").astype("datetime64[ns]")),
+            ],
+            names=["user_id", "mes"],
+        )
+
+        return cls(users=users, by_category=by_category, by_month=by_month)
+
+    @classmethod
+    def combine(cls, parts: List["TransactionAggregates"]) -> "TransactionAggregates":
+        """Combina parciales: suma conteos y montos, máximo de la última fecha"""
+        if len(parts) == 1:
+            return parts[0]
+        users = pd.concat([p.users for p in parts]).groupby(level=0).agg({
+            "n_tx": "sum",
+            "amount_sum": "sum",
+            "amount_n": "sum",
+            "last_date": "max",
+        })
+        by_category = pd.concat([p.by_category for p in parts]).groupby(level=[0, 1]).sum()
+        by_month = pd.concat([p.by_month for p in parts]).groupby(level=[0, 1]).sum()
+        return cls(users=users, by_category=by_category, by_month=by_month)
+
+    def merge(self, other: "TransactionAggregates") -> "TransactionAggregates":
+        """Combina estos parciales con ``other``"""
+        return TransactionAggregates.combine([self, other])
+
+    def select(self, user_ids) -> "TransactionAggregates":
+        """Parciales solo de ``user_ids``"""
+        user_ids = pd.Index(user_ids, dtype=object)
+        return TransactionAggregates(
+            users=self.users[self.users.index.isin(user_ids)],
+            by_category=self.by_category[self.by_category.index.get_level_values(0).isin(user_ids)],
+            by_month=self.by_month[self.by_month.index.get_level_values(0).isin(user_ids)],
+        )
+
+    def __len__(self) -> int:
+        """Filas de estado retenidas (medida del tamaño en memoria)"""
+        return len(self.users) + len(self.by_category) + len(self.by_month)
+
+
+def aggregate_transaction_chunks(chunks: Iterable[pd.DataFrame]) -> TransactionAggregates:
+    """
+    Acumula los parciales de una secuencia de chunks de transacciones.
+
+    Los parciales pendientes se combinan con el estado acumulado cuando igualan
+    su tamaño, así cada fila de estado se reagrupa un número logarítmico de
+    veces en lugar de una vez por chunk.
+    """
+    state = None
+    pending: List[TransactionAggregates] = []
+    pending_rows = 0
+    for chunk in chunks:
+        part = TransactionAggregates.from_transactions(chunk)
+        pending.append(part)
+        pending_rows += len(part)
+        if state is None or pending_rows >= len(state):
+            state = TransactionAggregates.combine(([state] if state is not None else []) + pending)
+            pending, pending_rows = [], 0
+    if pending:
+        state = TransactionAggregates.combine([state] + pending)
+    return state if state is not None else TransactionAggregates.empty()
+
+
+def aggregate_transactions_csv(source, chunksize: int = DEFAULT_CHUNKSIZE) -> TransactionAggregates:
+    """Lee un CSV de transacciones en modo streaming y devuelve sus agregados"""
+    return aggregate_transaction_chunks(iter_transaction_chunks(source, chunksize))
+
+
+def transaction_features(aggs: TransactionAggregates, reference_date: pd.Timestamp) -> pd.DataFrame:
+    """
+    Deriva las features de transacciones por usuario a partir de los agregados.
+
+    Produce las mismas columnas, en el mismo orden, que la sección de
+    transacciones de ``generate_features`` calculada sobre el DataFrame completo.
+
+    Parameters
+    ----------
+    aggs : TransactionAggregates
+        Parciales acumulados.
+    reference_date : pandas.Timestamp
+        Fecha de referencia para la recencia.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Una fila por usuario con transacciones.
+    """
+    users = aggs.users.sort_index()
+
+    # Estadísticas básicas
+    tx_basic = pd.DataFrame({
+        "user_id": users.index.values,
+        "total_transacciones": users["n_tx"].astype("int64").values,
+        "monto_promedio_transaccion": (users["amount_sum"] / users["amount_n"].replace(0, np.nan)).values,
+        "total_spend": users["amount_sum"].astype("float64").values,
+        "n_meses_activos": aggs.by_month.groupby(level=0).size().reindex(users.index, fill_value=0).astype("int64").values,
+        "recencia_transaccion": (reference_date - users["last_date"]).dt.days.values,
+    })
+
+    # Conteos y gasto por categoría (columnas en orden alfabético de categoría)
+    counts = aggs.by_category["n_tx"].unstack(fill_value=0).sort_index(axis=1).astype("int64")
+    spend = aggs.by_category["amount_sum"].unstack(fill_value=0).sort_index(axis=1).astype("float64")
+    counts.columns = counts.columns.astype(str)
+    spend.columns = spend.columns.astype(str)
+
+    cat_counts = counts.add_suffix("_count")
+    cat_counts.columns.name = None
+    cat_counts = cat_counts.reset_index()
+    cnt_cols = [c for c in cat_counts.columns if c.endswith("_count")]
+    if cnt_cols:
+        cat_names = np.array([c.replace("_count", "") for c in cnt_cols], dtype=object)
+        cat_counts["categoria_favorita"] = cat_names[cat_counts[cnt_cols].values.argmax(axis=1)]
+
+    if not spend.empty and spend.shape[1] > 0:
+        fav_idx = spend.values.argmax(axis=1)
+        sp_fav = np.take_along_axis(spend.values, fav_idx[:, np.newaxis], axis=1)[:, 0]
+        tx_money = pd.DataFrame({
+            "user_id": spend.index.values,
+            "categoria_favorita_monto": np.array(spend.columns, dtype=object)[fav_idx],
+            "total_spend_fav": sp_fav,
+        })
+        row_sums = spend.sum(axis=1)
+        tx_money["hhi"] = ((spend.div(row_sums, axis=0)) ** 2).sum(axis=1).values
+    else:
+        tx_money = pd.DataFrame(columns=["user_id", "categoria_favorita_monto", "total_spend_fav", "hhi"])
+
+    # Análisis temporal por mes
+    month_agg = aggs.by_month.rename(columns={"amount_sum": "monto_mes", "n_tx": "transacciones_mes"})
+    month_agg = month_agg[["monto_mes", "transacciones_mes"]].sort_index().reset_index()
+
+    if not month_agg.empty:
+        # month_agg está ordenado por user_id: el código de usuario es el número
+        # de cambios de user_id hasta la fila, así que se agrupa por enteros en
+        # lugar de volver a factorizar los strings en cada groupby
+        user_col = month_agg["user_id"].to_numpy()
+        user_codes = np.r_[0, np.cumsum(user_col[1:] != user_col[:-1])]
+        by_user = month_agg.groupby(user_codes, sort=False)
+
+        user_max_tx = month_agg.loc[by_user["transacciones_mes"].idxmax()]
+        m_best = user_max_tx[["user_id", "mes"]].rename(columns={"mes": "mes_mas_compras"})
+
+        user_max_amt = month_agg.loc[by_user["monto_mes"].idxmax()]
+        m_best_amt = user_max_amt[["user_id", "mes"]].rename(columns={"mes": "mes_mayor_monto"})
+
+        # diff/pct_change con shift nativo por grupo: groupby.pct_change recorre
+        # los grupos en Python (monto_mes nunca es nulo, no requiere ffill)
+        prev_month = by_user["monto_mes"].shift(1)
+        month_diffs = (month_agg["monto_mes"] - prev_month).fillna(0)
+        month_pcts = (month_agg["monto_mes"] / prev_month - 1).fillna(0)
+
+        diffs = pd.DataFrame({
+            "user_id": user_col[np.r_[True, user_col[1:] != user_col[:-1]]],
+            "variacion_mensual_promedio": month_diffs.groupby(user_codes, sort=False).mean().values,
+            "variacion_mensual_promedio_pct": month_pcts.groupby(user_codes, sort=False).mean().values
+        })
+    else:
+        m_best = pd.DataFrame(columns=["user_id", "mes_mas_compras"])
+        m_best_amt = pd.DataFrame(columns=["user_id", "mes_mayor_monto"])
+        diffs = pd.DataFrame(columns=["user_id", "variacion_mensual_promedio", "variacion_mensual_promedio_pct"])
+
+    tx_full = (tx_basic
+        .merge(cat_counts, on="user_id", how="left")
+        .merge(tx_money,   on="user_id", how="left")
+        .merge(m_best,     on="user_id", how="left")
+        .merge(m_best_amt, on="user_id", how="left")
+        .merge(diffs,      on="user_id", how="left")
+    )
+
+    tx_full["share_fav"] = tx_full["total_spend_fav"] / tx_full["total_spend"].replace(0, np.nan)
+    tx_full["categoria_favorita_monto"] = tx_full["categoria_favorita_monto"].astype("category")
+    return tx_full
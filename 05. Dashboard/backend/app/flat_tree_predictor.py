@@ -0,0 +1,334 @@
+"""
+Evaluador NumPy del ensemble de árboles de XGBoost.
+
+Para puntuar un cliente suelto el costo de XGBoost es casi todo fijo (llamada
+a la librería nativa, validación, reserva de buffers). ``FlatTreePredictor``
+exporta los árboles del Booster a arreglos planos de nodos (feature, umbral,
+dirección por defecto y valor de hoja, en árboles completos ordenados como
+heap) y los evalúa en NumPy para todos los árboles y filas a la vez: una
+comparación de todas las condiciones, un producto matricial que elige la hoja
+de cada árbol y una suma de hojas.
+
+El evaluador gana en lotes pequeños; a partir de ``FLAT_TREE_MAX_ROWS`` filas
+XGBoost es más rápido y, si se le pasa, el lote se delega en el Booster.
+
+Reproduce la semántica de XGBoost: ``x < umbral`` va a la izquierda (en
+float32), los valores ausentes siguen la dirección por defecto del nodo y el
+margen parte de ``base_score``. Solo admite ``gbtree`` con
+``binary:logistic`` y splits numéricos.
+
+Exportación (opcional, ver scripts/export_flat_model.py):
+
+    predictor = FlatTreePredictor.from_model(model)
+    predictor.save("xgb_model.flat.npz")
+
+Con ``INFERENCE_BACKEND=flat`` el registro usa el archivo exportado junto al
+modelo si existe y coincide con él; si no, compila los árboles al cargar.
+"""
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from .booster_predictor import model_matrix
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Archivo exportado junto a xgb_model.pkl
+FLAT_MODEL_FILE = "xgb_model.flat.npz"
+
+# Filas hasta las que se usa el evaluador plano (más filas van al Booster)
+FLAT_TREE_MAX_ROWS = int(os.environ.get("FLAT_TREE_MAX_ROWS", "8"))
+
+# Tolerancia de la verificación contra XGBoost (sumas en float64 vs float32)
+VERIFY_ATOL = 1e-5
+
+
+class FlatTreePredictor:
+    """
+    ``predict_proba`` de un clasificador binario a partir de arreglos de nodos.
+
+    Cada árbol se completa hasta la profundidad máxima del ensemble y se guarda
+    en orden de heap (hijos de ``i`` en ``2i+1`` y ``2i+2``): ``feature``,
+    ``threshold`` y ``default_left`` tienen forma (árboles, 2^D - 1) y
+    ``value`` (árboles, 2^D). Una hoja a menor profundidad se extiende con
+    nodos que siempre van a la izquierda y repiten su valor.
+
+    Como todos los árboles tienen la misma forma, el camino a cada hoja es el
+    mismo para todos: ``_paths[nodo, hoja]`` vale +1 si el camino a la hoja va
+    a la izquierda en ese nodo y -1 si va a la derecha. Con las condiciones
+    ``go_left`` (0/1) de un árbol, ``go_left @ _paths`` alcanza el número de
+    giros a la izquierda del camino solo en la hoja a la que llega la fila.
+
+    Args:
+        large_batch: Predictor (p. ej. ``BoosterPredictor``) para lotes de más
+            de ``max_rows`` filas; None evalúa todo en NumPy
+    """
+
+    backend = "flat"
+
+    ARRAYS = ("feature", "threshold", "default_left", "value")
+
+    # Profundidad máxima admitida (el tamaño crece como 2^D por árbol)
+    MAX_DEPTH = 10
+
+    # Filas por bloque: acota la memoria de la matriz de condiciones
+    CHUNK_ROWS = 4096
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        default_left: np.ndarray,
+        value: np.ndarray,
+        base_margin: float,
+        n_features: int,
+        feature_names: Optional[List[str]] = None,
+        missing: float = np.nan,
+        large_batch: Any = None,
+        max_rows: int = FLAT_TREE_MAX_ROWS,
+    ):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float32)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+        self.value = np.ascontiguousarray(value, dtype=np.float32)
+        self.n_trees, n_internal = self.feature.shape
+        self.max_depth = int(np.log2(n_internal + 1))
+        self.base_margin = float(base_margin)
+        self.n_features_in_ = int(n_features)
+        self.feature_names = list(feature_names) if feature_names else None
+        self.missing = missing
+        self.large_batch = large_batch
+        self.max_rows = max_rows
+        self._feature_flat = self.feature.ravel()
+        self._threshold_flat = self.threshold.ravel()
+        self._default_left_flat = self.default_left.ravel()
+        self._paths, self._left_turns = _heap_paths(self.max_depth)
+
+    @classmethod
+    def from_model(
+        cls,
+        model: Any,
+        feature_names: Optional[List[str]] = None,
+        iteration_range: Optional[Tuple[int, int]] = None,
+    ) -> "FlatTreePredictor":
+        """
+        Compila un ``XGBClassifier`` (o su ``Booster``) binario.
+
+        Raises:
+            ValueError: si el modelo no es gbtree binary:logistic con splits
+                numéricos y profundidad hasta MAX_DEPTH
+        """
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        if iteration_range is None:
+            iteration_range = model._get_iteration_range(None) if hasattr(model, "_get_iteration_range") else (0, 0)
+        if feature_names is None:
+            names = getattr(model, "feature_names_in_", None)
+            feature_names = [str(n) for n in names] if names is not None else None
+        missing = getattr(model, "missing", np.nan)
+
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        objective = learner["objective"]["name"]
+        gradient_booster = learner["gradient_booster"]
+        if objective != "binary:logistic" or gradient_booster["name"] != "gbtree":
+            raise ValueError(f"Modelo no soportado: {gradient_booster['name']} / {objective}")
+
+        base_score = float(learner["learner_model_param"]["base_score"])
+        n_features = int(learner["learner_model_param"]["num_feature"])
+        trees = gradient_booster["model"]["trees"]
+        begin, end = iteration_range
+        if end > 0:
+            per_round = int(gradient_booster["model"]["gbtree_model_param"].get("num_parallel_tree", 1))
+            trees = trees[begin * per_round:end * per_round]
+        if not trees:
+            raise ValueError("El modelo no tiene árboles")
+        if any(int(t) != 0 for tree in trees for t in tree.get("split_type", [])):
+            raise ValueError("Splits categóricos no soportados")
+
+        depth = max(_tree_depth(tree) for tree in trees)
+        if depth > cls.MAX_DEPTH:
+            raise ValueError(f"Profundidad {depth} mayor que {cls.MAX_DEPTH}")
+        depth = max(depth, 1)
+        n_internal = 2 ** depth - 1
+        feature = np.zeros((len(trees), n_internal), dtype=np.intp)
+        threshold = np.full((len(trees), n_internal), np.inf, dtype=np.float32)
+        default_left = np.ones((len(trees), n_internal), dtype=bool)
+        value = np.zeros((len(trees), 2 ** depth), dtype=np.float32)
+        for t, tree in enumerate(trees):
+            _fill_heap(tree, depth, feature[t], threshold[t], default_left[t], value[t])
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            default_left=default_left,
+            value=value,
+            base_margin=float(np.log(base_score / (1 - base_score))),
+            n_features=n_features,
+            feature_names=feature_names,
+            missing=missing if missing is not None else np.nan,
+        )
+
+    def matrix(self, X) -> np.ndarray:
+        return model_matrix(X, self.feature_names, self.n_features_in_)
+
+    def predict_margin(self, X) -> np.ndarray:
+        """Margen (log-odds) evaluado siempre en NumPy"""
+        X = self.matrix(X)
+        if len(X) > self.CHUNK_ROWS:
+            return np.concatenate([
+                self._margin(X[start:start + self.CHUNK_ROWS]) for start in range(0, len(X), self.CHUNK_ROWS)
+            ])
+        return self._margin(X)
+
+    def _margin(self, X: np.ndarray) -> np.ndarray:
+        # Condición de todos los nodos: (filas, árboles x nodos internos)
+        values = X.take(self._feature_flat, axis=1)
+        go_left = values < self._threshold_flat
+        absent = np.isnan(values) if np.isnan(self.missing) else (np.isnan(values) | (values == np.float32(self.missing)))
+        if absent.any():
+            go_left = np.where(absent, self._default_left_flat, go_left)
+
+        # Hoja alcanzada en cada árbol: (filas, árboles, hojas) con un único True
+        go_left = go_left.reshape(len(X), self.n_trees, -1).astype(np.float32)
+        reached = (go_left @ self._paths) == self._left_turns
+        return np.einsum("ntl,tl->n", reached, self.value, dtype=np.float64) + self.base_margin
+
+    def predict_positive(self, X) -> np.ndarray:
+        """Probabilidad de la clase positiva (vector de n filas)"""
+        X = self.matrix(X)
+        if self.large_batch is not None and len(X) > self.max_rows:
+            return self.large_batch.predict_positive(X)
+        return 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+
+    def predict_proba(self, X) -> np.ndarray:
+        positive = self.predict_positive(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def verify(self, model: Any, n_rows: int = 256, seed: int = 0) -> float:
+        """
+        Compara con ``model.predict_proba`` sobre filas aleatorias (con valores
+        ausentes) y devuelve la diferencia máxima.
+
+        Raises:
+            ValueError: si la diferencia supera VERIFY_ATOL
+        """
+        rng = np.random.default_rng(seed)
+        # Valores alrededor de los umbrales reales para recorrer todas las ramas
+        thresholds = self.threshold[np.isfinite(self.threshold)]
+        X = rng.choice(thresholds, size=(n_rows, self.n_features_in_)) if len(thresholds) else np.zeros((n_rows, self.n_features_in_))
+        X = (X + rng.normal(scale=1e-3, size=X.shape)).astype(np.float32)
+        X[rng.random(X.shape) < 0.1] = np.nan
+        positive = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        diff = float(np.abs(positive - np.asarray(model.predict_proba(X))[:, 1]).max())
+        if diff > VERIFY_ATOL:
+            raise ValueError(f"El evaluador plano difiere de XGBoost en {diff:.2e}")
+        return diff
+
+    def save(self, path):
+        """Guarda los arreglos y metadatos en un .npz"""
+        meta = {
+            "base_margin": self.base_margin,
+            "n_features": self.n_features_in_,
+            "feature_names": self.feature_names,
+            "missing": None if np.isnan(self.missing) else float(self.missing),
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)), **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path) -> "FlatTreePredictor":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in cls.ARRAYS}
+        return cls(
+            **arrays,
+            base_margin=meta["base_margin"],
+            n_features=meta["n_features"],
+            feature_names=meta["feature_names"],
+            missing=np.nan if meta["missing"] is None else meta["missing"],
+        )
+
+
+def _tree_depth(tree: dict) -> int:
+    """Profundidad máxima de un árbol en el formato JSON de XGBoost"""
+    depth = {0: 0}
+    # XGBoost numera los hijos después del padre
+    for node, (left, right) in enumerate(zip(tree["left_children"], tree["right_children"])):
+        if left != -1:
+            depth[left] = depth[right] = depth[node] + 1
+    return max(depth.values())
+
+
+def _heap_paths(depth: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matriz de caminos de un árbol completo: +1 si el camino a la hoja gira a
+    la izquierda en el nodo, -1 si gira a la derecha, y giros a la izquierda
+    de cada camino.
+    """
+    n_internal = 2 ** depth - 1
+    paths = np.zeros((n_internal, 2 ** depth), dtype=np.float32)
+    for leaf in range(2 ** depth):
+        pos = n_internal + leaf
+        while pos > 0:
+            parent = (pos - 1) // 2
+            paths[parent, leaf] = 1.0 if pos == 2 * parent + 1 else -1.0
+            pos = parent
+    return paths, (paths == 1.0).sum(axis=0).astype(np.float32)
+
+
+def _fill_heap(tree: dict, depth: int, feature, threshold, default_left, value):
+    """Copia un árbol de XGBoost a las posiciones de heap de un árbol completo"""
+    n_internal = 2 ** depth - 1
+    left, right = tree["left_children"], tree["right_children"]
+    stack = [(0, 0, 0)]  # (nodo XGBoost, posición en el heap, profundidad)
+    while stack:
+        node, pos, level = stack.pop()
+        if left[node] == -1:
+            # Hoja: todas las hojas del subárbol completo bajo pos valen lo mismo
+            # (las posiciones internas ya quedan con umbral inf -> izquierda)
+            first = pos
+            for _ in range(depth - level):
+                first = 2 * first + 1
+            span = 2 ** (depth - level)
+            value[first - n_internal:first - n_internal + span] = tree["split_conditions"][node]
+            continue
+        feature[pos] = tree["split_indices"][node]
+        threshold[pos] = tree["split_conditions"][node]
+        default_left[pos] = bool(tree["default_left"][node])
+        stack.append((left[node], 2 * pos + 1, level + 1))
+        stack.append((right[node], 2 * pos + 2, level + 1))
+
+
+def flat_tree_predictor(
+    model: Any,
+    feature_names: Optional[List[str]] = None,
+    path: Optional[Path] = None,
+    large_batch: Any = None,
+) -> Optional[FlatTreePredictor]:
+    """
+    Evaluador plano para ``model``: el exportado en ``path`` si existe y
+    coincide con el modelo, o compilado al vuelo. None si el modelo no está
+    soportado.
+    """
+    if path is not None and Path(path).is_file():
+        try:
+            predictor = FlatTreePredictor.load(path)
+            if feature_names and predictor.feature_names and predictor.feature_names != list(feature_names):
+                raise ValueError("El orden de columnas no coincide con el esquema")
+            predictor.verify(model)
+            predictor.large_batch = large_batch
+            return predictor
+        except Exception as e:
+            logger.warning(f"Se ignora {path}; se compila el modelo al cargar: {e}")
+    try:
+        predictor = FlatTreePredictor.from_model(model, feature_names)
+        predictor.verify(model)
+        predictor.large_batch = large_batch
+        return predictor
+    except Exception as e:
+        logger.warning(f"No se pudo usar el evaluador plano: {e}")
+        return None
@@ -0,0 +1,335 @@
+"""
+Cubo preagregado del mapa de calor.
+
+``heatmap_cube`` guarda una celda por combinación de edad agrupada
+(``AGE_BINS``), decil de probabilidad y cada columna categórica de
+demographics (ingresos, perfil de riesgo, ocupación, segmento, estado). Cada
+celda lleva el número de clientes y, de su probabilidad, el conteo de valores
+no nulos, la suma, la suma de cuadrados y cuántos superan el umbral. Con eso
+cualquier par de ejes y cualquier métrica (conteo, probabilidad media y su
+desviación, clientes en riesgo y su tasa, conversión) se responde sumando
+celdas del cubo, sin recorrer demographics; ``heatmap_matrix`` arma la matriz
+densa que devuelve ``/api/v1/metrics/heatmap``.
+
+Mantenimiento:
+
+- ``rebuild_cube`` lo recalcula completo; es el builder del snapshot
+  ``heatmap``, que no depende de ningún tipo de cambio: solo se reconstruye
+  cuando ``invalidate_all_snapshots`` lo invalida (``seed_data`` reemplaza
+  demographics) o cambian los bordes. ``write_batch`` no lo invalida porque
+  escribe prediction_results y el cubo lee ``demographics.probability``;
+- ``apply_client_delta`` resta (``sign=-1``) o suma (``sign=1``) la aportación
+  de unos clientes dentro de la transacción del llamador: se resta antes de
+  modificarlos y se suma después, como en ``update_client_status``.
+
+Los agrupamientos se definen una sola vez como expresiones SQL
+(``width_bucket`` sobre los bordes configurados) y los usan tanto la
+reconstrucción como los deltas. Los bordes forman parte de los parámetros del
+snapshot: al cambiarlos el cubo se reconstruye en la siguiente lectura.
+
+Variables de entorno:
+    HEATMAP_AGE_EDGES          Bordes de los rangos de edad (por defecto "18,26,36,46,56":
+                               <18, 18-25, 26-35, 36-45, 46-55, 56+)
+    HEATMAP_PROBABILITY_EDGES  Bordes de los rangos de probabilidad (por defecto deciles
+                               de 0 a 1); los valores fuera del rango caen en el primero
+                               o el último
+"""
+import os
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import array, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import Client, HeatmapCell, MetricSnapshot
+from .snapshot import snapshot_builder, snapshot_key
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Valor de las dimensiones sin dato
+MISSING = "N/A"
+
+
+def parse_edges(value: str) -> Tuple[float, ...]:
+    """Bordes separados por comas, estrictamente crecientes"""
+    edges = tuple(float(v) for v in value.split(",") if v.strip())
+    if len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError(f"Bordes no válidos (se esperan al menos dos valores crecientes): {value!r}")
+    return edges
+
+
+AGE_EDGES = parse_edges(os.environ.get("HEATMAP_AGE_EDGES", "18,26,36,46,56"))
+PROBABILITY_EDGES = parse_edges(
+    os.environ.get("HEATMAP_PROBABILITY_EDGES", ",".join(f"{i / 10:.1f}" for i in range(11)))
+)
+
+
+def open_bin_labels(edges: Sequence[float]) -> List[str]:
+    """Rangos de enteros abiertos en los extremos: <18, 18-25, ..., 56+"""
+    edges = [int(e) for e in edges]
+    labels = [f"<{edges[0]}"]
+    labels += [f"{low}-{high - 1}" for low, high in zip(edges, edges[1:])]
+    labels.append(f"{edges[-1]}+")
+    return labels
+
+
+def closed_bin_labels(edges: Sequence[float]) -> List[str]:
+    """Rangos continuos entre el primer y el último borde: 0.0-0.1, ..., 0.9-1.0"""
+    decimals = max(1, *(len(f"{e:g}".partition(".")[2]) for e in edges))
+    return [f"{low:.{decimals}f}-{high:.{decimals}f}" for low, high in zip(edges, edges[1:])]
+
+
+AGE_BINS = tuple(open_bin_labels(AGE_EDGES))
+PROBABILITY_BINS = tuple(closed_bin_labels(PROBABILITY_EDGES))
+
+
+def age_bin(age, edges: Sequence[float] = AGE_EDGES):
+    """Rango de edad en SQL: width_bucket devuelve 0 bajo el primer borde y len(edges) desde el último"""
+    bucket = func.width_bucket(age, array([float(e) for e in edges]))
+    return case({i: label for i, label in enumerate(open_bin_labels(edges))}, value=bucket, else_=MISSING)
+
+
+def probability_bin(probability, edges: Sequence[float] = PROBABILITY_EDGES):
+    """Rango de probabilidad en SQL; el último rango incluye su borde superior"""
+    labels = closed_bin_labels(edges)
+    bucket = func.least(func.greatest(func.width_bucket(probability, array([float(e) for e in edges])), 1), len(labels))
+    return case({i + 1: label for i, label in enumerate(labels)}, value=bucket, else_=MISSING)
+
+
+# Dimensiones del cubo: columna de heatmap_cube -> expresión sobre demographics
+DIMENSIONS = {
+    "age_bin": age_bin(Client.age),
+    "probability_bin": probability_bin(Client.probability),
+    "income_range": func.coalesce(Client.income_range, MISSING),
+    "risk_profile": func.coalesce(Client.risk_profile, MISSING),
+    "occupation": func.coalesce(Client.occupation, MISSING),
+    "segment": func.coalesce(Client.segment, MISSING),
+    "status": func.coalesce(Client.status, MISSING),
+}
+
+# Ejes del mapa de calor -> columna del cubo
+AXES = {
+    "age": "age_bin",
+    "probability": "probability_bin",
+    "income_range": "income_range",
+    "risk_profile": "risk_profile",
+    "occupation": "occupation",
+    "segment": "segment",
+    "status": "status",
+}
+
+# Orden fijo de las categorías de los ejes agrupados
+AXIS_ORDER = {
+    "age": list(AGE_BINS),
+    "probability": list(PROBABILITY_BINS),
+}
+
+# Parámetros del snapshot del cubo: cambiar los bordes cambia su clave
+CUBE_PARAMS = {"age_edges": list(AGE_EDGES), "probability_edges": list(PROBABILITY_EDGES)}
+
+MEASURES = ("n", "probability_n", "probability_sum", "probability_sq_sum", "at_risk")
+
+# Estado que cuenta como conversión
+CONVERTED_STATUS = "converted"
+
+
+def _cells_query(threshold: float, sign: int = 1, client_ids: Optional[Iterable[int]] = None):
+    """SELECT de las celdas (dimensiones + medidas con signo) de demographics"""
+    dimensions = [expr.label(name) for name, expr in DIMENSIONS.items()]
+    measures = [
+        (sign * func.count()).label("n"),
+        (sign * func.count(Client.probability)).label("probability_n"),
+        (sign * func.coalesce(func.sum(Client.probability), 0.0)).label("probability_sum"),
+        (sign * func.coalesce(func.sum(Client.probability * Client.probability), 0.0)).label("probability_sq_sum"),
+        (sign * func.count().filter(Client.probability >= threshold)).label("at_risk"),
+    ]
+    # GROUP BY por posición: las etiquetas coinciden con columnas de demographics
+    query = select(*dimensions, *measures).group_by(*(text(str(i)) for i in range(1, len(dimensions) + 1)))
+    if client_ids is not None:
+        query = query.where(Client.id.in_(list(client_ids)))
+    return query
+
+
+async def rebuild_cube(db: AsyncSession, threshold: float) -> int:
+    """
+    Recalcula el cubo completo sin confirmar la transacción.
+
+    El bloqueo EXCLUSIVE espera a las transacciones que están aplicando deltas
+    y detiene las nuevas hasta el commit, de modo que ningún delta se pierde ni
+    se cuenta dos veces.
+
+    Returns:
+        int: Número de celdas
+    """
+    await db.execute(text(f"LOCK TABLE {HeatmapCell.__tablename__} IN EXCLUSIVE MODE"))
+    await db.execute(delete(HeatmapCell))
+    columns = list(DIMENSIONS) + list(MEASURES)
+    result = await db.execute(insert(HeatmapCell).from_select(columns, _cells_query(threshold)))
+    return result.rowcount
+
+
+async def apply_client_delta(db: AsyncSession, client_ids: Iterable[int], sign: int, threshold: float):
+    """
+    Suma (``sign=1``) o resta (``sign=-1``) la aportación actual de los clientes
+    al cubo, dentro de la transacción del llamador. Las celdas que quedan sin
+    clientes se eliminan.
+    """
+    client_ids = list(client_ids)
+    if not client_ids:
+        return
+    columns = list(DIMENSIONS) + list(MEASURES)
+    stmt = insert(HeatmapCell).from_select(columns, _cells_query(threshold, sign, client_ids))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(DIMENSIONS),
+        set_={name: getattr(HeatmapCell, name) + getattr(stmt.excluded, name) for name in MEASURES},
+    )
+    await db.execute(stmt)
+    if sign < 0:
+        await db.execute(delete(HeatmapCell).where(HeatmapCell.n <= 0))
+
+
+async def query_cube(db: AsyncSession, x_axis: str, y_axis: str) -> List[Dict[str, Any]]:
+    """
+    Medidas sumadas por par de categorías de los ejes ``x_axis`` e ``y_axis``,
+    más ``converted``: clientes con estado ``CONVERTED_STATUS``.
+    """
+    x_col = getattr(HeatmapCell, AXES[x_axis])
+    y_col = getattr(HeatmapCell, AXES[y_axis])
+    query = (
+        select(
+            x_col.label("x"), y_col.label("y"),
+            *[func.sum(getattr(HeatmapCell, m)).label(m) for m in MEASURES],
+            func.coalesce(func.sum(HeatmapCell.n).filter(HeatmapCell.status == CONVERTED_STATUS), 0).label("converted"),
+        )
+        .group_by(x_col, y_col)
+    )
+    result = await db.execute(query)
+    return [
+        {
+            "x": row.x,
+            "y": row.y,
+            **{m: (float(getattr(row, m)) if "sum" in m else int(getattr(row, m))) for m in MEASURES},
+            "converted": int(row.converted),
+        }
+        for row in result.fetchall()
+    ]
+
+
+def _natural_key(value: str):
+    """Orden natural: 50k-100k antes que 100k-150k"""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part.lower()) for part in re.split(r"(\d+)", value) if part]
+
+
+def axis_categories(axis: str, values: Iterable[str]) -> List[str]:
+    """
+    Categorías de un eje. Los ejes agrupados siguen el orden de sus rangos,
+    del primero al último con datos, incluidos los intermedios vacíos; el resto,
+    en orden natural (los números por su valor). N/A siempre al final.
+    """
+    present = set(values)
+    order = AXIS_ORDER.get(axis)
+    if order is not None:
+        positions = [i for i, c in enumerate(order) if c in present]
+        categories = order[positions[0]:positions[-1] + 1] if positions else []
+    else:
+        categories = sorted((c for c in present if c != MISSING), key=_natural_key)
+    if MISSING in present:
+        categories.append(MISSING)
+    return categories
+
+
+def cell_metric(cell: Dict[str, Any], metric: str) -> Optional[float]:
+    """
+    Métrica de una celda (o suma de celdas) del cubo.
+
+    Métricas: ``count``, ``mean_probability``, ``std_probability`` (poblacional),
+    ``at_risk``, ``at_risk_rate`` y ``conversion`` (convertidos / clientes).
+    Devuelve None si la celda no tiene datos para calcularla.
+    """
+    n, p_n = cell["n"], cell["probability_n"]
+    if metric == "count":
+        return n
+    if metric == "at_risk":
+        return cell["at_risk"]
+    if metric == "at_risk_rate":
+        return cell["at_risk"] / n if n else None
+    if metric == "conversion":
+        return cell["converted"] / n if n else None
+    if metric == "mean_probability":
+        return cell["probability_sum"] / p_n if p_n else None
+    if metric == "std_probability":
+        if not p_n:
+            return None
+        mean = cell["probability_sum"] / p_n
+        return max(cell["probability_sq_sum"] / p_n - mean * mean, 0.0) ** 0.5
+    raise ValueError(f"Métrica desconocida: {metric}")
+
+
+def heatmap_matrix(
+    cells: List[Dict[str, Any]], x_axis: str, y_axis: str, metric: str, empty: float = 0
+) -> Dict[str, Any]:
+    """
+    Matriz densa del mapa de calor: ``values[i][j]`` es la métrica de la
+    categoría ``y_categories[i]`` y ``x_categories[j]``. Las combinaciones sin
+    clientes valen ``empty``.
+    """
+    x_categories = axis_categories(x_axis, (c["x"] for c in cells))
+    y_categories = axis_categories(y_axis, (c["y"] for c in cells))
+    by_pair = {(c["x"], c["y"]): c for c in cells}
+    values = []
+    for y in y_categories:
+        row = []
+        for x in x_categories:
+            cell = by_pair.get((x, y))
+            value = cell_metric(cell, metric) if cell is not None else None
+            row.append(empty if value is None else (round(value, 4) if isinstance(value, float) else value))
+        values.append(row)
+    return {"x_categories": x_categories, "y_categories": y_categories, "values": values}
+
+
+async def cube_categories(db: AsyncSession) -> Dict[str, List[str]]:
+    """Categorías con datos de cada eje, en el orden de ``axis_categories``"""
+    categories = {}
+    for axis, column in AXES.items():
+        result = await db.execute(select(getattr(HeatmapCell, column)).distinct())
+        categories[axis] = axis_categories(axis, result.scalars())
+    return categories
+
+
+def cube_params(threshold: float) -> Dict[str, Any]:
+    """Parámetros del snapshot ``heatmap`` con la configuración de este proceso"""
+    return {"threshold": threshold, **CUBE_PARAMS}
+
+
+# Sin dependencias: los cambios de estado llegan como deltas y una reconstrucción
+# completa bloquea esos deltas (LOCK TABLE heatmap_cube) mientras dura
+@snapshot_builder("heatmap", depends_on=())
+async def build_heatmap_cube(db: AsyncSession, threshold: float, age_edges: List[float],
+                             probability_edges: List[float]) -> dict:
+    """Reconstruye el cubo; el payload resume su contenido"""
+    if [age_edges, probability_edges] != [CUBE_PARAMS["age_edges"], CUBE_PARAMS["probability_edges"]]:
+        raise ValueError("Los bordes del snapshot no coinciden con HEATMAP_AGE_EDGES / HEATMAP_PROBABILITY_EDGES")
+    cells = await rebuild_cube(db, threshold)
+    total = await db.scalar(select(func.coalesce(func.sum(HeatmapCell.n), 0)))
+    logger.info(f"Cubo del mapa de calor reconstruido: {cells} celdas, {total} clientes")
+    return {"cells": cells, "clients": int(total), **cube_params(threshold)}
+
+
+async def ensure_heatmap_cube_table(engine, threshold: float):
+    """
+    Crea la tabla del cubo si no existe y descarta los snapshots ``heatmap``
+    con otros parámetros (otros bordes o umbral, o los snapshots por par de
+    variables de versiones anteriores): el cubo es uno solo.
+    """
+    current = snapshot_key("heatmap", cube_params(threshold))
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: HeatmapCell.__table__.create(sync_conn, checkfirst=True))
+        await conn.execute(delete(MetricSnapshot).where(MetricSnapshot.builder == "heatmap", MetricSnapshot.key != current))
+        # Un snapshot guardado por versiones anteriores aún declara "probability"
+        await conn.execute(
+            update(MetricSnapshot).where(MetricSnapshot.key == current).values(depends_on="")
+        )
@@ -0,0 +1,220 @@
+"""
+Ejecutor de inferencia fuera del event loop.
+
+``ml_service.predict`` es async, pero ``generate_features`` (pandas) y
+``predict_proba`` (XGBoost) son síncronos: ejecutados en el event loop
+congelan todas las demás peticiones del worker mientras dura un batch. Este
+módulo los envía a pools y los espera con ``await``:
+
+- un pool de hilos para XGBoost, que libera el GIL durante la predicción;
+- un pool de procesos para el feature engineering, que retiene el GIL en gran
+  parte del trabajo de pandas.
+
+Cada pool tiene un límite de trabajos en curso (en ejecución + en cola). Si
+está lleno, la petición espera hasta ``INFERENCE_QUEUE_TIMEOUT`` segundos y
+después falla con ``InferenceOverloaded`` (la API responde 503) en lugar de
+acumular trabajo sin límite.
+
+Variables de entorno:
+    INFERENCE_EXECUTOR        "1" (por defecto) o "0" para ejecutar en el loop
+    INFERENCE_THREADS         Hilos para XGBoost (por defecto 2)
+    FEATURE_PROCESSES         Procesos para features (por defecto 1; 0 usa el pool de hilos)
+    INFERENCE_MAX_PENDING     Trabajos en curso por pool (por defecto 2 x tamaño del pool)
+    INFERENCE_QUEUE_TIMEOUT   Segundos de espera por un hueco (por defecto 30)
+"""
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+class InferenceOverloaded(Exception):
+    """El pool está lleno y no se liberó un hueco a tiempo"""
+
+
+class _BoundedPool:
+    """Pool de ejecución creado bajo demanda con un semáforo de trabajos en curso"""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        self.name = name
+        self.factory = factory
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending = 0
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self.factory()
+        return self._executor
+
+    def semaphore(self) -> asyncio.Semaphore:
+        # Un semáforo por event loop (los tests y los benchmarks crean varios)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, fn: Callable, args, kwargs, timeout: float):
+        semaphore = self.semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise InferenceOverloaded(
+                f"Pool {self.name} lleno ({self.max_pending} trabajos en curso) tras esperar {timeout}s"
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor(), partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            # Un proceso hijo murió (p. ej. por memoria): el siguiente trabajo crea un pool nuevo
+            logger.error(f"Pool {self.name} roto; se recreará en el próximo trabajo")
+            self.shutdown(wait=False)
+            raise
+        finally:
+            self.pending -= 1
+            semaphore.release()
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            children = list(getattr(self._executor, "_processes", None) or {})
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            if children:
+                # Retirar del agregado multiproceso los archivos de métricas que
+                # hayan dejado los hijos (import tardío: los hijos no lo cargan)
+                from .observability import mark_worker_dead
+                for pid in children:
+                    mark_worker_dead(pid)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"started": self._executor is not None, "pending": self.pending, "max_pending": self.max_pending}
+
+
+class InferenceExecutor:
+    """
+    Pools de inferencia de un proceso de la API.
+
+    Args:
+        enabled: False ejecuta todo en el event loop (comportamiento anterior)
+        threads: Hilos del pool de XGBoost
+        processes: Procesos del pool de features; 0 los ejecuta en el pool de hilos
+        max_pending: Trabajos en curso por pool; por defecto 2 x tamaño del pool
+        queue_timeout: Segundos de espera por un hueco antes de InferenceOverloaded
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        threads: int = 2,
+        processes: int = 1,
+        max_pending: Optional[int] = None,
+        queue_timeout: float = 30.0,
+    ):
+        self.enabled = enabled
+        self.threads = threads
+        self.processes = processes
+        self.queue_timeout = queue_timeout
+        self.thread_pool = _BoundedPool(
+            "inference-threads",
+            lambda: ThreadPoolExecutor(max_workers=threads, thread_name_prefix="inference"),
+            max_pending or 2 * threads,
+        )
+        self.process_pool = None
+        if processes > 0:
+            # spawn: el proceso padre tiene hilos y un event loop, fork no es seguro
+            self.process_pool = _BoundedPool(
+                "feature-processes",
+                lambda: ProcessPoolExecutor(
+                    max_workers=processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_start_feature_process,
+                ),
+                max_pending or 2 * processes,
+            )
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        max_pending = os.environ.get("INFERENCE_MAX_PENDING")
+        return cls(
+            enabled=os.environ.get("INFERENCE_EXECUTOR", "1") != "0",
+            threads=int(os.environ.get("INFERENCE_THREADS", "2")),
+            processes=int(os.environ.get("FEATURE_PROCESSES", "1")),
+            max_pending=int(max_pending) if max_pending else None,
+            queue_timeout=float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "30")),
+        )
+
+    async def run_inference(self, fn: Callable, *args, **kwargs):
+        """Ejecuta una llamada que libera el GIL (predict_proba) en el pool de hilos"""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        return await self.thread_pool.run(fn, args, kwargs, self.queue_timeout)
+
+    async def run_features(self, fn: Callable, *args, **kwargs):
+        """
+        Ejecuta trabajo de pandas en el pool de procesos. ``fn`` y sus
+        argumentos deben poder serializarse con pickle.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        pool = self.process_pool or self.thread_pool
+        return await pool.run(fn, args, kwargs, self.queue_timeout)
+
+    def warm_up(self) -> int:
+        """
+        Arranca los procesos de features antes de la primera petición.
+
+        Con spawn el pool crea los procesos bajo demanda, cuando no hay uno
+        libre: se envía un trabajo por proceso, todos a la vez, y el
+        inicializador del pool precarga el pipeline en cada proceso.
+
+        Returns:
+            int: Procesos arrancados
+        """
+        if not (self.enabled and self.process_pool is not None):
+            return 0
+        executor = self.process_pool.executor()
+        futures = [executor.submit(_process_ready) for _ in range(self.processes)]
+        for future in futures:
+            future.result()
+        started = len(executor._processes or {})
+        logger.info(f"Pool de features: {started}/{self.processes} procesos arrancados")
+        return started
+
+    def shutdown(self, wait: bool = True):
+        self.thread_pool.shutdown(wait)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threads": self.thread_pool.stats(),
+            "processes": self.process_pool.stats() if self.process_pool else None,
+        }
+
+
+def _start_feature_process():
+    """Inicializador de cada proceso del pool: precarga pandas y el pipeline"""
+    from app.feature_worker import preload
+    preload()
+
+
+def _process_ready() -> int:
+    from app.feature_worker import ready
+    return ready()
+
+
+# Ejecutor compartido por ml_service en este proceso
+inference_executor = InferenceExecutor.from_env()
@@ -0,0 +1,115 @@
+"""
+Micro-batching de peticiones concurrentes.
+
+Las predicciones online de un solo cliente pagan casi todo su tiempo en el
+costo fijo de cada llamada a ``predict_proba``. ``MicroBatcher`` junta las
+peticiones que llegan a la vez durante como máximo ``max_wait_ms`` o hasta
+``max_rows`` elementos, procesa el grupo con una única llamada vectorizada y
+devuelve a cada petición su resultado.
+
+Si no hay ningún lote en proceso, la petición se procesa de inmediato: con
+poca carga no se paga la ventana de espera, y con carga las peticiones que
+llegan mientras corre un lote forman el siguiente.
+
+Uso:
+    async def score(items):            # lista de elementos -> lista de resultados
+        ...
+
+    batcher = MicroBatcher(score, max_wait_ms=5, max_rows=256)
+    result = await batcher.submit(item)
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas a ``submit`` y las procesa en lotes con ``process_batch``.
+
+    Args:
+        process_batch: Corutina que recibe la lista de elementos del lote y
+            devuelve una lista de resultados en el mismo orden
+        max_wait_ms: Espera máxima desde el primer elemento del lote
+        max_rows: Tamaño con el que el lote se procesa sin esperar más
+    """
+
+    def __init__(self, process_batch: BatchFunction, max_wait_ms: float = 5.0, max_rows: int = 256):
+        self.process_batch = process_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_rows = max(1, max_rows)
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._running = 0
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Encola ``item`` y espera el resultado de su lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_rows or self.max_wait_ms <= 0 or not self._running:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        """Saca el lote pendiente y lo procesa en una tarea aparte"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self._running += 1
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # Mantener una referencia hasta que termine (el loop solo guarda referencias débiles)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        error = None
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"El lote devolvió {len(results)} resultados para {len(batch)} elementos")
+        except Exception as e:
+            error = e
+        finally:
+            self._running -= 1
+            # Lo acumulado mientras corría este lote sale sin esperar la ventana
+            if self._pending:
+                self._flush()
+        for i, (_, future) in enumerate(batch):
+            # Una petición cancelada (cliente desconectado) no recibe resultado
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_rows": self.max_rows,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": len(self._pending),
+            "running": self._running,
+        }
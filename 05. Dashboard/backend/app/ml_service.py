@@ -7,13 +7,25 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from typing import Dict, Any, Optional, List, Tuple
 
 from .database import Prediction
+from .snapshot import mark_dirty, schedule_refresh, CHANGE_PROBABILITY
+from .response_cache import bump_data_version
+from .feature_store import apply_transactions, load_feature_state
 from app.features.pipeline_featureengineering_func import generate_features
+from app.features.feature_transformer import FeatureTransformer
+from .model_registry import ModelRegistry, ModelBundle, model_feature_names, model_predictor
+from .flat_tree_predictor import FLAT_MODEL_FILE
+from .inference_executor import inference_executor, InferenceOverloaded
+from .feature_worker import generate_features_timed
+from .micro_batcher import MicroBatcher
+from .feature_cache import feature_cache, source_versions
+from .observability import observe_feature_stages
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,6 +34,19 @@ logger = logging.getLogger(__name__)
 # Constantes
 THRESHOLD = 0.5
 
+# Filas por sentencia en el upsert en bloque de write_batch
+WRITE_BATCH_CHUNK_SIZE = int(os.environ.get("WRITE_BATCH_CHUNK_SIZE", "5000"))
+
+# Micro-batching de /api/v1/predict: espera máxima (ms) y filas por lote
+PREDICT_BATCH_MAX_WAIT_MS = float(os.environ.get("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+PREDICT_BATCH_MAX_ROWS = int(os.environ.get("PREDICT_BATCH_MAX_ROWS", "256"))
+
+# Fecha de referencia de las features de predict (antigüedad, recencia)
+PREDICT_REFERENCE_DATE = pd.Timestamp("2024-01-01")
+
+# Columnas del dataset de features que no entran al modelo
+NON_MODEL_COLUMNS = ["user_id", "insurance"]
+
 # Ruta al modelo guardado
 model_paths = [
     Path("xgb_model.pkl"),                       # Ruta relativa al directorio principal
@@ -33,6 +58,7 @@ model_paths = [
 
 # Modelo global - será cargado cuando se importe este módulo
 xgb_model = None
+xgb_model_source = None
 
 # Intentar cargar el modelo desde varias ubicaciones posibles
 for model_path in model_paths:
@@ -41,6 +67,7 @@ for model_path in model_paths:
             logger.info(f"Cargando modelo desde: {model_path}")
             with open(model_path, 'rb') as f:
                 xgb_model = pickle.load(f)
+            xgb_model_source = str(model_path)
             logger.info(f"Modelo cargado exitosamente desde {model_path}")
             break
     except Exception as e:
@@ -62,52 +89,120 @@ if xgb_model is None:
     xgb_model = DummyModel()
     logger.info("Modelo dummy creado correctamente")
 
+# Transformador de features ajustado en entrenamiento, guardado junto a xgb_model.pkl
+feature_transformer: Optional[FeatureTransformer] = None
+transformer_paths = [Path(os.environ.get("FEATURE_TRANSFORMER_PATH", ""))] + [
+    p.with_name("feature_transformer.json") for p in model_paths if p.name
+]
+
+for transformer_path in transformer_paths:
+    try:
+        if transformer_path.exists() and transformer_path.is_file():
+            feature_transformer = FeatureTransformer.load(transformer_path)
+            logger.info(f"FeatureTransformer cargado desde {transformer_path}")
+            break
+    except Exception as e:
+        logger.error(f"Error al cargar el FeatureTransformer desde {transformer_path}: {str(e)}")
+
+if feature_transformer is None:
+    logger.warning("No se encontró feature_transformer.json; el escalado se ajustará sobre cada batch")
+
 # Verificación final del modelo
 if xgb_model:
     logger.info(f"Modelo de ML listo para usar: {type(xgb_model).__name__}")
 else:
     logger.error("ERROR CRÍTICO: No se pudo inicializar ningún modelo de ML")
 
-async def predict(df_raw: pd.DataFrame) -> pd.DataFrame:
+# Registro de modelos versionados: si models/registry tiene una versión en
+# CURRENT se usa esa; si no, el modelo cargado arriba queda como versión "legacy"
+registry = ModelRegistry(fallback=ModelBundle(
+    version="legacy",
+    model=xgb_model,
+    predictor=model_predictor(
+        xgb_model,
+        model_feature_names(xgb_model),
+        Path(xgb_model_source).with_name(FLAT_MODEL_FILE) if xgb_model_source else None,
+    ),
+    threshold=THRESHOLD,
+    feature_names=model_feature_names(xgb_model),
+    transformer=feature_transformer,
+    source=xgb_model_source,
+))
+registry.load_current()
+
+async def _model_inputs(bundle: ModelBundle, df_raw, products, transactions, transaction_aggregates):
+    """Features del batch (en el pool de procesos) y matriz de entrada del modelo"""
+    features_df, stage_timings = await inference_executor.run_features(
+        generate_features_timed,
+        demographics_df=df_raw,
+        products_df=products,
+        transactions_df=transactions,
+        reference_date=PREDICT_REFERENCE_DATE,
+        output_file=None,
+        transaction_aggregates=transaction_aggregates,
+        transformer=bundle.transformer
+    )
+    observe_feature_stages(stage_timings)
+    
+    # Prepare features for prediction
+    X = features_df.drop(columns=NON_MODEL_COLUMNS, errors="ignore")
+    # Ordenar según el esquema de la versión si el dataset lo cubre
+    if bundle.feature_names and set(bundle.feature_names) <= set(X.columns):
+        X = X[bundle.feature_names]
+    
+    if bundle.predictor is not None:
+        # Booster nativo: una sola conversión a matriz float32 en el orden del modelo
+        X = bundle.predictor.matrix(X)
+    else:
+        # Asegurar que todas las columnas sean numéricas
+        for col in X.columns:
+            if X[col].dtype == 'object' or X[col].dtype.name == 'category':
+                X[col] = X[col].astype(float)
+    return features_df["user_id"], X
+
+
+async def predict(df_raw: pd.DataFrame, transaction_aggregates=None, products_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Genera predicciones a partir de un DataFrame con datos crudos.
     
+    Los clientes cuyos datos de origen no cambiaron desde la última vez que se
+    puntuaron se sirven desde ``feature_cache``; solo los demás pasan por
+    generate_features y el modelo.
+    
     Args:
         df_raw: DataFrame con al menos columnas user_id, age, income_range, risk_profile
+        transaction_aggregates: Agregados de transacciones (p. ej. del feature store);
+            si se proporcionan, sustituyen a las transacciones crudas
+        products_df: Productos contratados de los clientes del batch (opcional)
         
     Returns:
         DataFrame con columnas: ['user_id', 'probability', 'is_target', 'created_at']
     """
     try:
-        # Verificar si hay un modelo válido
-        if xgb_model is None:
+        # Versión activa tomada una sola vez: una recarga en curso no afecta
+        # a esta petición
+        bundle = registry.current
+        if bundle is None or bundle.model is None:
             logger.warning("No hay modelo disponible. Generando predicciones aleatorias.")
             return _generate_dummy_predictions(df_raw)
         
-        # Generar características
-        features_df = generate_features(
-            demographics_df=df_raw,
-            products_df=pd.DataFrame(columns=["user_id", "product_type"]) if "products_df" not in df_raw else df_raw["products_df"],
-            transactions_df=pd.DataFrame(columns=["user_id", "amount", "date"]) if "transactions_df" not in df_raw else df_raw["transactions_df"],
-            reference_date=pd.Timestamp("2024-01-01"),
-            output_file=None
+        products = products_df if products_df is not None else (
+            pd.DataFrame(columns=["user_id", "product_type"]) if "products_df" not in df_raw else df_raw["products_df"]
         )
+        transactions = pd.DataFrame(columns=["user_id", "amount", "date"]) if "transactions_df" not in df_raw else df_raw["transactions_df"]
         
-        # Prepare features for prediction
-        X = features_df.drop(columns=["user_id", "insurance"], errors="ignore")
-        
-        # Asegurar que todas las columnas sean numéricas
-        for col in X.columns:
-            if X[col].dtype == 'object' or X[col].dtype.name == 'category':
-                X[col] = X[col].astype(float)
-        
-        # Predict
-        probabilities = xgb_model.predict_proba(X)[:, 1]
-        predictions = (probabilities >= THRESHOLD).astype(int)
+        # Sin transformador ajustado el vector de un cliente depende del batch: no se cachea
+        if not feature_cache.enabled or bundle.transformer is None:
+            user_ids, X = await _model_inputs(bundle, df_raw, products, transactions, transaction_aggregates)
+            # Predict en el pool de hilos (XGBoost libera el GIL)
+            probabilities = (await inference_executor.run_inference(bundle.predict_proba, X))[:, 1]
+        else:
+            user_ids, probabilities = await _predict_cached(bundle, df_raw, products, transactions, transaction_aggregates)
+        predictions = (probabilities >= bundle.threshold).astype(int)
         
         # Crear DataFrame de resultados
         result_df = pd.DataFrame({
-            "user_id": features_df["user_id"],
+            "user_id": user_ids,
             "probability": probabilities,
             "is_target": predictions.astype(bool),
             "created_at": datetime.now()
@@ -115,11 +210,53 @@ async def predict(df_raw: pd.DataFrame) -> pd.DataFrame:
         
         return result_df
     
+    except InferenceOverloaded:
+        # Sin hueco en los pools: el llamador decide (la API responde 503)
+        raise
     except Exception as e:
         logger.error(f"Error en predicción: {e}")
         return _generate_dummy_predictions(df_raw)
 
 
+async def _predict_cached(bundle: ModelBundle, df_raw, products, transactions, transaction_aggregates):
+    """Probabilidades del batch reutilizando las de feature_cache cuando los datos no cambiaron"""
+    feature_cache.check_epoch()
+    user_ids = df_raw["user_id"].astype(str).to_numpy(dtype=object)
+    versions = source_versions(
+        df_raw, products, transactions, transaction_aggregates,
+        demographic_columns=bundle.feature_names,
+        salt=str(PREDICT_REFERENCE_DATE),
+    )
+    probabilities = np.empty(len(df_raw), dtype=np.float64)
+    miss = np.ones(len(df_raw), dtype=bool)
+    for i, (user_id, version) in enumerate(zip(user_ids, versions)):
+        entry = feature_cache.get(user_id, version, bundle.version)
+        if entry is not None:
+            probabilities[i] = entry.probability
+            miss[i] = False
+    
+    if miss.any():
+        missed = pd.Index(user_ids[miss])
+        if transaction_aggregates is not None:
+            transaction_aggregates = transaction_aggregates.select(missed)
+        elif isinstance(transactions, pd.DataFrame) and "user_id" in transactions:
+            transactions = transactions[transactions["user_id"].astype(str).isin(missed)]
+        if isinstance(products, pd.DataFrame) and "user_id" in products:
+            products = products[products["user_id"].astype(str).isin(missed)]
+        feature_user_ids, X = await _model_inputs(bundle, df_raw[miss], products, transactions, transaction_aggregates)
+        scored = (await inference_executor.run_inference(bundle.predict_proba, X))[:, 1]
+        if len(scored) != int(miss.sum()):
+            raise ValueError(f"generate_features devolvió {len(scored)} filas para {int(miss.sum())} clientes")
+        probabilities[miss] = scored
+        
+        rows = X if isinstance(X, np.ndarray) else X.to_numpy(dtype=np.float32)
+        for user_id, version, row, probability in zip(missed, versions[miss], rows, scored):
+            # Copia: una vista mantendría viva la matriz completa del batch
+            feature_cache.put(user_id, version, bundle.version, np.array(row, dtype=np.float32), probability)
+    
+    return user_ids, probabilities
+
+
 def _generate_dummy_predictions(df: pd.DataFrame) -> pd.DataFrame:
     """Genera predicciones aleatorias para casos de error"""
     import random
@@ -134,84 +271,208 @@ def _generate_dummy_predictions(df: pd.DataFrame) -> pd.DataFrame:
     return result_df
 
 
-async def write_batch(session: AsyncSession, df_raw: pd.DataFrame):
+def prediction_upsert_statement():
+    """
+    INSERT ... ON CONFLICT (user_id) DO UPDATE sobre prediction_results.
+
+    Se ejecuta con una lista de parámetros (executemany), de modo que cada
+    chunk de predicciones viaja en un solo round trip.
+    """
+    table = Prediction.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            "probability": stmt.excluded.probability,
+            "is_target": stmt.excluded.is_target,
+            "created_at": stmt.excluded.created_at,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _prediction_records(predictions_df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convierte el DataFrame de predicciones en parámetros para el upsert"""
+    # ON CONFLICT no puede tocar dos veces la misma fila en un mismo comando
+    df = predictions_df.drop_duplicates(subset="user_id", keep="last")
+    return [
+        {
+            "user_id": str(user_id),
+            "probability": float(probability),
+            "is_target": bool(is_target),
+            "created_at": created_at,
+        }
+        for user_id, probability, is_target, created_at in zip(
+            df["user_id"], df["probability"], df["is_target"], df["created_at"]
+        )
+    ]
+
+
+async def upsert_predictions(
+    session: AsyncSession,
+    predictions_df: pd.DataFrame,
+    chunk_size: Optional[int] = None
+) -> int:
+    """
+    Inserta o actualiza predicciones en bloque, sin confirmar la transacción.
+    
+    Args:
+        session: Sesión de SQLAlchemy async
+        predictions_df: DataFrame con user_id, probability, is_target, created_at
+        chunk_size: Filas por executemany (por defecto WRITE_BATCH_CHUNK_SIZE)
+        
+    Returns:
+        int: Número de predicciones escritas
+    """
+    chunk_size = chunk_size or WRITE_BATCH_CHUNK_SIZE
+    records = _prediction_records(predictions_df)
+    stmt = prediction_upsert_statement()
+    for start in range(0, len(records), chunk_size):
+        await session.execute(stmt, records[start:start + chunk_size])
+    return len(records)
+
+
+async def write_batch(
+    session: AsyncSession,
+    df_raw: pd.DataFrame,
+    chunk_size: Optional[int] = None,
+    transactions_df: Optional[pd.DataFrame] = None
+):
     """
     Predice y escribe un batch de predicciones en la base de datos.
     
     Args:
         session: Sesión de SQLAlchemy async
         df_raw: DataFrame con datos para predicción
+        chunk_size: Filas por executemany (por defecto WRITE_BATCH_CHUNK_SIZE)
+        transactions_df: Transacciones nuevas. Si se indican, se suman al estado
+            de features persistido y solo se vuelven a puntuar los usuarios afectados
     """
     try:
+        transaction_aggregates = None
+        if transactions_df is not None:
+            affected = await apply_transactions(session, transactions_df)
+            df_raw = df_raw[df_raw["user_id"].astype(str).isin(affected)]
+            transaction_aggregates = await load_feature_state(session, affected)
+
         # Obtener predicciones
-        predictions_df = await predict(df_raw)
+        predictions_df = await predict(df_raw, transaction_aggregates)
         
-        # Preparar para inserción (bulk upsert)
-        for _, row in predictions_df.iterrows():
-            # Verificar si existe la predicción para este usuario
-            stmt = select(Prediction).where(Prediction.user_id == row["user_id"])
-            result = await session.execute(stmt)
-            existing = result.scalars().first()
-            
-            # Datos para insertar/actualizar
-            data = {
-                "user_id": row["user_id"],
-                "probability": float(row["probability"]),
-                "is_target": bool(row["is_target"]),
-                "created_at": row["created_at"]
-            }
-            
-            if existing:
-                # Actualizar predicción existente
-                stmt = (
-                    update(Prediction)
-                    .where(Prediction.user_id == row["user_id"])
-                    .values(data)
-                )
-                await session.execute(stmt)
-            else:
-                # Insertar nueva predicción
-                pred = Prediction(**data)
-                session.add(pred)
+        # Upsert en bloque por chunks
+        written = await upsert_predictions(session, predictions_df, chunk_size)
+        
+        # Invalidar snapshots de métricas junto con las nuevas predicciones
+        await mark_dirty(session, CHANGE_PROBABILITY)
         
         # Commit
         await session.commit()
-        logger.info(f"Batch de {len(predictions_df)} predicciones guardado en la base de datos")
+        schedule_refresh()
+        bump_data_version()
+        logger.info(f"Batch de {written} predicciones guardado en la base de datos")
     
     except Exception as e:
         await session.rollback()
         logger.error(f"Error al escribir batch de predicciones: {e}")
         raise
 
+def online_feature_names(bundle: ModelBundle) -> List[str]:
+    """Columnas de entrada del modelo, en orden, para puntuar un cliente suelto"""
+    if bundle.feature_names:
+        return bundle.feature_names
+    if bundle.transformer is not None:
+        return [c for c in bundle.transformer.columns if c not in NON_MODEL_COLUMNS]
+    return []
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def online_feature_vector(bundle: ModelBundle, features: Dict[str, Any]) -> np.ndarray:
+    """
+    Fila de entrada del modelo a partir de las features sin transformar de un
+    cliente (columnas de generate_features(raw=True)). Las que falten quedan
+    como NaN, que XGBoost trata como valores ausentes.
+    """
+    row = bundle.transformer.transform_row(features) if bundle.transformer is not None else features
+    names = online_feature_names(bundle) or [c for c in row if c not in NON_MODEL_COLUMNS]
+    return np.array([_as_float(row.get(c)) for c in names], dtype=np.float64)
+
+
+async def _score_online_batch(items: List[Tuple[ModelBundle, np.ndarray]]) -> List[Tuple[float, ModelBundle]]:
+    """
+    Puntúa un lote del micro-batcher con un predict_proba por versión de
+    modelo (un lote puede cruzar una recarga del registro).
+    """
+    results: List[Optional[Tuple[float, ModelBundle]]] = [None] * len(items)
+    groups: Dict[int, List[int]] = {}
+    for i, (bundle, _) in enumerate(items):
+        groups.setdefault(id(bundle), []).append(i)
+    for indices in groups.values():
+        bundle = items[indices[0]][0]
+        X = np.vstack([items[i][1] for i in indices])
+        probabilities = (await inference_executor.run_inference(bundle.predict_proba, X))[:, 1]
+        for i, probability in zip(indices, probabilities):
+            results[i] = (float(probability), bundle)
+    return results
+
+
+# Lotes de predicciones online compartidos por todas las peticiones del worker
+online_batcher = MicroBatcher(_score_online_batch, PREDICT_BATCH_MAX_WAIT_MS, PREDICT_BATCH_MAX_ROWS)
+
+
+async def predict_online(features: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Predice un cliente a través del micro-batcher: las peticiones concurrentes
+    se agrupan en un único predict_proba vectorizado.
+    
+    Args:
+        features: Features sin transformar del cliente (columna -> valor)
+        user_id: Identificador opcional que se devuelve en la respuesta
+        
+    Returns:
+        Dict con user_id, probability, is_target y model_version
+    """
+    bundle = registry.current
+    if bundle is None or bundle.model is None:
+        raise RuntimeError("No hay modelo disponible para predicciones")
+    vector = online_feature_vector(bundle, features)
+    probability, bundle = await online_batcher.submit((bundle, vector))
+    return {
+        "user_id": user_id,
+        "probability": probability,
+        "is_target": probability >= bundle.threshold,
+        "model_version": bundle.version,
+    }
+
+
 def predict_client_probability(features: Dict[str, Any]) -> float:
     """
     Predice la probabilidad de que un cliente sea de alto valor utilizando el modelo XGBoost.
     
+    Llamada síncrona de una sola fila; para muchas peticiones concurrentes usar
+    predict_online (o POST /api/v1/predict), que las agrupa en lotes.
+    
     Args:
-        features: Diccionario con las características del cliente
+        features: Diccionario con las características del cliente (sin transformar)
         
     Returns:
         float: Probabilidad entre 0 y 1
     """
     try:
-        if xgb_model is None:
+        bundle = registry.current
+        if bundle is None or bundle.model is None:
             logger.error("El modelo no está disponible para predicciones")
             return 0.5  # Valor por defecto si no hay modelo
             
-        # Preparar características para el modelo
-        # En una aplicación real, aquí habría preprocesamiento y transformación
-        X = np.array([[
-            features.get('age', 0),
-            # Convertir rangos de ingresos a valores numéricos
-            {'0-50k': 1, '50k-100k': 2, '100k-150k': 3, '150k+': 4}.get(features.get('income_range', '0-50k'), 1),
-            # Convertir perfil de riesgo a valores numéricos
-            {'conservative': 1, 'moderate': 2, 'aggressive': 3}.get(features.get('risk_profile', 'moderate'), 2),
-            # Otras características necesarias para el modelo
-        ]])
+        # Misma fila que usa el micro-batcher: transformador y esquema de la versión activa
+        X = online_feature_vector(bundle, features)[np.newaxis, :]
         
-        # Obtener predicciones
         # En XGBoost, predict_proba devuelve [prob_clase_0, prob_clase_1]
-        proba = xgb_model.predict_proba(X)
+        proba = bundle.predict_proba(X)
         
         # Devolver la probabilidad de la clase positiva (clase 1)
         result = float(proba[0, 1])
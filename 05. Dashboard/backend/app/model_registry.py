@@ -0,0 +1,369 @@
+"""
+Registro de modelos versionados con recarga en caliente.
+
+Cada versión es un directorio dentro de ``MODEL_REGISTRY_DIR`` con sus
+artefactos:
+
+    models/registry/
+        CURRENT                     # nombre de la versión activa
+        v1/
+            xgb_model.pkl           # modelo (obligatorio)
+            xgb_threshold.txt       # umbral de clasificación
+            feature_schema.json     # columnas de entrada del modelo, en orden
+            feature_transformer.json
+            xgb_model.flat.npz      # árboles exportados (opcional, INFERENCE_BACKEND=flat)
+
+Una versión se carga completa en segundo plano (en un hilo, sin bloquear el
+event loop), se valida con una predicción de calentamiento y solo entonces
+reemplaza a la activa con una única asignación de referencia. Las peticiones
+toman ``registry.current`` una vez al empezar y usan ese ``ModelBundle``
+inmutable hasta terminar: nunca ven un modelo a medio cargar ni mezclan el
+modelo de una versión con el umbral de otra. Si la carga o el calentamiento
+fallan, la versión anterior sigue activa.
+
+Con varios workers de uvicorn, cada proceso vigila el archivo ``CURRENT``
+(``watch_current``); publicar una versión y reescribir ``CURRENT`` basta para
+que todos la adopten sin reiniciar.
+"""
+import os
+import json
+import time
+import pickle
+import shutil
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .features.feature_transformer import FeatureTransformer, load_feature_transformer
+from .booster_predictor import INFERENCE_BACKEND, booster_predictor
+from .flat_tree_predictor import FLAT_MODEL_FILE, flat_tree_predictor
+from .observability import observe_inference
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Directorio del registro y archivo con la versión activa
+MODEL_REGISTRY_DIR = Path(os.environ.get(
+    "MODEL_REGISTRY_DIR", Path(__file__).parent.parent / "models" / "registry"
+))
+CURRENT_FILE = "CURRENT"
+
+# Artefactos de cada versión
+MODEL_FILE = "xgb_model.pkl"
+THRESHOLD_FILE = "xgb_threshold.txt"
+SCHEMA_FILE = "feature_schema.json"
+TRANSFORMER_FILE = "feature_transformer.json"
+
+# Segundos entre revisiones de CURRENT (0 desactiva la vigilancia)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "10"))
+
+DEFAULT_THRESHOLD = 0.5
+
+
+class ModelLoadError(Exception):
+    """La versión no se pudo cargar o no pasó el calentamiento"""
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Modelo, umbral, esquema y transformador de una versión, ya calentados"""
+    version: str
+    model: Any
+    # Booster nativo o evaluador plano (None: se usa model.predict_proba)
+    predictor: Any = None
+    threshold: float = DEFAULT_THRESHOLD
+    feature_names: Optional[List[str]] = None
+    transformer: Optional[FeatureTransformer] = None
+    source: Optional[str] = None
+    loaded_at: datetime = field(default_factory=datetime.now)
+    load_seconds: float = 0.0
+    warmup_seconds: float = 0.0
+
+    def predict_proba(self, X) -> np.ndarray:
+        """predict_proba con el predictor rápido si está disponible"""
+        started = time.perf_counter()
+        if self.predictor is not None:
+            proba = self.predictor.predict_proba(X)
+        else:
+            proba = self.model.predict_proba(X)
+        observe_inference(getattr(self.predictor, "backend", "sklearn"), time.perf_counter() - started)
+        return proba
+
+    def info(self) -> Dict[str, Any]:
+        """Metadatos de la versión para el endpoint de estado"""
+        return {
+            "version": self.version,
+            "model_type": type(self.model).__name__,
+            "backend": getattr(self.predictor, "backend", "sklearn"),
+            "source": self.source,
+            "threshold": self.threshold,
+            "n_features": len(self.feature_names) if self.feature_names else None,
+            "has_transformer": self.transformer is not None,
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4),
+        }
+
+
+def model_feature_names(model) -> Optional[List[str]]:
+    """Columnas con las que se entrenó el modelo, si el estimador las conserva"""
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return [str(n) for n in names]
+    return None
+
+
+def model_predictor(model, feature_names: Optional[List[str]], flat_path: Optional[Path] = None):
+    """
+    Predictor rápido según INFERENCE_BACKEND: Booster nativo, o evaluador
+    plano para lotes pequeños que delega en el Booster los grandes. None si el
+    modelo no admite ninguno (se usa su predict_proba).
+    """
+    booster = booster_predictor(model, feature_names)
+    if INFERENCE_BACKEND == "flat":
+        flat = flat_tree_predictor(model, feature_names, flat_path, large_batch=booster)
+        if flat is not None:
+            return flat
+    return booster
+
+
+def warm_up(model, feature_names: Optional[List[str]]) -> float:
+    """
+    Ejecuta una predicción con una fila de ceros y valida su forma; devuelve
+    los segundos empleados. La primera predicción de XGBoost inicializa
+    estructuras internas, así que la paga la carga y no la primera petición.
+    """
+    n_features = len(feature_names) if feature_names else getattr(model, "n_features_in_", None)
+    if not n_features:
+        raise ModelLoadError("No se puede calentar el modelo: número de features desconocido")
+    sample = pd.DataFrame(np.zeros((1, n_features)), columns=feature_names)
+    start = time.perf_counter()
+    try:
+        proba = np.asarray(model.predict_proba(sample))
+    except Exception as e:
+        raise ModelLoadError(f"Falló la predicción de calentamiento: {e}") from e
+    elapsed = time.perf_counter() - start
+    if proba.shape != (1, 2) or not np.isfinite(proba).all():
+        raise ModelLoadError(f"Predicción de calentamiento inválida: forma {proba.shape}")
+    return elapsed
+
+
+def load_bundle(version_dir: Path, version: Optional[str] = None) -> ModelBundle:
+    """Carga y calienta todos los artefactos de una versión (bloqueante)"""
+    version_dir = Path(version_dir)
+    model_path = version_dir / MODEL_FILE
+    if not model_path.is_file():
+        raise ModelLoadError(f"No existe {model_path}")
+
+    start = time.perf_counter()
+    try:
+        with open(model_path, "rb") as f:
+            model = pickle.load(f)
+
+        threshold = DEFAULT_THRESHOLD
+        threshold_path = version_dir / THRESHOLD_FILE
+        if threshold_path.is_file():
+            threshold = float(threshold_path.read_text().strip())
+
+        feature_names = model_feature_names(model)
+        schema_path = version_dir / SCHEMA_FILE
+        if schema_path.is_file():
+            feature_names = list(json.loads(schema_path.read_text(encoding="utf-8"))["features"])
+
+        transformer = load_feature_transformer(version_dir / TRANSFORMER_FILE)
+        predictor = model_predictor(model, feature_names, version_dir / FLAT_MODEL_FILE)
+    except ModelLoadError:
+        raise
+    except Exception as e:
+        raise ModelLoadError(f"Error al cargar {version_dir}: {e}") from e
+    load_seconds = time.perf_counter() - start
+
+    warmup_seconds = warm_up(predictor or model, feature_names)
+    return ModelBundle(
+        version=version or version_dir.name,
+        model=model,
+        predictor=predictor,
+        threshold=threshold,
+        feature_names=feature_names,
+        transformer=transformer,
+        source=str(version_dir),
+        load_seconds=load_seconds,
+        warmup_seconds=warmup_seconds,
+    )
+
+
+class ModelRegistry:
+    """
+    Versión activa del modelo en este proceso.
+
+    ``current`` es una referencia a un ``ModelBundle`` inmutable; ``activate``
+    la reemplaza solo cuando la nueva versión está cargada y calentada.
+    """
+
+    def __init__(self, root: Path = MODEL_REGISTRY_DIR, fallback: Optional[ModelBundle] = None):
+        self.root = Path(root)
+        self._bundle = fallback
+        self._lock: Optional[asyncio.Lock] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[ModelBundle]:
+        return self._bundle
+
+    def versions(self) -> List[str]:
+        """Versiones publicadas en el registro"""
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if not p.name.startswith(".") and (p / MODEL_FILE).is_file())
+
+    def current_pointer(self) -> Optional[str]:
+        """Versión indicada en CURRENT, o None si el registro no tiene una"""
+        try:
+            return (self.root / CURRENT_FILE).read_text().strip() or None
+        except OSError:
+            return None
+
+    def load_current(self) -> Optional[ModelBundle]:
+        """Carga síncrona de la versión de CURRENT (arranque del proceso)"""
+        version = self.current_pointer()
+        if version is None:
+            return self._bundle
+        try:
+            self._bundle = load_bundle(self.root / version)
+            self.last_error = None
+            logger.info(f"Modelo {version} activo (carga {self._bundle.load_seconds:.2f}s)")
+        except ModelLoadError as e:
+            self.last_error = str(e)
+            logger.error(f"No se pudo cargar la versión {version} del registro: {e}")
+        return self._bundle
+
+    async def activate(self, version: str, publish: bool = False) -> ModelBundle:
+        """
+        Carga ``version`` en un hilo, la calienta y la pone activa.
+
+        Args:
+            version: Directorio de la versión dentro del registro
+            publish: Si es True reescribe CURRENT para que el resto de workers
+                también cambien de versión
+
+        Raises:
+            ModelLoadError: si la versión no existe o falla la carga; la
+                versión activa no cambia
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            version_dir = self.root / version
+            if version_dir.parent != self.root:
+                raise ModelLoadError(f"Versión inválida: {version}")
+            try:
+                bundle = await asyncio.to_thread(load_bundle, version_dir)
+            except ModelLoadError as e:
+                self.last_error = str(e)
+                logger.error(f"Recarga de la versión {version} cancelada: {e}")
+                raise
+            previous = self._bundle.version if self._bundle else None
+            # Cambio atómico: una sola asignación de referencia
+            self._bundle = bundle
+            self.last_error = None
+            if publish:
+                self.publish_pointer(version)
+            logger.info(
+                f"Modelo {previous} -> {version} (carga {bundle.load_seconds:.2f}s, "
+                f"calentamiento {bundle.warmup_seconds:.3f}s)"
+            )
+            return bundle
+
+    def publish_pointer(self, version: str):
+        """Escribe CURRENT de forma atómica (archivo temporal + rename)"""
+        tmp = self.root / f".{CURRENT_FILE}.{os.getpid()}"
+        tmp.write_text(version + "\n")
+        os.replace(tmp, self.root / CURRENT_FILE)
+
+    async def watch_current(self, interval: float = MODEL_WATCH_INTERVAL):
+        """Revisa CURRENT periódicamente y activa la versión cuando cambia"""
+        failed = None
+        while True:
+            await asyncio.sleep(interval)
+            version = self.current_pointer()
+            active = self._bundle.version if self._bundle else None
+            if version is None or version == active or version == failed:
+                continue
+            try:
+                await self.activate(version)
+                failed = None
+            except ModelLoadError:
+                # No reintentar la misma versión rota en cada vuelta
+                failed = version
+            except Exception as e:
+                logger.error(f"Error al vigilar el registro de modelos: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        """Versión activa, tiempos de carga y versiones disponibles"""
+        bundle = self._bundle
+        return {
+            "active": bundle.info() if bundle else None,
+            "current_pointer": self.current_pointer(),
+            "available_versions": self.versions(),
+            "registry_dir": str(self.root),
+            "last_error": self.last_error,
+            "pid": os.getpid(),
+        }
+
+
+def publish_version(
+    root: Path,
+    version: str,
+    model_path: Path,
+    threshold: Optional[float] = None,
+    threshold_path: Optional[Path] = None,
+    transformer_path: Optional[Path] = None,
+    activate: bool = False,
+) -> Path:
+    """
+    Crea el directorio de una versión nueva con sus artefactos. La versión se
+    carga y calienta antes de publicarla; con ``activate`` se reescribe CURRENT.
+    """
+    root = Path(root)
+    version_dir = root / version
+    if version_dir.exists():
+        raise ModelLoadError(f"La versión {version} ya existe en {root}")
+    staging = root / f".{version}.staging"
+    staging.mkdir(parents=True)
+    try:
+        _write_artifacts(staging, version, model_path, threshold, threshold_path, transformer_path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    os.replace(staging, version_dir)
+    if activate:
+        ModelRegistry(root).publish_pointer(version)
+    return version_dir
+
+
+def _write_artifacts(staging: Path, version: str, model_path, threshold, threshold_path, transformer_path):
+    """Copia los artefactos al directorio temporal y valida que la versión carga"""
+    with open(model_path, "rb") as src:
+        model_bytes = src.read()
+    (staging / MODEL_FILE).write_bytes(model_bytes)
+    if threshold is None and threshold_path is not None:
+        threshold = float(Path(threshold_path).read_text().strip())
+    (staging / THRESHOLD_FILE).write_text(str(threshold if threshold is not None else DEFAULT_THRESHOLD))
+    if transformer_path is not None and Path(transformer_path).is_file():
+        (staging / TRANSFORMER_FILE).write_text(Path(transformer_path).read_text(encoding="utf-8"), encoding="utf-8")
+    flat_path = Path(model_path).with_name(FLAT_MODEL_FILE)
+    if flat_path.is_file():
+        shutil.copyfile(flat_path, staging / FLAT_MODEL_FILE)
+    names = model_feature_names(pickle.loads(model_bytes))
+    if names:
+        (staging / SCHEMA_FILE).write_text(json.dumps({"features": names}, indent=2), encoding="utf-8")
+
+    # Validar antes de hacer visible la versión
+    load_bundle(staging, version)
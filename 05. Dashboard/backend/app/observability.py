@@ -0,0 +1,183 @@
+"""
+Métricas de Prometheus de la API.
+
+Expone en ``GET /metrics`` (formato de texto de Prometheus):
+
+- ``prometeo_http_request_duration_seconds``: latencia por método, ruta
+  (plantilla de FastAPI, p. ej. ``/api/v1/clients/{client_id}/status``) y estado;
+- ``prometeo_http_requests_in_progress``: peticiones en curso por método;
+- ``prometeo_db_pool_checkout_wait_seconds``: espera hasta obtener una conexión
+  del pool en ``get_db``;
+- ``prometeo_db_pool_connections``: conexiones del pool por estado
+  (``capacity``, ``size``, ``checked_out``, ``idle``, ``overflow``), sumadas
+  entre workers;
+- ``prometeo_db_pool_utilization``: conexiones en uso sobre la capacidad del
+  pool del worker más cargado;
+- ``prometeo_model_inference_seconds``: ``predict_proba`` por backend;
+- ``prometeo_feature_stage_seconds``: cada etapa de ``generate_features``
+  (las de ``stage_timings``).
+
+Multiproceso: uvicorn corre con varios workers (``WEB_CONCURRENCY``) y cada
+uno tiene sus propios contadores. Con ``PROMETHEUS_MULTIPROC_DIR`` definido, prometheus_client escribe
+los valores de cada proceso en archivos de ese directorio y ``/metrics`` suma los
+de todos los workers, atienda quien atienda la petición. El directorio debe
+existir vacío antes de arrancar los workers (ver ``render.yaml``); sin la
+variable, las métricas son las del proceso.
+"""
+import os
+import time
+import logging
+from typing import Dict, Optional
+
+# prometheus_client elige el modo multiproceso al importarse: el directorio
+# debe existir antes de crear la primera métrica
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Etiqueta de ruta para peticiones que no coinciden con ninguna ruta (evita
+# una serie por cada URL desconocida)
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "prometeo_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "prometeo_http_requests_in_progress",
+    "Peticiones HTTP en curso",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "prometeo_db_pool_checkout_wait_seconds",
+    "Espera hasta obtener una conexión del pool de la base de datos",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_CONNECTIONS = Gauge(
+    "prometeo_db_pool_connections",
+    "Conexiones del pool de la base de datos por estado",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+POOL_UTILIZATION = Gauge(
+    "prometeo_db_pool_utilization",
+    "Conexiones en uso / capacidad del pool (pool_size + max_overflow); el worker más cargado",
+    multiprocess_mode="livemax",
+)
+INFERENCE_LATENCY = Histogram(
+    "prometeo_model_inference_seconds",
+    "Duración de predict_proba",
+    ["backend"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+FEATURE_STAGE_LATENCY = Histogram(
+    "prometeo_feature_stage_seconds",
+    "Duración de cada etapa de generate_features",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+
+def route_label(scope) -> str:
+    """Plantilla de la ruta que atendió la petición (no la URL con sus parámetros)"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+async def metrics_middleware(request, call_next):
+    """Middleware HTTP: peticiones en curso y latencia por ruta"""
+    method = request.method
+    in_progress = REQUESTS_IN_PROGRESS.labels(method)
+    in_progress.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUEST_LATENCY.labels(method, route_label(request.scope), str(status_code)).observe(
+            time.perf_counter() - started
+        )
+        in_progress.dec()
+
+
+def observe_pool_checkout(seconds: float):
+    POOL_CHECKOUT_WAIT.observe(seconds)
+
+
+def instrument_pool(engine):
+    """
+    Actualiza las métricas del pool del engine en cada checkout/checkin.
+
+    Las conexiones en uso se cuentan con los eventos, así que también funciona
+    con NullPool (modo PgBouncer); tamaño, libres y overflow solo existen en
+    QueuePool. Se llama desde el startup de cada worker; repetirla no duplica
+    los eventos.
+    """
+    from sqlalchemy import event
+
+    pool = engine.sync_engine.pool if hasattr(engine, "sync_engine") else engine.pool
+    if getattr(pool, "_prometeo_instrumented", False):
+        return
+    pool._prometeo_instrumented = True
+    queue_pool = hasattr(pool, "checkedin")
+    max_overflow = getattr(pool, "_max_overflow", 0)
+    capacity = pool.size() + max_overflow if queue_pool and max_overflow >= 0 else None
+    checked_out = [0]
+
+    def update(delta: int):
+        checked_out[0] += delta
+        POOL_CONNECTIONS.labels("checked_out").set(checked_out[0])
+        if queue_pool:
+            # Conexiones abiertas = size + overflow. En el checkin la conexión
+            # aún no volvió a la cola; si la cola está llena se cerrará, así
+            # que las libres nunca superan size
+            size = pool.size()
+            idle = min(max(size + pool.overflow() - checked_out[0], 0), size)
+            POOL_CONNECTIONS.labels("size").set(size)
+            POOL_CONNECTIONS.labels("idle").set(idle)
+            POOL_CONNECTIONS.labels("overflow").set(max(checked_out[0] + idle - size, 0))
+        if capacity:
+            POOL_UTILIZATION.set(checked_out[0] / capacity)
+
+    event.listen(pool, "checkout", lambda *_: update(1))
+    event.listen(pool, "checkin", lambda *_: update(-1))
+    if capacity:
+        POOL_CONNECTIONS.labels("capacity").set(capacity)
+    update(0)
+
+
+def observe_inference(backend: str, seconds: float):
+    INFERENCE_LATENCY.labels(backend).observe(seconds)
+
+
+def observe_feature_stages(stage_timings: Optional[Dict[str, float]]):
+    """Registra los segundos por etapa de ``generate_features(stage_timings=...)``"""
+    for stage, seconds in (stage_timings or {}).items():
+        FEATURE_STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def render_metrics() -> bytes:
+    """Exposición de texto: suma de todos los workers en modo multiproceso"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_worker_dead(pid: Optional[int] = None):
+    """Al cerrar un worker, retira sus gauges (livesum) de la suma"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,46 @@
+"""
+Paginación por cursor (keyset) para listados ordenados por probabilidad.
+
+El cursor es opaco para el cliente: codifica en base64 la clave de orden
+(probability, id) de la última fila entregada, de modo que la siguiente
+página se obtiene con una comparación sobre el índice compuesto en lugar
+de recorrer y descartar ``OFFSET`` filas.
+"""
+import json
+import base64
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+# Clave de orden: (probability, id). probability puede ser None (clientes sin puntuar)
+CursorKey = Tuple[Optional[float], int]
+
+
+def encode_cursor(probability: Optional[float], client_id: int) -> str:
+    """Codifica la clave de la última fila de una página en un cursor opaco"""
+    raw = json.dumps({"p": probability, "id": client_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    """
+    Decodifica un cursor generado por ``encode_cursor``.
+
+    Raises:
+        HTTPException: 400 si el cursor está malformado
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        probability = data["p"]
+        client_id = data["id"]
+        if probability is not None:
+            probability = float(probability)
+        if not isinstance(client_id, int):
+            raise ValueError("id inválido")
+        return probability, client_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
@@ -0,0 +1,253 @@
+"""
+Trazas de consultas SQL y registro de consultas lentas.
+
+``instrument_engine`` escucha ``before_cursor_execute``/``after_cursor_execute``
+en ``engine.sync_engine`` y, por cada sentencia enviada a PostgreSQL, registra:
+
+- la huella (fingerprint) de la sentencia: el SQL con los literales reemplazados
+  por ``?`` y los espacios normalizados, de modo que la misma consulta con otros
+  valores cuenta como una sola;
+- la duración, las filas devueltas o afectadas (``cursor.rowcount``) y la ruta
+  de la API que la originó (plantilla de FastAPI, tomada de la petición en curso
+  con ``QueryRouteMiddleware``).
+
+Las estadísticas se acumulan por huella en ``query_stats`` (llamadas, tiempo
+total, medio y máximo, filas, rutas), como ``pg_stat_statements`` pero por
+proceso de la aplicación; ``GET /api/v1/debug/queries`` devuelve las N con más
+tiempo total. Las sentencias que superan ``SLOW_QUERY_MS`` se escriben en el
+logger ``app.query_tracing.slow`` (sin los parámetros, que pueden tener datos
+de clientes) y quedan en una lista de las más recientes.
+
+Variables de entorno:
+    QUERY_TRACING_ENABLED       "1" (por defecto) o "0"
+    SLOW_QUERY_MS               Umbral del registro de consultas lentas (por defecto 200)
+    QUERY_STATS_MAX_STATEMENTS  Huellas distintas conservadas (por defecto 500)
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(f"{__name__}.slow")
+
+QUERY_TRACING_ENABLED = os.environ.get("QUERY_TRACING_ENABLED", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+QUERY_STATS_MAX_STATEMENTS = int(os.environ.get("QUERY_STATS_MAX_STATEMENTS", "500"))
+
+# Consultas lentas recientes que devuelve el endpoint de depuración
+SLOW_QUERY_HISTORY = 100
+
+# Ruta para sentencias fuera de una petición (arranque, tareas, scripts)
+NO_ROUTE = "-"
+
+# Scope ASGI de la petición en curso: la ruta se resuelve al ejecutar la consulta,
+# cuando FastAPI ya la agregó al scope
+_request_scope: ContextVar[Optional[dict]] = ContextVar("query_tracing_request_scope", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_POSITIONAL_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):\w+")
+_VALUE_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """SQL con literales y parámetros reemplazados por ``?`` y espacios normalizados"""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _POSITIONAL_PARAM.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _VALUE_LIST.sub("(?, ...)", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def statement_fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def current_route() -> str:
+    scope = _request_scope.get()
+    if scope is None:
+        return NO_ROUTE
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", NO_ROUTE)
+
+
+class QueryRouteMiddleware:
+    """Middleware ASGI: deja disponible la petición en curso para etiquetar sus consultas"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+@dataclass
+class QueryStat:
+    """Estadísticas acumuladas de una huella"""
+    fingerprint: str
+    statement: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    slow_calls: int = 0
+    routes: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "slow_calls": self.slow_calls,
+            "routes": dict(self.routes.most_common()),
+        }
+
+
+class QueryStats:
+    """
+    Estadísticas por huella de las sentencias de este proceso.
+
+    Args:
+        slow_query_ms: Umbral (ms) del registro de consultas lentas
+        max_statements: Huellas distintas conservadas; al superarlo se descarta
+            la de menor tiempo total
+    """
+
+    ORDER_BY = ("total_ms", "mean_ms", "max_ms", "calls", "rows")
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, max_statements: int = QUERY_STATS_MAX_STATEMENTS):
+        self.slow_query_ms = slow_query_ms
+        self.max_statements = max_statements
+        self._stats: Dict[str, QueryStat] = {}
+        self._normalized: Dict[str, tuple] = {}
+        self._slow = deque(maxlen=SLOW_QUERY_HISTORY)
+        self._lock = threading.Lock()
+        self.since = datetime.now()
+
+    def _fingerprint(self, statement: str) -> tuple:
+        # Las sentencias compiladas se repiten: normalizar cada texto una sola vez
+        cached = self._normalized.get(statement)
+        if cached is None:
+            normalized = normalize_statement(statement)
+            cached = (statement_fingerprint(normalized), normalized)
+            if len(self._normalized) >= self.max_statements * 4:
+                self._normalized.clear()
+            self._normalized[statement] = cached
+        return cached
+
+    def record(self, statement: str, duration_ms: float, rows: Optional[int], route: str, executemany: bool = False):
+        fingerprint, normalized = self._fingerprint(statement)
+        slow = duration_ms >= self.slow_query_ms
+        with self._lock:
+            stat = self._stats.get(fingerprint)
+            if stat is None:
+                if len(self._stats) >= self.max_statements:
+                    del self._stats[min(self._stats, key=lambda k: self._stats[k].total_ms)]
+                stat = self._stats[fingerprint] = QueryStat(fingerprint, normalized)
+            stat.calls += 1
+            stat.total_ms += duration_ms
+            stat.max_ms = max(stat.max_ms, duration_ms)
+            stat.rows += rows or 0
+            stat.routes[route] += 1
+            if slow:
+                stat.slow_calls += 1
+                self._slow.append({
+                    "at": datetime.now().isoformat(),
+                    "fingerprint": fingerprint,
+                    "duration_ms": round(duration_ms, 3),
+                    "rows": rows,
+                    "route": route,
+                    "executemany": executemany,
+                    "statement": normalized,
+                })
+        if slow:
+            slow_query_logger.warning(
+                f"Consulta lenta ({duration_ms:.1f} ms, filas={rows}, ruta={route}, "
+                f"huella={fingerprint}): {normalized[:500]}"
+            )
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Las ``limit`` huellas con mayor ``order_by``"""
+        if order_by not in self.ORDER_BY:
+            raise ValueError(f"order_by debe ser uno de {', '.join(self.ORDER_BY)}")
+        with self._lock:
+            rows = [stat.as_dict() for stat in self._stats.values()]
+        return sorted(rows, key=lambda r: r[order_by], reverse=True)[:limit]
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self.since = datetime.now()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "since": self.since.isoformat(),
+                "statements": len(self._stats),
+                "calls": sum(s.calls for s in self._stats.values()),
+                "total_ms": round(sum(s.total_ms for s in self._stats.values()), 3),
+                "slow_query_ms": self.slow_query_ms,
+            }
+
+
+# Estadísticas de este proceso
+query_stats = QueryStats()
+
+
+def instrument_engine(engine, stats: QueryStats = query_stats, enabled: bool = QUERY_TRACING_ENABLED):
+    """Registra duración, filas y ruta de cada sentencia del engine en ``stats``"""
+    if not enabled:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        rowcount = getattr(cursor, "rowcount", -1)
+        stats.record(
+            statement,
+            (time.perf_counter() - started) * 1000,
+            rowcount if rowcount is not None and rowcount >= 0 else None,
+            current_route(),
+            executemany,
+        )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed_query(exception_context):
+        # Una sentencia fallida no llega a after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
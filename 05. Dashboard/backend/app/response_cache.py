@@ -0,0 +1,433 @@
+"""
+Caché de respuestas de los endpoints de métricas de solo lectura, con ETag.
+
+``ResponseCacheMiddleware`` guarda la respuesta completa de los GET a las rutas
+configuradas, con clave ruta + parámetros de la consulta (ordenados) + versión
+de los datos. Un acierto se responde sin pasar por el endpoint, así que no abre
+sesión ni consulta Postgres.
+
+- La versión de los datos (``DataVersion``) es un identificador aleatorio del
+  archivo más un contador, compartidos por todos los workers y por los
+  scripts: ``write_batch``, ``update_client_status`` y ``seed_data`` la
+  incrementan después de su commit con ``bump_data_version``. Las entradas de
+  versiones anteriores ya no se consultan y salen por LRU o TTL.
+- Cada respuesta lleva un ETag fuerte (hash de la versión y el cuerpo). Si el
+  ``If-None-Match`` de la petición coincide se responde ``304 Not Modified``
+  sin cuerpo; tras un cambio de versión el cliente vuelve a recibir el cuerpo.
+- Las respuestas con ``Cache-Control: no-store`` (p. ej. un snapshot invalidado
+  que aún se está refrescando) no se guardan.
+
+Backends (``RESPONSE_CACHE_BACKEND``):
+    memory  LRU con TTL por proceso (por defecto)
+    sqlite  Archivo SQLite compartido por los workers de la máquina; hace las
+            veces de un Redis local
+
+Variables de entorno:
+    RESPONSE_CACHE_ENABLED       "1" (por defecto) o "0"
+    RESPONSE_CACHE_BACKEND       "memory" (por defecto) o "sqlite"
+    RESPONSE_CACHE_MAX_ENTRIES   Respuestas guardadas (por defecto 1000)
+    RESPONSE_CACHE_TTL           Segundos de vida de una respuesta (por defecto 300)
+    RESPONSE_CACHE_PATH          Archivo del backend sqlite
+    DATA_VERSION_FILE            Archivo de la versión de los datos
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.routing import Match
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_PATH = Path(os.environ.get("RESPONSE_CACHE_PATH", DATA_DIR / "response_cache.sqlite3"))
+DATA_VERSION_FILE = Path(os.environ.get("DATA_VERSION_FILE", DATA_DIR / "data_version"))
+
+# Cabeceras de la respuesta original que no se guardan (las pone el servidor)
+SKIPPED_HEADERS = {b"date", b"server"}
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class DataVersion:
+    """
+    Versión de los datos compartida entre procesos: un identificador aleatorio
+    del archivo más un contador (``"<id>-<n>"``).
+
+    ``bump`` incrementa el contador bajo un ``flock`` y reemplaza el archivo de
+    forma atómica (``os.replace``), así que su tamaño no crece. Si el archivo
+    se borra (p. ej. un disco efímero) se crea con otro identificador: la
+    versión no repite ninguna anterior aunque el contador vuelva a empezar.
+    Con ``path=None`` vive en memoria (un solo proceso, pruebas).
+    """
+
+    def __init__(self, path: Optional[Path] = DATA_VERSION_FILE):
+        self.path = Path(path) if path else None
+        self._local = (uuid.uuid4().hex, 0)
+
+    def read(self) -> Tuple[str, int]:
+        """Identificador del archivo y contador; crea el archivo si falta"""
+        if self.path is None:
+            return self._local
+        try:
+            return self._parse()
+        except (OSError, ValueError):
+            with self._lock():
+                try:
+                    return self._parse()
+                except (OSError, ValueError):
+                    return self._write(uuid.uuid4().hex, 0)
+
+    def get(self) -> str:
+        file_id, counter = self.read()
+        return f"{file_id}-{counter}"
+
+    def bump(self) -> str:
+        if self.path is None:
+            self._local = (self._local[0], self._local[1] + 1)
+            return self.get()
+        with self._lock():
+            try:
+                file_id, counter = self._parse()
+            except (OSError, ValueError):
+                file_id, counter = uuid.uuid4().hex, 0
+            self._write(file_id, counter + 1)
+        return f"{file_id}-{counter + 1}"
+
+    def _parse(self) -> Tuple[str, int]:
+        file_id, counter = self.path.read_text().split()
+        return file_id, int(counter)
+
+    def _write(self, file_id: str, counter: int) -> Tuple[str, int]:
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(f"{file_id} {counter}\n")
+        os.replace(tmp, self.path)
+        return file_id, counter
+
+    @contextmanager
+    def _lock(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(f".{self.path.name}.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Respuesta guardada: estado, cabeceras, cuerpo y su ETag"""
+    status: int
+    headers: Headers
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+class MemoryBackend:
+    """LRU con TTL por proceso"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stored_at + self.ttl < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Caché en un archivo SQLite (modo WAL) compartido por los workers de la
+    máquina. Al superar ``max_entries`` se descartan las respuestas más antiguas.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path = RESPONSE_CACHE_PATH, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl: float = RESPONSE_CACHE_TTL):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, etag TEXT, stored_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_stored_at ON responses (stored_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self._conn().execute(
+            "SELECT status, headers, body, etag, stored_at FROM responses WHERE key = ? AND stored_at >= ?",
+            (key, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, etag, stored_at = row
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(headers)]
+        return CachedResponse(status, headers, body, etag, stored_at)
+
+    def set(self, key: str, entry: CachedResponse):
+        conn = self._conn()
+        headers = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in entry.headers])
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, status, headers, body, etag, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, entry.status, headers, entry.body, entry.etag, entry.stored_at),
+        )
+        # Recortar cada cierto número de escrituras, no en cada una
+        self._writes += 1
+        if self._writes % 50 == 0:
+            conn.execute(
+                "DELETE FROM responses WHERE stored_at < ? OR key NOT IN "
+                "(SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+                (time.time() - self.ttl, self.max_entries),
+            )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT count(*) FROM responses").fetchone()[0]
+
+
+def create_backend(name: str = RESPONSE_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"RESPONSE_CACHE_BACKEND no válido: {name!r} (memory o sqlite)")
+
+
+def strong_etag(body: bytes, version: str = "") -> str:
+    return '"' + hashlib.sha256(version.encode("latin-1") + b"\0" + body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110): ignora el prefijo W/"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class ResponseCache:
+    """
+    Respuestas de las rutas cacheables por ruta + consulta + versión de datos.
+
+    Args:
+        backend: MemoryBackend, SQLiteBackend o cualquier objeto con get/set/clear
+        data_version: Versión de los datos
+        enabled: False deja pasar todas las peticiones
+    """
+
+    def __init__(self, backend=None, data_version: Optional[DataVersion] = None,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.backend = backend if backend is not None else create_backend()
+        self.data_version = data_version or DataVersion()
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stored = 0
+
+    def key(self, scope, version: Optional[str] = None) -> str:
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        return f"{version or self.data_version.get()}:{scope['path']}?{query}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la caché de respuestas: {e}")
+            return None
+
+    def set(self, key: str, entry: CachedResponse):
+        try:
+            self.backend.set(key, entry)
+            self.stored += 1
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché de respuestas: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": getattr(self.backend, "name", type(self.backend).__name__),
+            "entries": len(self.backend),
+            "data_version": self.data_version.get(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "stored": self.stored,
+            "pid": os.getpid(),
+        }
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _aged(name: bytes, value: bytes, stored_at: float) -> Tuple[bytes, bytes]:
+    """X-Snapshot-Age de una respuesta guardada: se suma el tiempo transcurrido desde que se guardó"""
+    if name.lower() != b"x-snapshot-age":
+        return name, value
+    age = float(value) + max(0.0, time.time() - stored_at)
+    return name, f"{age:.3f}".encode("latin-1")
+
+
+def _resolve_route(scope):
+    """En un acierto no se pasa por el router: se resuelve la ruta para las métricas y trazas"""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope.update(child_scope)
+            return
+
+
+class ResponseCacheMiddleware:
+    """
+    Middleware ASGI: responde los GET de ``paths`` desde ``cache`` y agrega
+    ETag a las respuestas 200. Debe ser el middleware más interno para que
+    CORS y las métricas también se apliquen a los aciertos.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Iterable[str]):
+        self.app = app
+        self.cache = cache
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or scope["method"] != "GET"
+            or scope["path"] not in self.paths or not self.cache.enabled
+        ):
+            return await self.app(scope, receive, send)
+
+        version = self.cache.data_version.get()
+        key = self.cache.key(scope, version)
+        if_none_match = _header(scope, b"if-none-match")
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.hits += 1
+            _resolve_route(scope)
+            return await self._send_entry(entry, if_none_match, send, b"HIT")
+
+        self.cache.misses += 1
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in SKIPPED_HEADERS]
+        status = start.get("status", 500)
+        cache_control = next((v for k, v in headers if k.lower() == b"cache-control"), b"")
+        if status != 200 or b"no-store" in cache_control:
+            await send({"type": "http.response.start", "status": status, "headers": start.get("headers", [])})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = strong_etag(body, version)
+        headers += [(b"etag", etag.encode("latin-1"))]
+        if not cache_control:
+            # El navegador guarda la respuesta pero la revalida siempre con If-None-Match
+            headers.append((b"cache-control", b"no-cache"))
+        entry = CachedResponse(status, headers, body, etag, time.time())
+        self.cache.set(key, entry)
+        await self._send_entry(entry, if_none_match, send, b"MISS")
+
+    async def _send_entry(self, entry: CachedResponse, if_none_match: Optional[str], send, result: bytes):
+        headers = [_aged(k, v, entry.stored_at) for k, v in entry.headers] + [(b"x-cache", result)]
+        if etag_matches(if_none_match, entry.etag):
+            self.cache.not_modified += 1
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+
+# Versión de los datos y caché de respuestas de este proceso
+data_version = DataVersion()
+response_cache = ResponseCache(data_version=data_version)
+
+
+def bump_data_version() -> str:
+    """
+    Marca que los datos cambiaron: las respuestas guardadas dejan de servirse
+    en todos los workers. Llamar después del commit.
+    """
+    return data_version.bump()
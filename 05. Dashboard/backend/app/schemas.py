@@ -1,7 +1,7 @@
 """
 Esquemas Pydantic para entrada/salida de la API
 """
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from pydantic import BaseModel, validator
 
@@ -104,4 +104,22 @@ class ContactOut(ContactCreate):
     
     class Config:
         orm_mode = True
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class OnlinePredictIn(BaseModel):
+    """Esquema de entrada para /predict: features sin transformar de un cliente"""
+    user_id: Optional[str] = None
+    features: Dict[str, Any]
+
+
+class OnlinePredictOut(BaseModel):
+    """Esquema de salida de /predict"""
+    user_id: Optional[str] = None
+    probability: float
+    is_target: bool
+    model_version: str
+
+    class Config:
+        # model_version no es un atributo de pydantic
+        protected_namespaces = ()
@@ -0,0 +1,232 @@
+"""
+Snapshots materializados de las métricas del dashboard.
+
+Los endpoints de lectura (/metrics/summary, /metrics/probability-distribution,
+/metrics/heatmap) sirven su respuesta desde la tabla ``metric_snapshots`` en
+lugar de recorrer ``demographics`` en cada petición. Cada snapshot declara de
+qué tipos de cambio depende ("probability", "status"); cuando ``write_batch``
+o ``update_client_status`` confirman cambios, solo se invalidan y recalculan
+los snapshots afectados.
+"""
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Response
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import SessionLocal, MetricSnapshot
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Tipos de cambio que pueden invalidar snapshots
+CHANGE_PROBABILITY = "probability"
+CHANGE_STATUS = "status"
+
+# Antigüedad máxima (segundos) con la que se sirve un snapshot invalidado
+# antes de recalcularlo dentro de la propia petición
+MAX_STALENESS_SECONDS = float(os.environ.get("SNAPSHOT_MAX_STALENESS", "30"))
+
+# Registro de builders: nombre -> (función, dependencias)
+SnapshotBuilder = Callable[..., Awaitable[Any]]
+SNAPSHOT_BUILDERS: Dict[str, Tuple[SnapshotBuilder, Tuple[str, ...]]] = {}
+
+# Tarea de refresco en curso (una por proceso) y bandera de re-ejecución
+_refresh_task: Optional[asyncio.Task] = None
+_refresh_requested = False
+
+
+def snapshot_builder(name: str, depends_on: Iterable[str]):
+    """
+    Registra una función async ``builder(db, **params)`` que calcula el payload
+    de un snapshot a partir de las tablas de origen.
+    """
+    def decorator(fn: SnapshotBuilder) -> SnapshotBuilder:
+        SNAPSHOT_BUILDERS[name] = (fn, tuple(depends_on))
+        return fn
+    return decorator
+
+
+def snapshot_key(name: str, params: Dict[str, Any]) -> str:
+    """Clave estable de un snapshot: nombre del builder + parámetros ordenados"""
+    if not params:
+        return name
+    return f"{name}:{json.dumps(params, sort_keys=True)}"
+
+
+async def _build_and_store(db: AsyncSession, name: str, params: Dict[str, Any],
+                           seen_generation: int = 0) -> MetricSnapshot:
+    """
+    Calcula el payload con el builder registrado y lo guarda (upsert).
+
+    Como en ``refresh_dirty_snapshots``, la fila existente solo se actualiza si
+    su ``generation`` sigue siendo ``seen_generation`` (leída antes de ejecutar
+    el builder): si ``mark_dirty`` se confirmó mientras se calculaba, el payload
+    puede no incluir ese cambio y la fila queda sucia para el refresco.
+    """
+    builder, depends_on = SNAPSHOT_BUILDERS[name]
+    payload = await builder(db, **params)
+    now = datetime.now()
+    values = {
+        "key": snapshot_key(name, params),
+        "builder": name,
+        "params": json.dumps(params, sort_keys=True),
+        "depends_on": ",".join(depends_on),
+        "payload": json.dumps(payload),
+        "generation": seen_generation,
+        "dirty": False,
+        "refreshed_at": now,
+    }
+    stmt = insert(MetricSnapshot).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MetricSnapshot.key],
+        set_={
+            "payload": stmt.excluded.payload,
+            "dirty": False,
+            "refreshed_at": stmt.excluded.refreshed_at,
+        },
+        where=MetricSnapshot.generation == seen_generation,
+    ).returning(MetricSnapshot.key)
+    result = await db.execute(stmt)
+    stored = result.first() is not None
+    await db.commit()
+    if not stored:
+        logger.info(f"Snapshot '{values['key']}' invalidado durante el cálculo; queda pendiente de refresco")
+        values["dirty"] = True
+    return MetricSnapshot(**values)
+
+
+async def get_snapshot(db: AsyncSession, name: str, **params) -> Tuple[Any, MetricSnapshot]:
+    """
+    Devuelve el payload de un snapshot y su fila de metadatos.
+
+    Si el snapshot no existe se calcula en ese momento. Si está invalidado se
+    sirve tal cual mientras el job de refresco lo actualiza, salvo que supere
+    MAX_STALENESS_SECONDS, en cuyo caso se recalcula dentro de la petición.
+    """
+    key = snapshot_key(name, params)
+    result = await db.execute(select(MetricSnapshot).where(MetricSnapshot.key == key))
+    row = result.scalars().first()
+
+    if row is None:
+        row = await _build_and_store(db, name, params)
+    elif row.dirty and (datetime.now() - row.refreshed_at).total_seconds() > MAX_STALENESS_SECONDS:
+        logger.warning(f"Snapshot '{key}' supera la antigüedad máxima; recalculando en línea")
+        row = await _build_and_store(db, name, params, seen_generation=row.generation)
+
+    return json.loads(row.payload), row
+
+
+def apply_snapshot_headers(response: Response, row: MetricSnapshot):
+    """Informa al cliente la antigüedad del snapshot servido"""
+    age = max(0.0, (datetime.now() - row.refreshed_at).total_seconds())
+    response.headers["X-Snapshot-Age"] = f"{age:.3f}"
+    response.headers["X-Snapshot-Refreshed-At"] = row.refreshed_at.isoformat()
+    response.headers["X-Snapshot-Stale"] = "true" if row.dirty else "false"
+    if row.dirty:
+        # No guardar en la caché de respuestas un snapshot que se está refrescando
+        response.headers["Cache-Control"] = "no-store"
+
+
+async def mark_dirty(db: AsyncSession, change: str):
+    """
+    Invalida los snapshots que dependen de ``change`` dentro de la transacción
+    del llamador, de modo que la invalidación se confirma junto con el cambio.
+    """
+    await db.execute(
+        update(MetricSnapshot)
+        .where(func.strpos(MetricSnapshot.depends_on, change) > 0)
+        .values(dirty=True, generation=MetricSnapshot.generation + 1)
+    )
+
+
+def invalidate_all_snapshots(conn):
+    """
+    Invalida todos los snapshots desde una conexión síncrona, dentro de su
+    transacción (scripts de carga que reemplazan los datos de origen).
+    """
+    conn.execute(update(MetricSnapshot).values(dirty=True, generation=MetricSnapshot.generation + 1))
+
+
+async def refresh_dirty_snapshots(session_factory=SessionLocal) -> int:
+    """
+    Recalcula todos los snapshots invalidados.
+
+    Cada fila solo se marca como limpia si su ``generation`` no cambió mientras
+    se recalculaba; si hubo una nueva invalidación queda sucia para la siguiente
+    pasada.
+
+    Returns:
+        int: Número de snapshots actualizados
+    """
+    refreshed = 0
+    async with session_factory() as db:
+        result = await db.execute(
+            select(MetricSnapshot.key, MetricSnapshot.builder, MetricSnapshot.params, MetricSnapshot.generation)
+            .where(MetricSnapshot.dirty.is_(True))
+        )
+        pending = result.fetchall()
+
+        for key, name, params, generation in pending:
+            if name not in SNAPSHOT_BUILDERS:
+                logger.warning(f"Snapshot '{key}' sin builder registrado; se omite")
+                continue
+            builder, _ = SNAPSHOT_BUILDERS[name]
+            try:
+                payload = await builder(db, **json.loads(params or "{}"))
+                result = await db.execute(
+                    update(MetricSnapshot)
+                    .where(MetricSnapshot.key == key, MetricSnapshot.generation == generation)
+                    .values(payload=json.dumps(payload), dirty=False, refreshed_at=datetime.now())
+                )
+                await db.commit()
+                refreshed += result.rowcount
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error al refrescar snapshot '{key}': {e}")
+
+    if refreshed:
+        logger.info(f"{refreshed} snapshots de métricas refrescados")
+    return refreshed
+
+
+async def _refresh_loop():
+    """Ejecuta pasadas de refresco mientras lleguen nuevas solicitudes"""
+    global _refresh_requested
+    while _refresh_requested:
+        _refresh_requested = False
+        try:
+            await refresh_dirty_snapshots()
+        except Exception as e:
+            logger.error(f"Error en el job de refresco de snapshots: {e}")
+
+
+def schedule_refresh():
+    """
+    Programa el refresco de snapshots en segundo plano.
+
+    Debe llamarse después del commit que los invalidó. Las llamadas que llegan
+    mientras hay un refresco en curso se agrupan en una sola pasada adicional.
+    """
+    global _refresh_task, _refresh_requested
+    _refresh_requested = True
+    if _refresh_task is None or _refresh_task.done():
+        try:
+            _refresh_task = asyncio.get_running_loop().create_task(_refresh_loop())
+        except RuntimeError:
+            # Sin event loop (scripts síncronos): el refresco ocurrirá en la
+            # próxima lectura que supere MAX_STALENESS_SECONDS
+            _refresh_requested = False
+
+
+async def ensure_snapshot_table(engine):
+    """Crea la tabla de snapshots si la base de datos aún no la tiene"""
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: MetricSnapshot.__table__.create(sync_conn, checkfirst=True))
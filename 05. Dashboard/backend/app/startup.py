@@ -14,6 +14,7 @@ from datetime import datetime
 from pathlib import Path
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 
 # Configurar logging
 logging.basicConfig(
@@ -43,11 +44,12 @@ async def check_database(database_url):
         if "postgresql://" in database_url and "+asyncpg" not in database_url:
             database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
         
-        # Crear engine para conexión
+        # Engine sin pool: una única conexión que se cierra al terminar, fuera
+        # del presupuesto de conexiones de los workers
         engine = create_async_engine(
             database_url,
             echo=False,
-            pool_pre_ping=True,
+            poolclass=NullPool,
             connect_args={"timeout": 5}
         )
         
@@ -81,6 +83,7 @@ async def check_database(database_url):
             else:
                 logger.warning("⚠️ Tabla prediction_results no encontrada")
                 
+        await engine.dispose()
         return True
     except Exception as e:
         logger.error(f"❌ Error al verificar base de datos: {str(e)}")
@@ -0,0 +1,6 @@
+"""
+Benchmarks de rendimiento del backend.
+
+Se ejecutan desde ``05. Dashboard/backend`` como módulos, por ejemplo:
+    python -m benchmarks.bench_metrics_summary
+"""
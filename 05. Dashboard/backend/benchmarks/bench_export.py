@@ -0,0 +1,112 @@
+"""
+Benchmark de la exportación columnar frente a paginar priority-list.
+
+Para cada tamaño de la base compara:
+
+- priority-list: recorrer todas las páginas con cursor (``size=100``, el máximo)
+  a través de la app (``httpx.ASGITransport``, sin red), como hacen hoy los
+  analistas;
+- arrow / parquet: ``export_stream`` completo desde el cursor del servidor.
+
+Reporta segundos totales, peticiones, bytes transferidos y la memoria pico de
+Python durante la exportación (``tracemalloc``, en una pasada aparte porque
+enlentece la medición de tiempo), que debe mantenerse plana al crecer el
+número de clientes.
+
+Uso:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --sizes 100000 1000000 --skip-pages
+"""
+import argparse
+import time
+import tracemalloc
+
+import httpx
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    print_table, run, logger,
+)
+from app.api import app
+from app.database import get_db, open_session
+from app.export import COLUMNS, export_stream
+
+
+async def walk_priority_list(Session):
+    """Recorre la lista de prioridad completa por cursor; devuelve (peticiones, bytes)"""
+    async def bench_db():
+        db = await open_session(session_factory=Session)
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    requests, size, cursor = 0, 0, ""
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            while cursor is not None:
+                response = await client.get("/api/v1/clients/priority-list", params={"cursor": cursor, "size": 100})
+                response.raise_for_status()
+                requests += 1
+                size += len(response.content)
+                cursor = response.json()["next_cursor"]
+    finally:
+        app.dependency_overrides.clear()
+    return requests, size
+
+
+async def run_export(Session, fmt, batch_size):
+    """Exportación completa descartando los bytes; devuelve el tamaño total"""
+    size = 0
+    async for chunk in export_stream(list(COLUMNS), fmt, batch_size=batch_size, session_factory=Session):
+        size += len(chunk)
+    return size
+
+
+async def export_peak_memory(Session, fmt, batch_size):
+    """Memoria pico de Python (MiB) de una exportación completa"""
+    tracemalloc.start()
+    try:
+        await run_export(Session, fmt, batch_size)
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+async def main(sizes, batch_size, skip_pages):
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    rows = []
+    for n_clients in sizes:
+        await reset_schema(engine)
+        logger.info(f"Generando {n_clients} clientes sintéticos...")
+        await seed_clients(engine, n_clients)
+
+        if not skip_pages:
+            start = time.perf_counter()
+            requests, size = await walk_priority_list(Session)
+            rows.append({"clients": n_clients, "mode": "priority-list", "seconds": time.perf_counter() - start,
+                         "requests": requests, "MiB": size / 2 ** 20, "peak_MiB": "-"})
+
+        for fmt in ("arrow", "parquet"):
+            start = time.perf_counter()
+            size = await run_export(Session, fmt, batch_size)
+            seconds = time.perf_counter() - start
+            rows.append({"clients": n_clients, "mode": fmt, "seconds": seconds, "requests": 1,
+                         "MiB": size / 2 ** 20, "peak_MiB": await export_peak_memory(Session, fmt, batch_size)})
+
+    await engine.dispose()
+    print_table(
+        f"Exportación completa de clientes (lotes de {batch_size} filas)",
+        rows, ["clients", "mode", "seconds", "requests", "MiB", "peak_MiB"]
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[100_000], help="Número de clientes a generar")
+    p.add_argument("--batch-size", type=int, default=10_000, help="Filas por lote del cursor")
+    p.add_argument("--skip-pages", action="store_true", help="No medir el recorrido de priority-list")
+    args = p.parse_args()
+    run(main(args.sizes, args.batch_size, args.skip_pages))
@@ -0,0 +1,75 @@
+"""
+Puntuación repetida con y sin la caché de features (``app.feature_cache``).
+
+Puntúa los mismos clientes sintéticos tres veces con ``ml_service.predict``:
+
+- cold: caché vacía (calcula versiones + todo el pipeline);
+- warm: nada cambió, todo sale de la caché;
+- changed: --changed-pct de los clientes con transacciones nuevas.
+
+y lo compara con la caché desactivada. No usa base de datos.
+
+Uso:
+    python -m benchmarks.bench_feature_cache
+    python -m benchmarks.bench_feature_cache --clients 20000 --changed-pct 1
+"""
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from benchmarks.common import print_table, logger
+from benchmarks.profile_feature_pipeline import synthetic_inputs
+from app import ml_service
+from app.feature_cache import FeatureCache
+from app.features.transaction_aggregates import TransactionAggregates
+
+TRAINING_CATEGORIES = ["entertainment", "food", "health", "shopping", "supermarket", "transport", "travel"]
+
+
+async def timed_predict(demographics, aggs, products):
+    t0 = time.perf_counter()
+    result = await ml_service.predict(demographics, aggs, products_df=products)
+    return (time.perf_counter() - t0) * 1000, result
+
+
+async def main(n_clients: int, changed_pct: float):
+    logger.info(f"Generando {n_clients} clientes sintéticos...")
+    demographics, products, transactions = synthetic_inputs(n_clients * 10, n_clients, categories=TRAINING_CATEGORIES)
+    aggs = TransactionAggregates.from_transactions(transactions)
+
+    changed_users = demographics["user_id"].sample(frac=changed_pct / 100, random_state=0)
+    new_tx = transactions[transactions["user_id"].isin(changed_users)].groupby("user_id").head(1).assign(amount=999.0)
+    updated = TransactionAggregates.combine([aggs, TransactionAggregates.from_transactions(new_tx)])
+
+    # Calentamiento: importaciones perezosas y primer uso del modelo
+    ml_service.feature_cache = FeatureCache(epoch_file=None, enabled=False)
+    await timed_predict(demographics.head(100), aggs, products)
+
+    rows = []
+    for enabled in (False, True):
+        cache = FeatureCache(epoch_file=None, enabled=enabled)
+        ml_service.feature_cache = cache
+        scenarios = [("cold", aggs), ("warm", aggs), ("changed", updated)]
+        for scenario, scenario_aggs in scenarios:
+            ms, _ = await timed_predict(demographics, scenario_aggs, products)
+            stats = cache.stats()
+            rows.append({
+                "cache": "on" if enabled else "off",
+                "scenario": scenario,
+                "ms": ms,
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+            })
+
+    print_table(f"predict de {n_clients} clientes ({changed_pct}% con datos nuevos)",
+                rows, ["cache", "scenario", "ms", "hits", "misses"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, default=10_000)
+    p.add_argument("--changed-pct", type=float, default=1.0, help="Porcentaje de clientes con transacciones nuevas")
+    args = p.parse_args()
+    asyncio.run(main(args.clients, args.changed_pct))
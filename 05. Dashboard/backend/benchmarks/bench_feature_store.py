@@ -0,0 +1,129 @@
+"""
+Benchmark del estado de features por usuario (app.feature_store).
+
+Compara el recálculo completo de las features de transacciones (lo que hace
+generate_features sobre todo el historial en cada corrida) con la
+actualización incremental: sumar un batch de transacciones nuevas al estado
+persistido y derivar las features solo de los usuarios afectados.
+
+Al final verifica que las features incrementales de los usuarios afectados
+coinciden con las del recálculo completo sobre historial + batches.
+
+Uso:
+    python -m benchmarks.bench_feature_store
+    python -m benchmarks.bench_feature_store --users 100000 --batch-sizes 1000 10000
+"""
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import create_bench_engine, bench_session_factory, reset_schema, print_table, run, logger
+from app.features.transaction_aggregates import TransactionAggregates, transaction_features
+from app.feature_store import (
+    FEATURE_STATE_TABLES, feature_state_records, apply_transactions, user_transaction_features,
+)
+
+REFERENCE_DATE = pd.Timestamp("2024-01-01")
+CATEGORIES = np.array(["entertainment", "food", "shopping", "transport", "travel", "health", "utilities", "education"])
+
+
+def synthetic_transactions(rng, n_rows: int, n_users: int, offset: int = 0, start="2023-01-01", days=365) -> pd.DataFrame:
+    """Transacciones aleatorias repartidas entre ``n_users`` usuarios"""
+    users = rng.integers(1, n_users + 1, size=n_rows)
+    return pd.DataFrame({
+        "transaction_id": np.char.add("tx-", np.arange(offset, offset + n_rows).astype(str)).astype(object),
+        "user_id": np.char.add("user_", users.astype(str)).astype(object),
+        "date": pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size=n_rows), unit="D"),
+        "amount": rng.gamma(2.0, 40.0, size=n_rows).round(2),
+        "merchant_category": CATEGORIES[rng.integers(0, len(CATEGORIES), size=n_rows)].astype(object),
+    })
+
+
+async def copy_state(engine, aggs: TransactionAggregates):
+    """Carga el estado inicial con COPY (asyncpg) en lugar de upserts"""
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        for model, records in feature_state_records(aggs):
+            if not records:
+                continue
+            columns = list(records[0].keys())
+            await raw.copy_records_to_table(
+                model.__tablename__,
+                records=[tuple(r[c] for c in columns) for r in records],
+                columns=columns,
+            )
+        await conn.commit()
+
+
+async def main(n_users: int, tx_per_user: int, batch_sizes):
+    rng = np.random.default_rng(42)
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    await reset_schema(engine)
+
+    n_history = n_users * tx_per_user
+    logger.info(f"Generando historial: {n_history} transacciones de {n_users} usuarios...")
+    history = synthetic_transactions(rng, n_history, n_users)
+
+    logger.info("Cargando el estado inicial de features...")
+    await copy_state(engine, TransactionAggregates.from_transactions(history))
+
+    rows = []
+    batches = []
+    affected_all = set()
+    offset = n_history
+    for batch_size in batch_sizes:
+        batch = synthetic_transactions(rng, batch_size, n_users, offset, start="2024-01-01", days=28)
+        offset += batch_size
+        batches.append(batch)
+
+        async with Session() as db:
+            start = time.perf_counter()
+            affected = await apply_transactions(db, batch)
+            await db.commit()
+            features = await user_transaction_features(db, affected, REFERENCE_DATE)
+            elapsed = time.perf_counter() - start
+        affected_all.update(affected)
+        rows.append({
+            "mode": "incremental",
+            "new_tx": batch_size,
+            "users_rescored": len(features),
+            "seconds": elapsed,
+        })
+
+    logger.info("Recalculando desde cero sobre historial + batches...")
+    full_tx = pd.concat([history] + batches, ignore_index=True)
+    start = time.perf_counter()
+    full = transaction_features(TransactionAggregates.from_transactions(full_tx), REFERENCE_DATE)
+    elapsed = time.perf_counter() - start
+    rows.append({
+        "mode": "full recompute",
+        "new_tx": sum(batch_sizes),
+        "users_rescored": len(full),
+        "seconds": elapsed,
+    })
+
+    # Paridad: el estado incremental reproduce el recálculo completo
+    async with Session() as db:
+        incremental = await user_transaction_features(db, sorted(affected_all), REFERENCE_DATE)
+    expected = full[full["user_id"].isin(affected_all)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected, incremental, check_exact=False, check_categorical=False)
+    logger.info(f"Paridad verificada para {len(incremental)} usuarios afectados")
+
+    await engine.dispose()
+    print_table(
+        f"Features de transacciones: {n_users} usuarios, {n_history} transacciones de historial",
+        rows,
+        ["mode", "new_tx", "users_rescored", "seconds"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--users", type=int, default=1_000_000, help="Usuarios con historial")
+    p.add_argument("--tx-per-user", type=int, default=3, help="Transacciones de historial por usuario")
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = p.parse_args()
+    run(main(args.users, args.tx_per_user, args.batch_sizes))
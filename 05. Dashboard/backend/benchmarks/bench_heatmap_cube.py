@@ -0,0 +1,101 @@
+"""
+Benchmark de /api/v1/metrics/heatmap con el cubo preagregado.
+
+Para 100k y 1M clientes compara, con edad × segmento y probabilidad ×
+ocupación:
+
+- raw: la versión anterior, un ``GROUP BY x_var, y_var`` sobre demographics
+  (una celda por valor distinto de edad o probabilidad);
+- cube: la suma de celdas de ``heatmap_cube`` (``query_cube``).
+
+Mide también la reconstrucción completa del cubo y el delta de un cambio de
+estado (``apply_client_delta`` antes y después, como ``update_client_status``),
+y verifica que tras los deltas el cubo coincide con una reconstrucción.
+
+Uso:
+    python -m benchmarks.bench_heatmap_cube
+    python -m benchmarks.bench_heatmap_cube --sizes 100000 --iterations 100
+"""
+import argparse
+import time
+
+from sqlalchemy import select, func, update
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    measure, print_table, run, logger,
+)
+from app.database import Client
+from app.heatmap_cube import MEASURES, apply_client_delta, query_cube, rebuild_cube
+from app.ml_service import THRESHOLD
+
+PAIRS = (("age", "segment"), ("probability", "occupation"))
+
+
+async def raw_heatmap(db, x_var, y_var):
+    """Versión anterior del endpoint: GROUP BY sobre los valores sin agrupar"""
+    x, y = getattr(Client, x_var), getattr(Client, y_var)
+    result = await db.execute(select(x, y, func.count(Client.id)).group_by(x, y))
+    return result.fetchall()
+
+
+async def cube_snapshot(db):
+    cells = await query_cube(db, "status", "age")
+    cells += await query_cube(db, "probability", "segment")
+    return sorted((c["x"], c["y"], *(round(c[m], 6) for m in MEASURES)) for c in cells)
+
+
+async def change_status(db, client_id, new_status):
+    await apply_client_delta(db, [client_id], -1, THRESHOLD)
+    await db.execute(update(Client).where(Client.id == client_id).values(status=new_status))
+    await apply_client_delta(db, [client_id], 1, THRESHOLD)
+    await db.commit()
+
+
+async def main(sizes, iterations):
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    await reset_schema(engine)
+
+    rows = []
+    for n in sizes:
+        logger.info(f"Generando {n} clientes sintéticos...")
+        await seed_clients(engine, n)
+
+        async with Session() as db:
+            started = time.perf_counter()
+            cells = await rebuild_cube(db, THRESHOLD)
+            await db.commit()
+            rebuild_ms = (time.perf_counter() - started) * 1000
+            rows.append({"clients": n, "operation": f"rebuild ({cells} celdas)", "p50_ms": rebuild_ms,
+                         "p99_ms": rebuild_ms, "mean_ms": rebuild_ms, "iterations": 1})
+
+            for x_var, y_var in PAIRS:
+                raw_cells = len(await raw_heatmap(db, x_var, y_var))
+                raw = await measure(lambda: raw_heatmap(db, x_var, y_var), iterations=iterations)
+                cube = await measure(lambda: query_cube(db, x_var, y_var), iterations=iterations)
+                cube_cells = len(await query_cube(db, x_var, y_var))
+                rows.append({"clients": n, "operation": f"raw {x_var}×{y_var} ({raw_cells} celdas)", **raw})
+                rows.append({"clients": n, "operation": f"cube {x_var}×{y_var} ({cube_cells} celdas)", **cube})
+
+            statuses = iter(["contacted", "pending"] * iterations * 2)
+            ids = iter(range(1, iterations * 4 + 100))
+            delta = await measure(lambda: change_status(db, next(ids), next(statuses)), iterations=iterations)
+            rows.append({"clients": n, "operation": "status delta", **delta})
+
+            incremental = await cube_snapshot(db)
+            await rebuild_cube(db, THRESHOLD)
+            await db.commit()
+            assert incremental == await cube_snapshot(db), "El cubo con deltas no coincide con la reconstrucción"
+
+    await engine.dispose()
+    print_table("Mapa de calor: GROUP BY vs cubo", rows, ["clients", "operation", "p50_ms", "p99_ms", "mean_ms", "iterations"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000],
+                   help="Número de clientes a generar en cada corrida")
+    p.add_argument("--iterations", type=int, default=50, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.sizes, args.iterations))
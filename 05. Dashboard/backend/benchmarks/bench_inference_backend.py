@@ -0,0 +1,113 @@
+"""
+Latencia de predict_proba: wrapper de sklearn vs Booster nativo vs evaluador plano.
+
+Compara, para lotes de 1, 8, 100, 10k y 1M clientes:
+
+- sklearn: el camino anterior de ``ml_service.predict`` (conversión de
+  columnas a float y ``XGBClassifier.predict_proba`` sobre el DataFrame);
+- booster: matriz float32 contigua en el orden de ``feature_names_in_`` y
+  ``Booster.inplace_predict`` (``app.booster_predictor``);
+- flat: árboles exportados a arreglos NumPy (``app.flat_tree_predictor``),
+  siempre en NumPy; solo hasta --flat-max-rows filas.
+
+Usa el modelo activo de ``ml_service`` y features de clientes sintéticos
+(transformados con su FeatureTransformer), repetidos hasta el tamaño de cada
+lote. ``ms_per_call`` parte del DataFrame de features (``ml_service.predict``);
+``ms_matrix`` de una matriz float32 ya ordenada, como las filas del
+micro-batcher de /api/v1/predict. No usa base de datos.
+
+Uso:
+    python -m benchmarks.bench_inference_backend
+    python -m benchmarks.bench_inference_backend --sizes 1 100 10000 1000000 --clients 20000
+"""
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.common import print_table, logger
+from benchmarks.profile_feature_pipeline import synthetic_inputs
+from app import ml_service
+from app.booster_predictor import booster_predictor
+from app.flat_tree_predictor import FlatTreePredictor
+from app.features import generate_features
+
+TRAINING_CATEGORIES = ["entertainment", "food", "health", "shopping", "supermarket", "transport", "travel"]
+
+
+def sklearn_path(model, X):
+    """Camino anterior: conversión columna a columna y predict_proba del wrapper"""
+    if hasattr(X, "columns"):
+        X = X.copy()
+        for col in X.columns:
+            if X[col].dtype == 'object' or X[col].dtype.name == 'category':
+                X[col] = X[col].astype(float)
+    return model.predict_proba(X)[:, 1]
+
+
+def booster_path(predictor, X):
+    return predictor.predict_proba(predictor.matrix(X))[:, 1]
+
+
+def flat_path(predictor, X):
+    return 1.0 / (1.0 + np.exp(-predictor.predict_margin(X)))
+
+
+def time_call(fn, min_seconds: float = 1.0, max_repeat: int = 1000):
+    """Milisegundos por llamada: mediana de las repeticiones en ``min_seconds``"""
+    fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_repeat and (not samples or time.perf_counter() - start < min_seconds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(samples)), len(samples)
+
+
+def main(sizes, n_clients: int, flat_max_rows: int):
+    bundle = ml_service.registry.current
+    predictor = booster_predictor(bundle.model, bundle.feature_names)
+    if predictor is None:
+        raise SystemExit(f"El modelo activo ({type(bundle.model).__name__}) no admite el Booster nativo")
+    flat = FlatTreePredictor.from_model(bundle.model, bundle.feature_names)
+
+    logger.info(f"Generando features de {n_clients} clientes sintéticos...")
+    demographics, products, transactions = synthetic_inputs(n_clients * 10, n_clients, categories=TRAINING_CATEGORIES)
+    features = generate_features(demographics, products, transactions, transformer=bundle.transformer)
+    base = features.drop(columns=ml_service.NON_MODEL_COLUMNS, errors="ignore")
+    if bundle.feature_names:
+        base = base[bundle.feature_names]
+
+    rows = []
+    for size in sizes:
+        X = base.iloc[np.arange(size) % len(base)].reset_index(drop=True)
+        matrix = predictor.matrix(X)
+        expected = sklearn_path(bundle.model, X)
+        backends = [("sklearn", sklearn_path, bundle.model), ("booster", booster_path, predictor)]
+        if size <= flat_max_rows:
+            backends.append(("flat", flat_path, flat))
+        for backend, fn, model in backends:
+            diff = max(np.abs(fn(model, X) - expected).max(), np.abs(fn(model, matrix) - expected).max())
+            ms, repeat = time_call(lambda: fn(model, X))
+            rows.append({
+                "rows": size,
+                "backend": backend,
+                "ms_per_call": ms,
+                "ms_matrix": time_call(lambda: fn(model, matrix))[0],
+                "us_per_row": ms * 1000 / size,
+                "repeat": repeat,
+                "max_abs_diff": float(diff),
+            })
+
+    print_table(f"predict_proba por tamaño de lote ({type(bundle.model).__name__}, versión {bundle.version})",
+                rows, ["rows", "backend", "ms_per_call", "ms_matrix", "us_per_row", "repeat", "max_abs_diff"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 100, 10_000, 1_000_000])
+    p.add_argument("--clients", type=int, default=20_000, help="Clientes sintéticos distintos")
+    p.add_argument("--flat-max-rows", type=int, default=10_000, help="Lote máximo medido con el evaluador plano")
+    args = p.parse_args()
+    main(args.sizes, args.clients, args.flat_max_rows)
@@ -0,0 +1,123 @@
+"""
+Benchmark de latencia de la API mientras se puntúa un batch grande.
+
+Lanza ``ml_service.predict`` sobre un batch de clientes sintéticos (100k por
+defecto) y, en paralelo en el mismo event loop, peticiones periódicas a un
+endpoint ligero de la API. Compara:
+
+- inline: generate_features y predict_proba en el event loop (comportamiento
+  anterior): las peticiones esperan a que termine el batch;
+- executor: features en el pool de procesos y XGBoost en el pool de hilos
+  (app.inference_executor);
+- threads: todo en el pool de hilos (FEATURE_PROCESSES=0).
+
+Reporta p50/p99/máximo de la latencia de la API durante el batch (medida
+desde el instante programado de cada petición) y la duración del batch. No
+usa base de datos: el endpoint de prueba es ``/``.
+
+Uso:
+    python -m benchmarks.bench_inference_executor
+    python -m benchmarks.bench_inference_executor --clients 100000 --transactions 1000000 --interval-ms 10
+"""
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import httpx
+
+from benchmarks.common import print_table, logger
+from benchmarks.profile_feature_pipeline import synthetic_inputs
+from app import ml_service
+from app.api import app
+from app.features.transaction_aggregates import TransactionAggregates
+from app.inference_executor import InferenceExecutor
+
+# Categorías de comercio con las que se entrenó el modelo
+TRAINING_CATEGORIES = ["entertainment", "food", "health", "shopping", "supermarket", "transport", "travel"]
+
+
+async def probe_latencies(client: httpx.AsyncClient, stop: asyncio.Event, interval: float):
+    """
+    Peticiones a / programadas cada ``interval`` segundos hasta ``stop``. La
+    latencia se mide desde el instante programado, no desde el envío: si el
+    event loop está bloqueado, la espera hasta poder enviar también cuenta.
+    """
+    latencies = []
+
+    async def one(scheduled: float):
+        response = await client.get("/")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+
+    tasks = []
+    t0 = time.perf_counter()
+    i = 0
+    while not stop.is_set():
+        scheduled = t0 + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(scheduled)))
+        i += 1
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+async def run_mode(mode: str, executor: InferenceExecutor, demographics, products, aggs, interval: float):
+    ml_service.inference_executor = executor
+    if executor.enabled:
+        # Arrancar los procesos fuera de la medición, como hace el startup de la API
+        await asyncio.to_thread(executor.warm_up)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        probes = asyncio.create_task(probe_latencies(client, stop, interval))
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        result = await ml_service.predict(demographics, aggs, products_df=products)
+        batch_seconds = time.perf_counter() - start
+        stop.set()
+        latencies = np.array(await probes)
+
+    executor.shutdown()
+    return {
+        "mode": mode,
+        "rows_scored": len(result),
+        "batch_s": batch_seconds,
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+
+async def main(n_clients: int, n_transactions: int, interval_ms: float, threads: int, processes: int):
+    logger.info(f"Generando {n_clients} clientes y {n_transactions} transacciones...")
+    demographics, products, transactions = synthetic_inputs(n_transactions, n_clients, categories=TRAINING_CATEGORIES)
+    aggs = TransactionAggregates.from_transactions(transactions)
+    interval = interval_ms / 1000
+
+    rows = [
+        await run_mode("inline", InferenceExecutor(enabled=False), demographics, products, aggs, interval),
+        await run_mode(
+            "executor", InferenceExecutor(threads=threads, processes=processes),
+            demographics, products, aggs, interval,
+        ),
+        await run_mode("threads", InferenceExecutor(threads=threads, processes=0), demographics, products, aggs, interval),
+    ]
+    print_table(
+        f"Latencia de la API durante un batch de {n_clients} clientes (sondeo cada {interval_ms} ms)",
+        rows,
+        ["mode", "rows_scored", "batch_s", "requests", "p50_ms", "p99_ms", "max_ms"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, default=100_000)
+    p.add_argument("--transactions", type=int, default=1_000_000)
+    p.add_argument("--interval-ms", type=float, default=10.0, help="Intervalo entre peticiones de sondeo")
+    p.add_argument("--threads", type=int, default=2)
+    p.add_argument("--processes", type=int, default=1)
+    args = p.parse_args()
+    asyncio.run(main(args.clients, args.transactions, args.interval_ms, args.threads, args.processes))
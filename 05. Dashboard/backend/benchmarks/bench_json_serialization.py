@@ -0,0 +1,118 @@
+"""
+Benchmark del costo de serialización de las respuestas del router v1.
+
+No usa base de datos: monta los payloads típicos de cada endpoint (summary,
+priority-list, probability-distribution y heatmap, este último con NumPy) en
+una app mínima y los sirve de dos formas a través de FastAPI
+(``httpx.ASGITransport``, sin red):
+
+- default: se devuelve el payload; FastAPI lo valida con el ``response_model``
+  (si lo hay), lo pasa por ``jsonable_encoder`` y lo renderiza con
+  ``JSONResponse`` (``json.dumps``);
+- fast: el endpoint devuelve ``json_response(payload)`` (orjson, sin
+  revalidación ni ``jsonable_encoder``).
+
+Uso:
+    python -m benchmarks.bench_json_serialization
+    python -m benchmarks.bench_json_serialization --page-size 500 --heatmap-size 50 --iterations 500
+"""
+import argparse
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from benchmarks.common import measure, print_table, run, logger
+from app.fast_json import FastJSONResponse, json_response
+from app.schemas import KPISummary
+
+
+def build_payloads(page_size, heatmap_size):
+    """Payloads con la forma de cada endpoint; el heatmap trae una matriz de NumPy"""
+    rng = np.random.default_rng(0)
+    summary = {
+        "total_clients": 100_000, "churn_risk_mean": 0.4312, "contacted": 20_000,
+        "conversion_rate": 0.0731, "at_risk_count": 37_412,
+    }
+    priority = {
+        "items": [
+            {
+                "id": i, "user_id": f"user_{i}", "probability": float(p), "status": "pending",
+                "age": int(20 + i % 50), "risk_profile": "moderate", "income_range": "50k-100k",
+                "priority": "high" if p > 0.7 else "medium" if p > 0.4 else "low",
+            }
+            for i, p in enumerate(np.sort(rng.random(page_size))[::-1])
+        ],
+        "next_cursor": "MC45OTk5OjEyMzQ1",
+    }
+    distribution = {
+        "buckets": [
+            {"range": f"{i * 10}-{(i + 1) * 10}%", "no_contacted": 8000, "contacted": 2000,
+             "count": 10_000, "percentage": 10.0}
+            for i in range(10)
+        ],
+        "threshold": 0.5,
+    }
+    heatmap = {
+        "x_categories": [f"x{i}" for i in range(heatmap_size)],
+        "y_categories": [f"y{i}" for i in range(heatmap_size)],
+        "values": rng.random((heatmap_size, heatmap_size)),
+        "metric": "probability",
+        "threshold": 0.5,
+    }
+    return {"summary": summary, "priority-list": priority, "probability-distribution": distribution, "heatmap": heatmap}
+
+
+def build_app(payloads):
+    """Una ruta por endpoint y modo de serialización"""
+    app = FastAPI()
+
+    def add(name, payload, response_model=None):
+        # El camino por defecto no serializa NumPy; recibe la matriz como listas
+        default_payload = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in payload.items()}
+
+        @app.get(f"/default/{name}", response_model=response_model, response_class=JSONResponse)
+        async def default():
+            return default_payload
+
+        @app.get(f"/fast/{name}", response_model=response_model, response_class=FastJSONResponse)
+        async def fast():
+            return json_response(payload)
+
+    for name, payload in payloads.items():
+        add(name, payload, KPISummary if name == "summary" else None)
+    return app
+
+
+async def main(page_size, heatmap_size, iterations):
+    payloads = build_payloads(page_size, heatmap_size)
+    app = build_app(payloads)
+    logger.info(f"Midiendo {len(payloads)} endpoints, {iterations} iteraciones por modo...")
+
+    rows = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name in payloads:
+            sizes = {}
+            for mode in ("default", "fast"):
+                url = f"/{mode}/{name}"
+                response = await client.get(url)
+                response.raise_for_status()
+                sizes[mode] = len(response.content)
+                stats = await measure(lambda: client.get(url), iterations=iterations)
+                rows.append({"endpoint": name, "mode": mode, "bytes": sizes[mode], "speedup": "-", **stats})
+            rows[-1]["speedup"] = rows[-2]["mean_ms"] / rows[-1]["mean_ms"]
+
+    print_table(
+        f"Serialización de respuestas (priority-list de {page_size} filas, heatmap de {heatmap_size}x{heatmap_size})",
+        rows, ["endpoint", "mode", "bytes", "p50_ms", "p99_ms", "mean_ms", "speedup"]
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--page-size", type=int, default=100, help="Filas de la página de priority-list")
+    p.add_argument("--heatmap-size", type=int, default=30, help="Categorías por eje del heatmap")
+    p.add_argument("--iterations", type=int, default=300, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.page_size, args.heatmap_size, args.iterations))
@@ -0,0 +1,67 @@
+"""
+Benchmark de /api/v1/metrics/summary.
+
+Compara la implementación anterior (cuatro SELECT independientes), la
+consulta agregada única de ``kpi_summary_query`` y la lectura desde el
+snapshot materializado para 1k, 100k y 1M clientes, reportando latencia
+p50 y p99.
+
+Uso:
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_metrics_summary
+    python -m benchmarks.bench_metrics_summary --sizes 1000 100000 --iterations 100
+"""
+import argparse
+
+from sqlalchemy import select, func
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    measure, print_table, run, logger,
+)
+from app.api import build_metrics_summary
+from app.snapshot import get_snapshot
+from app.database import Client, Contact
+from app.ml_service import THRESHOLD
+
+
+async def legacy_summary(db):
+    """Reproduce la versión anterior del endpoint: un SELECT por KPI"""
+    total = (await db.execute(select(func.count()).select_from(Client))).scalar() or 0
+    mean = (await db.execute(select(func.avg(Client.probability)).select_from(Client))).scalar() or 0.0
+    contacted = (await db.execute(select(func.count(Contact.id)).select_from(Contact))).scalar() or 0
+    at_risk = (await db.execute(
+        select(func.count()).select_from(Client).where(Client.probability >= THRESHOLD)
+    )).scalar() or 0
+    return total, mean, contacted, at_risk
+
+
+async def main(sizes, iterations):
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    await reset_schema(engine)
+
+    rows = []
+    for n in sizes:
+        logger.info(f"Generando {n} clientes sintéticos...")
+        await seed_clients(engine, n)
+
+        async with Session() as db:
+            legacy = await measure(lambda: legacy_summary(db), iterations=iterations)
+            single = await measure(lambda: build_metrics_summary(db), iterations=iterations)
+            cached = await measure(lambda: get_snapshot(db, "metrics_summary"), iterations=iterations)
+
+        rows.append({"clients": n, "mode": "4 queries", **legacy})
+        rows.append({"clients": n, "mode": "1 query", **single})
+        rows.append({"clients": n, "mode": "snapshot", **cached})
+
+    await engine.dispose()
+    print_table("GET /api/v1/metrics/summary", rows, ["clients", "mode", "p50_ms", "p99_ms", "mean_ms", "iterations"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                   help="Número de clientes a generar en cada corrida")
+    p.add_argument("--iterations", type=int, default=50, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.sizes, args.iterations))
@@ -0,0 +1,127 @@
+"""
+Prueba de carga de POST /api/v1/predict.
+
+Envía peticiones de clientes sintéticos con distintos niveles de concurrencia
+y reporta peticiones por segundo, latencia p50/p99 y el tamaño medio de lote
+del micro-batcher. Cada nivel se mide con el micro-batcher configurado
+(--max-wait-ms, --max-rows) y sin agrupar (un predict_proba por petición).
+
+Además mide ``ml_service.predict_online`` sin HTTP (--transport direct), que
+aísla el costo del modelo del de FastAPI/JSON.
+
+Por defecto la API se ejecuta en el mismo proceso (httpx + ASGI, sin red);
+con --url se prueba un servidor real, p. ej. uvicorn con varios workers (en ese
+caso la configuración del batcher es la del servidor: PREDICT_BATCH_MAX_WAIT_MS
+y PREDICT_BATCH_MAX_ROWS). No usa base de datos.
+
+Uso:
+    python -m benchmarks.bench_predict_endpoint
+    python -m benchmarks.bench_predict_endpoint --concurrency 1 16 64 256 --requests 5000
+    python -m benchmarks.bench_predict_endpoint --transport direct
+    python -m benchmarks.bench_predict_endpoint --url http://localhost:8000
+"""
+import json
+import time
+import asyncio
+import argparse
+from typing import Optional
+
+import numpy as np
+import httpx
+
+from benchmarks.common import print_table, logger
+from benchmarks.profile_feature_pipeline import synthetic_inputs
+from app import ml_service
+from app.api import app
+from app.features import generate_features
+
+TRAINING_CATEGORIES = ["entertainment", "food", "health", "shopping", "supermarket", "transport", "travel"]
+
+
+def sample_payloads(n_clients: int):
+    """Cuerpos de /predict con las features sin transformar de clientes sintéticos"""
+    demographics, products, transactions = synthetic_inputs(n_clients * 10, n_clients, categories=TRAINING_CATEGORIES)
+    raw = generate_features(demographics, products, transactions, raw=True)
+    return [{"user_id": r["user_id"], "features": r} for r in json.loads(raw.to_json(orient="records"))]
+
+
+async def load(client: Optional[httpx.AsyncClient], payloads, concurrency: int, n_requests: int):
+    """
+    ``concurrency`` clientes que envían peticiones en serie hasta completar
+    ``n_requests``; sin ``client`` llaman a predict_online directamente.
+    """
+    latencies = []
+    counter = iter(range(n_requests))
+
+    async def worker():
+        for i in counter:
+            payload = payloads[i % len(payloads)]
+            start = time.perf_counter()
+            if client is None:
+                await ml_service.predict_online(payload["features"], payload["user_id"])
+            else:
+                response = await client.post("/api/v1/predict", json=payload)
+                response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies)
+    return {
+        "req_per_s": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+async def main(concurrency_levels, n_requests: int, max_wait_ms: float, max_rows: int, url: str, transport: str):
+    logger.info("Generando clientes sintéticos...")
+    payloads = sample_payloads(1000)
+
+    if url:
+        modes = [("server", None)]
+        client = httpx.AsyncClient(base_url=url, timeout=60)
+    else:
+        modes = [(f"batch {max_wait_ms}ms/{max_rows}", (max_wait_ms, max_rows)), ("sin batching", (0.0, 1))]
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    rows = []
+    async with client:
+        if transport == "direct" and not url:
+            client = None
+        # Calentamiento: primera predicción e hilos del pool
+        await load(client, payloads, 4, 100)
+        for mode, config in modes:
+            for concurrency in concurrency_levels:
+                batcher = ml_service.online_batcher
+                if config is not None:
+                    batcher.max_wait_ms, batcher.max_rows = config
+                batches, rows_before = batcher.batches, batcher.rows
+                result = await load(client, payloads, concurrency, n_requests)
+                n_batches = batcher.batches - batches
+                rows.append({
+                    "mode": mode,
+                    "concurrency": concurrency,
+                    **result,
+                    "mean_batch": (batcher.rows - rows_before) / n_batches if n_batches else None,
+                })
+
+    print_table(
+        f"{'predict_online' if client is None else 'POST /api/v1/predict'}: {n_requests} peticiones por nivel",
+        rows,
+        ["mode", "concurrency", "req_per_s", "p50_ms", "p99_ms", "mean_batch"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    p.add_argument("--requests", type=int, default=2000, help="Peticiones por nivel de concurrencia")
+    p.add_argument("--max-wait-ms", type=float, default=ml_service.PREDICT_BATCH_MAX_WAIT_MS)
+    p.add_argument("--max-rows", type=int, default=ml_service.PREDICT_BATCH_MAX_ROWS)
+    p.add_argument("--url", default=None, help="URL de un servidor en ejecución (por defecto, en proceso)")
+    p.add_argument("--transport", choices=["asgi", "direct"], default="asgi",
+                   help="En proceso: a través de la API (asgi) o llamando a predict_online (direct)")
+    args = p.parse_args()
+    asyncio.run(main(args.concurrency, args.requests, args.max_wait_ms, args.max_rows, args.url, args.transport))
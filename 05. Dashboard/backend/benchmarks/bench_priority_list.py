@@ -0,0 +1,63 @@
+"""
+Benchmark de /api/v1/clients/priority-list.
+
+Compara la paginación OFFSET/LIMIT con la paginación por cursor (keyset)
+para la página 1 y la página 10.000, reportando latencia p50 y p99.
+
+Uso:
+    python -m benchmarks.bench_priority_list
+    python -m benchmarks.bench_priority_list --clients 2000000 --size 100 --pages 1 100 10000
+"""
+import argparse
+
+from sqlalchemy import select
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    measure, print_table, run, logger,
+)
+from app.api import PRIORITY_ORDER, fetch_priority_page_offset, fetch_priority_page_after
+from app.database import Client
+
+
+async def cursor_before_page(db, page: int, size: int):
+    """Clave (probability, id) de la última fila de la página anterior a ``page``"""
+    if page == 1:
+        return None
+    query = select(Client.probability, Client.id).order_by(*PRIORITY_ORDER).offset((page - 1) * size - 1).limit(1)
+    row = (await db.execute(query)).one()
+    return row.probability, row.id
+
+
+async def main(n_clients, size, pages, iterations):
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    await reset_schema(engine)
+    logger.info(f"Generando {n_clients} clientes sintéticos...")
+    await seed_clients(engine, n_clients)
+
+    rows = []
+    async with Session() as db:
+        for page in pages:
+            after = await cursor_before_page(db, page, size)
+            offset_stats = await measure(lambda: fetch_priority_page_offset(db, page, size), iterations=iterations)
+            keyset_stats = await measure(lambda: fetch_priority_page_after(db, after, size), iterations=iterations)
+            db.expunge_all()
+            rows.append({"page": page, "mode": "offset", **offset_stats})
+            rows.append({"page": page, "mode": "cursor", **keyset_stats})
+
+    await engine.dispose()
+    print_table(
+        f"GET /api/v1/clients/priority-list ({n_clients} clientes, size={size})",
+        rows, ["page", "mode", "p50_ms", "p99_ms", "mean_ms", "iterations"]
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, default=1_000_000, help="Número de clientes a generar")
+    p.add_argument("--size", type=int, default=100, help="Tamaño de página")
+    p.add_argument("--pages", type=int, nargs="+", default=[1, 10_000], help="Páginas a medir")
+    p.add_argument("--iterations", type=int, default=30, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.clients, args.size, args.pages, args.iterations))
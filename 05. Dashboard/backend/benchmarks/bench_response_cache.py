@@ -0,0 +1,90 @@
+"""
+Benchmark de la caché de respuestas de los endpoints de métricas.
+
+Sondea /api/v1/metrics/summary, /metrics/heatmap y /contacts/progress como lo
+hace el dashboard (mismas URLs una y otra vez, sin cambios en los datos) a
+través de la app completa (``httpx.ASGITransport``: middlewares incluidos, sin
+red) y compara:
+
+- off: sin caché (cada petición abre sesión y consulta Postgres o el snapshot);
+- memory / sqlite: respuesta completa desde la caché, por backend;
+- 304: con ``If-None-Match`` del ETag vigente, sin cuerpo.
+
+Uso:
+    python -m benchmarks.bench_response_cache
+    python -m benchmarks.bench_response_cache --clients 100000 --iterations 500
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    measure, print_table, run, logger,
+)
+from app.api import app, ensure_storage
+from app.database import get_db, open_session
+from app.heatmap_cube import ensure_heatmap_cube_table
+from app.ml_service import THRESHOLD
+from app.response_cache import DataVersion, MemoryBackend, SQLiteBackend, response_cache
+
+ENDPOINTS = [
+    "/api/v1/metrics/summary",
+    "/api/v1/metrics/heatmap?x=age&y=income_range&metric=probability",
+    "/api/v1/contacts/progress",
+]
+
+
+async def main(n_clients, iterations):
+    engine = create_bench_engine()
+    await reset_schema(engine)
+    logger.info(f"Generando {n_clients} clientes sintéticos...")
+    await seed_clients(engine, n_clients)
+    await ensure_heatmap_cube_table(engine, THRESHOLD)
+    Session = bench_session_factory(engine)
+
+    async def bench_db():
+        db = await open_session(session_factory=Session)
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    tmp = Path(tempfile.mkdtemp(prefix="response_cache_"))
+    backends = {"memory": MemoryBackend(), "sqlite": SQLiteBackend(tmp / "cache.sqlite3")}
+    response_cache.data_version = DataVersion(tmp / "data_version")
+
+    rows = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for url in ENDPOINTS:
+            # Primera petición: construye snapshots y cubo fuera de la medición
+            response_cache.enabled = False
+            (await client.get(url)).raise_for_status()
+            rows.append({"endpoint": url, "mode": "off", **await measure(lambda: client.get(url), iterations=iterations)})
+
+            response_cache.enabled = True
+            for name, backend in backends.items():
+                response_cache.backend = backend
+                etag = (await client.get(url)).headers["etag"]
+                stats = await measure(lambda: client.get(url), iterations=iterations)
+                rows.append({"endpoint": url, "mode": name, **stats})
+            stats = await measure(lambda: client.get(url, headers={"If-None-Match": etag}), iterations=iterations)
+            rows.append({"endpoint": url, "mode": "304 (sqlite)", **stats})
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
+    print_table(
+        f"Sondeo de endpoints de métricas ({n_clients} clientes)",
+        rows, ["endpoint", "mode", "p50_ms", "p99_ms", "mean_ms", "iterations"]
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, default=100_000, help="Número de clientes a generar")
+    p.add_argument("--iterations", type=int, default=300, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.clients, args.iterations))
@@ -0,0 +1,97 @@
+"""
+Benchmark de la obtención de sesiones por petición (get_db).
+
+Compara, para /api/v1/metrics/summary y /api/v1/clients/priority-list
+(primera página), el costo por petición de abrir la sesión, ejecutar la
+consulta del endpoint y cerrarla:
+
+- before: la versión anterior de get_db, con tres verificaciones de la
+  conexión (``pool_pre_ping``, un ``SELECT 1`` en el evento ``engine_connect``
+  y ``SELECT 1`` en get_db antes de entregar la sesión);
+- after: ``open_session``, donde ``pool_pre_ping`` es la única verificación.
+
+Con el servidor en localhost cada round trip cuesta décimas de ms; contra una
+base remota cada ping extra suma un RTT completo por petición.
+
+Uso:
+    python -m benchmarks.bench_session_acquisition
+    python -m benchmarks.bench_session_acquisition --clients 100000 --iterations 500
+"""
+import argparse
+
+from sqlalchemy import event, select
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    measure, print_table, run, logger,
+)
+from app.api import build_metrics_summary, fetch_priority_page_after
+from app.database import open_session
+
+
+def legacy_engine():
+    """Engine con el ping del evento engine_connect de la versión anterior"""
+    engine = create_bench_engine(pool_pre_ping=True)
+
+    @event.listens_for(engine.sync_engine, "engine_connect")
+    def ping_connection(connection):
+        connection.exec_driver_sql("SELECT 1")
+
+    return engine
+
+
+async def legacy_request(Session, handler):
+    db = Session()
+    try:
+        await db.execute(select(1))
+        return await handler(db)
+    finally:
+        await db.close()
+
+
+async def current_request(Session, handler):
+    db = await open_session(session_factory=Session)
+    try:
+        return await handler(db)
+    finally:
+        await db.close()
+
+
+ENDPOINTS = {
+    "/api/v1/metrics/summary": build_metrics_summary,
+    "/api/v1/clients/priority-list": lambda db: fetch_priority_page_after(db, None, 10),
+}
+
+
+async def main(n_clients, iterations):
+    setup = create_bench_engine()
+    await reset_schema(setup)
+    logger.info(f"Generando {n_clients} clientes sintéticos...")
+    await seed_clients(setup, n_clients)
+    await setup.dispose()
+
+    engines = {
+        "before": (legacy_engine(), legacy_request),
+        "after": (create_bench_engine(pool_pre_ping=True), current_request),
+    }
+    rows = []
+    for endpoint, handler in ENDPOINTS.items():
+        for mode, (engine, request) in engines.items():
+            Session = bench_session_factory(engine)
+            stats = await measure(lambda: request(Session, handler), iterations=iterations, warmup=20)
+            rows.append({"endpoint": endpoint, "mode": mode, **stats})
+
+    for engine, _ in engines.values():
+        await engine.dispose()
+    print_table(
+        f"Sesión + consulta por petición ({n_clients} clientes)",
+        rows, ["endpoint", "mode", "p50_ms", "p99_ms", "mean_ms", "iterations"]
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, default=100_000, help="Número de clientes a generar")
+    p.add_argument("--iterations", type=int, default=500, help="Mediciones por configuración")
+    args = p.parse_args()
+    run(main(args.clients, args.iterations))
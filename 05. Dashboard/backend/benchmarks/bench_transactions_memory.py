@@ -0,0 +1,109 @@
+"""
+Benchmark de memoria de la ingesta de transactions.csv.
+
+Compara la carga completa del CSV (como ``read_with_dtypes`` en
+generate_features) con la lectura en streaming por chunks de
+``app.features.transaction_aggregates``. Para cada modo reporta el pico de
+memoria registrado por tracemalloc y el incremento del pico de RSS del proceso
+sobre el consumo base tras los imports; cada medición se ejecuta en un proceso
+nuevo para que los picos no se contaminen entre sí.
+
+No usa base de datos: genera un CSV sintético en un directorio temporal.
+
+Uso:
+    python -m benchmarks.bench_transactions_memory
+    python -m benchmarks.bench_transactions_memory --rows 5000000 --chunk-sizes 50000 250000 1000000
+"""
+import time
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table, logger
+from app.features.transaction_aggregates import TransactionAggregates, aggregate_transactions_csv
+
+CATEGORIES = ["entertainment", "food", "shopping", "transport", "travel", "health", "utilities", "education"]
+
+
+def write_synthetic_csv(path: Path, n_rows: int, n_users: int, block: int = 500_000):
+    """Escribe un transactions.csv sintético con el mismo esquema que data/raw"""
+    rng = np.random.default_rng(42)
+    start = pd.Timestamp("2023-01-01").value // 10**9
+    for offset in range(0, n_rows, block):
+        n = min(block, n_rows - offset)
+        users = rng.integers(1, n_users + 1, size=n)
+        seconds = start + rng.integers(0, 365 * 86400, size=n)
+        pd.DataFrame({
+            "transaction_id": [f"tx-{i:012d}" for i in range(offset, offset + n)],
+            "user_id": [f"user_{u}" for u in users],
+            "date": pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d"),
+            "amount": rng.gamma(2.0, 40.0, size=n).round(2),
+            "merchant_category": np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), size=n)],
+            "description": "compra con tarjeta en comercio asociado",
+        }).to_csv(path, mode="a", header=offset == 0, index=False)
+
+
+def _load_full(path: Path):
+    """Camino anterior: todo el CSV en memoria y luego agregación"""
+    transactions = pd.read_csv(path, dtype={"merchant_category": "category"}, parse_dates=["date"])
+    return TransactionAggregates.from_transactions(transactions)
+
+
+def _measure(path: str, chunksize):
+    """Ejecuta una ingesta y devuelve (segundos, pico tracemalloc, incremento de RSS) en MB"""
+    # ru_maxrss está en KB en Linux
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    if chunksize is None:
+        aggs = _load_full(Path(path))
+    else:
+        aggs = aggregate_transactions_csv(path, chunksize=chunksize)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss) / 1024
+    return elapsed, peak / 2**20, rss, len(aggs.users)
+
+
+def main(n_rows: int, n_users: int, chunk_sizes):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "transactions.csv"
+        logger.info(f"Generando CSV sintético: {n_rows} transacciones, {n_users} usuarios...")
+        write_synthetic_csv(path, n_rows, n_users)
+        size_mb = path.stat().st_size / 2**20
+
+        rows = []
+        for chunksize in [None] + list(chunk_sizes):
+            with ctx.Pool(1) as pool:
+                elapsed, peak, rss, users = pool.apply(_measure, (str(path), chunksize))
+            rows.append({
+                "mode": "full read" if chunksize is None else f"stream chunk={chunksize}",
+                "file_mb": size_mb,
+                "users": users,
+                "seconds": elapsed,
+                "tracemalloc_peak_mb": peak,
+                "peak_rss_delta_mb": rss,
+            })
+
+    print_table(
+        "Ingesta de transactions.csv: memoria pico",
+        rows,
+        ["mode", "file_mb", "users", "seconds", "tracemalloc_peak_mb", "peak_rss_delta_mb"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=2_000_000, help="Transacciones en el CSV sintético")
+    p.add_argument("--users", type=int, default=50_000, help="Usuarios distintos")
+    p.add_argument("--chunk-sizes", type=int, nargs="+", default=[50_000, 250_000, 1_000_000])
+    args = p.parse_args()
+    main(args.rows, args.users, args.chunk_sizes)
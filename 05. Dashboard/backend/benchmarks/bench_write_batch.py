@@ -0,0 +1,108 @@
+"""
+Benchmark de escritura de predicciones (ml_service.write_batch).
+
+Compara el camino anterior (SELECT + UPDATE/INSERT por usuario) con el
+upsert en bloque ``INSERT ... ON CONFLICT (user_id) DO UPDATE`` para varios
+tamaños de chunk, reportando filas/segundo. Se mide solo la escritura, sin
+generación de features ni inferencia.
+
+Uso:
+    python -m benchmarks.bench_write_batch
+    python -m benchmarks.bench_write_batch --rows 200000 --chunk-sizes 1000 5000 20000
+"""
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, text
+
+from benchmarks.common import (
+    create_bench_engine, bench_session_factory, reset_schema, seed_clients,
+    print_table, run, logger,
+)
+from app.database import Prediction
+from app.ml_service import upsert_predictions
+
+
+def synthetic_predictions(n_rows: int) -> pd.DataFrame:
+    """Predicciones aleatorias para los usuarios generados por seed_clients"""
+    probability = np.random.rand(n_rows)
+    return pd.DataFrame({
+        "user_id": [f"user_{i}" for i in range(1, n_rows + 1)],
+        "probability": probability,
+        "is_target": probability >= 0.5,
+        "created_at": datetime.now(),
+    })
+
+
+async def legacy_write(session, predictions_df):
+    """Reproduce el camino anterior de write_batch: 2 round trips por usuario"""
+    for _, row in predictions_df.iterrows():
+        result = await session.execute(select(Prediction).where(Prediction.user_id == row["user_id"]))
+        existing = result.scalars().first()
+        data = {
+            "user_id": row["user_id"],
+            "probability": float(row["probability"]),
+            "is_target": bool(row["is_target"]),
+            "created_at": row["created_at"],
+        }
+        if existing:
+            await session.execute(update(Prediction).where(Prediction.user_id == row["user_id"]).values(data))
+        else:
+            session.add(Prediction(**data))
+
+
+async def timed(Session, engine, label, write, predictions_df, rows, prefill: bool):
+    """Mide una escritura completa (incluido el commit) sobre una tabla vacía o precargada"""
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE prediction_results RESTART IDENTITY"))
+    if prefill:
+        async with Session() as session:
+            await upsert_predictions(session, predictions_df)
+            await session.commit()
+
+    async with Session() as session:
+        start = time.perf_counter()
+        await write(session, predictions_df)
+        await session.commit()
+        elapsed = time.perf_counter() - start
+
+    rows.append({
+        "mode": label,
+        "table": "update" if prefill else "insert",
+        "rows": len(predictions_df),
+        "seconds": elapsed,
+        "rows_per_sec": len(predictions_df) / elapsed,
+    })
+
+
+async def main(n_rows, legacy_rows, chunk_sizes):
+    engine = create_bench_engine()
+    Session = bench_session_factory(engine)
+    await reset_schema(engine)
+    logger.info(f"Generando {n_rows} clientes sintéticos...")
+    await seed_clients(engine, n_rows)
+
+    predictions_df = synthetic_predictions(n_rows)
+    rows = []
+    for prefill in (False, True):
+        legacy_df = predictions_df.head(legacy_rows)
+        await timed(Session, engine, "per-row", legacy_write, legacy_df, rows, prefill)
+        for chunk_size in chunk_sizes:
+            write = lambda session, df, cs=chunk_size: upsert_predictions(session, df, cs)
+            await timed(Session, engine, f"bulk chunk={chunk_size}", write, predictions_df, rows, prefill)
+
+    await engine.dispose()
+    print_table("write_batch: escritura de predicciones", rows, ["mode", "table", "rows", "seconds", "rows_per_sec"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=100_000, help="Predicciones por batch")
+    p.add_argument("--legacy-rows", type=int, default=5_000,
+                   help="Filas para el camino por fila (es lento; se extrapola por filas/segundo)")
+    p.add_argument("--chunk-sizes", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    args = p.parse_args()
+    run(main(args.rows, args.legacy_rows, args.chunk_sizes))
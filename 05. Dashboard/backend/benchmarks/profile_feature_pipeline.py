@@ -0,0 +1,94 @@
+"""
+Perfil por etapas de generate_features.
+
+Genera demographics, products y transactions sintéticos y ejecuta el pipeline
+completo varias veces, reportando los segundos de cada etapa
+(``generate_features(stage_timings=...)``): carga, demographics, products,
+transactions, dataset_final y transform. Con ``--cprofile`` imprime además las
+funciones más costosas de la última corrida.
+
+No usa base de datos.
+
+Uso:
+    python -m benchmarks.profile_feature_pipeline
+    python -m benchmarks.profile_feature_pipeline --transactions 1000000 --users 100000 --repeat 3 --cprofile
+"""
+import time
+import pstats
+import argparse
+import cProfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import print_table, logger
+from app.features import generate_features
+
+CATEGORIES = np.array(["entertainment", "food", "shopping", "transport", "travel", "health", "utilities", "education"])
+PRODUCT_TYPES = ["checking_account", "savings_account", "credit_card", "insurance", "investment_account"]
+STAGES = ["carga", "demographics", "products", "transactions", "dataset_final", "transform"]
+
+
+def synthetic_inputs(n_transactions: int, n_users: int, seed: int = 42, categories=CATEGORIES):
+    """demographics, products (1-2 por cliente) y transacciones aleatorias"""
+    categories = np.asarray(categories)
+    rng = np.random.default_rng(seed)
+    user_ids = np.char.add("user_", np.arange(1, n_users + 1).astype(str)).astype(object)
+    demographics = pd.DataFrame({
+        "user_id": user_ids,
+        "age": rng.integers(18, 71, size=n_users),
+        "income_range": rng.choice(["30k-50k", "50k-100k", "100k-150k", "150k+"], size=n_users),
+        "risk_profile": rng.choice(["conservative", "moderate", "aggressive"], size=n_users),
+        "occupation": rng.choice([f"occupation_{i}" for i in range(50)], size=n_users),
+    })
+    product_owners = np.repeat(user_ids, rng.integers(1, 3, size=n_users))
+    products = pd.DataFrame({
+        "user_id": product_owners,
+        "product_type": rng.choice(PRODUCT_TYPES, size=len(product_owners)),
+        "contract_date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1400, size=len(product_owners)), unit="D"),
+    })
+    transactions = pd.DataFrame({
+        "transaction_id": np.char.add("tx-", np.arange(n_transactions).astype(str)).astype(object),
+        "user_id": user_ids[rng.integers(0, n_users, size=n_transactions)],
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, size=n_transactions), unit="D"),
+        "amount": rng.gamma(2.0, 40.0, size=n_transactions).round(2),
+        "merchant_category": categories[rng.integers(0, len(categories), size=n_transactions)].astype(object),
+    })
+    return demographics, products, transactions
+
+
+def main(n_transactions: int, n_users: int, repeat: int, profile: bool):
+    logger.info(f"Generando {n_transactions} transacciones de {n_users} clientes...")
+    demographics, products, transactions = synthetic_inputs(n_transactions, n_users)
+
+    rows = []
+    profiler = None
+    for i in range(repeat):
+        timings = {}
+        if profile and i == repeat - 1:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        generate_features(demographics, products, transactions, stage_timings=timings)
+        total = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        rows.append({"run": i + 1, **timings, "total": total})
+
+    print_table(
+        f"generate_features por etapa (segundos): {n_transactions} transacciones, {n_users} clientes",
+        rows,
+        ["run"] + STAGES + ["total"],
+    )
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--transactions", type=int, default=1_000_000)
+    p.add_argument("--users", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--cprofile", action="store_true", help="Perfil cProfile de la última corrida")
+    args = p.parse_args()
+    main(args.transactions, args.users, args.repeat, args.cprofile)
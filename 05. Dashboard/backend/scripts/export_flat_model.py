@@ -0,0 +1,48 @@
+"""
+Exporta un modelo XGBoost al evaluador plano de NumPy (app.flat_tree_predictor).
+
+Compila los árboles del modelo entrenado (por defecto el de 03.Modelo/models)
+a arreglos de nodos, verifica que las probabilidades coinciden con
+``predict_proba`` y guarda ``xgb_model.flat.npz`` junto al modelo.
+``publish_model`` copia el archivo a la versión del registro si existe; la
+API lo usa con ``INFERENCE_BACKEND=flat``.
+
+Ejemplos:
+    python -m scripts.export_flat_model
+    python -m scripts.export_flat_model --model xgb_model.pkl
+"""
+import sys
+import pickle
+import argparse
+import logging
+from pathlib import Path
+
+# Asegura que 'backend' esté en sys.path
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.flat_tree_predictor import FLAT_MODEL_FILE, FlatTreePredictor  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_MODEL = ROOT.parent.parent / "03.Modelo" / "models" / "xgb_model.pkl"
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", type=Path, default=DEFAULT_MODEL)
+    p.add_argument("--output", type=Path, default=None, help=f"Por defecto {FLAT_MODEL_FILE} junto al modelo")
+    p.add_argument("--verify-rows", type=int, default=10_000, help="Filas aleatorias de la verificación")
+    args = p.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    predictor = FlatTreePredictor.from_model(model)
+    diff = predictor.verify(model, n_rows=args.verify_rows)
+
+    output = args.output or args.model.with_name(FLAT_MODEL_FILE)
+    predictor.save(output)
+    logging.info(
+        f"{predictor.n_trees} árboles de profundidad {predictor.max_depth} exportados a {output} "
+        f"(diferencia máxima con predict_proba: {diff:.2e})"
+    )
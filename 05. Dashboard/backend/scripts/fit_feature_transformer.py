@@ -0,0 +1,54 @@
+"""
+Ajusta el FeatureTransformer (escalado + codificación de etiquetas) sobre los
+datos de entrenamiento y lo guarda junto a los modelos.
+
+El transformador se ajusta una sola vez; ml_service.predict y seed_data lo
+cargan y solo aplican transform, de modo que las features de un cliente no
+dependen del batch con el que se puntúa.
+
+Ejemplos:
+    python -m scripts.fit_feature_transformer
+    python -m scripts.fit_feature_transformer --data-dir ../../03.Modelo/data/raw
+"""
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Asegura que 'backend' esté en sys.path
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+
+from app.features import generate_features, FeatureTransformer
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DATA_DIR = ROOT / "data" / "raw"
+# Junto a xgb_model.pkl: raíz del backend (ml_service) y models/ (seed_data)
+OUTPUT_PATHS = [ROOT / "feature_transformer.json", ROOT / "models" / "feature_transformer.json"]
+
+
+def fit_feature_transformer(data_dir: Path, reference_date=pd.Timestamp("2024-01-01")) -> FeatureTransformer:
+    """Genera las features sin transformar del set de entrenamiento y ajusta el transformador"""
+    raw = generate_features(data_raw_path=data_dir, reference_date=reference_date, raw=True)
+    logging.info(f"Ajustando FeatureTransformer con {len(raw)} clientes de {data_dir}")
+    return FeatureTransformer().fit(raw)
+
+
+def main(data_dir: Path, outputs):
+    transformer = fit_feature_transformer(data_dir)
+    for path in outputs:
+        transformer.save(path)
+        logging.info(f"FeatureTransformer guardado en: {path}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--data-dir", type=Path, default=DATA_DIR,
+                   help="Directorio con demographics.csv, products.csv y transactions.csv de entrenamiento")
+    p.add_argument("--output", type=Path, action="append",
+                   help="Ruta de salida (repetible); por defecto junto a cada xgb_model.pkl")
+    args = p.parse_args()
+    main(args.data_dir, args.output or OUTPUT_PATHS)
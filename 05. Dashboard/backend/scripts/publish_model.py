@@ -0,0 +1,51 @@
+"""
+Publica una versión nueva del modelo en el registro (models/registry).
+
+Copia el modelo, el umbral y el FeatureTransformer a ``<registro>/<versión>/``,
+guarda el esquema de features y valida que la versión carga y predice antes
+de hacerla visible. Con ``--activate`` reescribe CURRENT: los workers en
+ejecución la adoptan en la siguiente revisión (MODEL_WATCH_INTERVAL) sin
+reiniciar. También se puede activar con POST /api/v1/admin/model/reload.
+
+Ejemplos:
+    python -m scripts.publish_model v1 --activate
+    python -m scripts.publish_model v2 --model nuevo/xgb_model.pkl --threshold 0.42 --activate
+"""
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Asegura que 'backend' esté en sys.path
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.model_registry import MODEL_REGISTRY_DIR, publish_version, load_bundle
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("version", help="Nombre de la versión (directorio dentro del registro)")
+    p.add_argument("--model", type=Path, default=ROOT / "xgb_model.pkl")
+    p.add_argument("--threshold", type=float, default=None, help="Umbral; por defecto se lee --threshold-file")
+    p.add_argument("--threshold-file", type=Path, default=ROOT / "models" / "xgb_threshold.txt")
+    p.add_argument("--transformer", type=Path, default=ROOT / "feature_transformer.json")
+    p.add_argument("--registry", type=Path, default=MODEL_REGISTRY_DIR)
+    p.add_argument("--activate", action="store_true", help="Reescribir CURRENT con esta versión")
+    args = p.parse_args()
+
+    version_dir = publish_version(
+        args.registry,
+        args.version,
+        args.model,
+        threshold=args.threshold,
+        threshold_path=args.threshold_file if args.threshold_file.is_file() else None,
+        transformer_path=args.transformer,
+        activate=args.activate,
+    )
+    bundle = load_bundle(version_dir)
+    logging.info(f"Versión {args.version} publicada en {version_dir}: {bundle.info()}")
+    if args.activate:
+        logging.info("CURRENT actualizado; los workers cambiarán de versión en la próxima revisión")
@@ -4,9 +4,22 @@ Seed definitivo:
   • Opción 2: --from-api descarga CSV desde Mockoon (localhost:3002)
   • Inserta/actualiza Demographic, Product, Transaction
   • Actualiza las tablas utilizando SQLAlchemy sincrónico
+  • --bulk: carga cada tabla con COPY FROM STDIN a una tabla staging y un
+    único upsert por tabla (el modo por fila queda como compatibilidad);
+    antes crea uq_prediction_results_user_id con scripts.migrate_indexes si
+    falta, o se detiene si hay user_id duplicados
+  • Reconstruye el estado de features por usuario (app.feature_store) a
+    partir de las transacciones cargadas
+  • Al terminar publica una época nueva de la caché de features
+    (app.feature_cache): los workers de la API la vacían
+  • --stream: lee transactions.csv por chunks de --chunk-rows filas; cada
+    chunk se carga y se reduce a agregados por usuario sin mantener el
+    archivo completo en memoria
 Ejemplos:
     python -m scripts.seed_data              # CSV locales
     python -m scripts.seed_data --from-api   # Mockoon
+    python -m scripts.seed_data --bulk       # COPY + merge set-based
+    python -m scripts.seed_data --bulk --stream --chunk-rows 500000
 
 IMPORTANTE: Antes de ejecutar este script, generar el modelo dummy:
     python backend/models/create_dummy_model.py
@@ -19,7 +32,8 @@ from pathlib import Path
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
 
-import argparse, logging, os, pandas as pd, requests, re
+import argparse, logging, os, pandas as pd, requests, re, time
+import numpy as np
 from io import StringIO
 from datetime import datetime, date
 import sqlalchemy
@@ -27,6 +41,13 @@ from sqlalchemy import create_engine, inspect, Table, MetaData, insert, select,
 from sqlalchemy.orm import sessionmaker, Session
 from app.models import Base, Client, Prediction, Contact, Product, Transaction, Goal
 from app.features.pipeline_featureengineering_func import generate_features
+from app.features.transaction_aggregates import TransactionAggregates, iter_transaction_chunks, aggregate_transaction_chunks
+from app.feature_store import replace_feature_state
+from app.features.feature_transformer import load_feature_transformer
+from app.feature_cache import bump_feature_cache_epoch
+from app.snapshot import invalidate_all_snapshots
+from app.response_cache import bump_data_version
+from scripts.migrate_indexes import DuplicateKeysError, migrate_indexes
 import pickle
 
 # Alias para mantener compatibilidad con scripts
@@ -64,6 +85,18 @@ def csv_api(endpoint: str) -> pd.DataFrame:
     r.raise_for_status()
     return pd.read_csv(StringIO(r.text))
 
+def transaction_chunks(from_api: bool, chunk_rows: int):
+    """Itera transactions.csv por chunks (archivo local o respuesta HTTP en streaming)"""
+    if from_api:
+        r = requests.get(f"{BASE_URL}/transactions", stream=True)
+        r.raise_for_status()
+        r.raw.decode_content = True
+        return iter_transaction_chunks(r.raw, chunk_rows)
+    f = DATA_DIR / "transactions.csv"
+    if not f.exists():
+        raise FileNotFoundError(f"CSV no hallado: {f}")
+    return iter_transaction_chunks(f, chunk_rows)
+
 def parse_income(income_str):
     """
     Parsea diferentes formatos de ingresos a un valor numérico
@@ -155,11 +188,11 @@ def seed_products(conn, df):
         else:
             conn.execute(products_table.insert().values(data))
 
-def seed_transactions(conn, df):
+def seed_transactions(conn, df, start_id: int = 1):
     """Inserta transacciones mapeadas correctamente según la estructura real de la tabla"""
     for idx, r in enumerate(df.itertuples()):
         # Usar un ID numérico secuencial en lugar del UUID
-        tx_id = idx + 1
+        tx_id = start_id + idx
         user_id = r.user_id
         
         # Datos para insertar/actualizar basados en la estructura real de la tabla
@@ -187,12 +220,16 @@ def seed_transactions(conn, df):
             # Permitir que la secuencia genere el ID automáticamente
             conn.execute(transactions_table.insert().values(data))
 
-def add_predictions(conn, demog, prod, tx):
-    # 1. Generar features reales
+def score_predictions(demog, prod, tx, tx_aggregates=None) -> pd.DataFrame:
+    """Genera features reales y predice con el modelo guardado en models/"""
+    # 1. Generar features reales (desde agregados si las transacciones se leyeron en
+    #    streaming; escaladas con el FeatureTransformer de models/ si existe)
     feats = generate_features(
         demographics_df=demog,
         products_df=prod,
         transactions_df=tx,
+        transaction_aggregates=tx_aggregates,
+        transformer=load_feature_transformer(ROOT / "models" / "feature_transformer.json"),
         reference_date=pd.Timestamp("2024-01-01"),
         output_file=None
     )
@@ -212,10 +249,26 @@ def add_predictions(conn, demog, prod, tx):
     
     proba = model.predict_proba(X)[:,1]
     pred_bin = (proba >= threshold).astype(int)
-    
-    # 4. Insertar o actualizar predicciones
-    for uid, p, b in zip(feats["user_id"], proba, pred_bin):
-        uid_str = str(uid)  # casteo a texto para evitar mismatch de tipos
+    return pd.DataFrame({
+        "user_id": feats["user_id"].astype(str),  # casteo a texto para evitar mismatch de tipos
+        "probability": proba.astype(float),
+        "is_target": pred_bin.astype(bool),
+        "created_at": datetime.now()
+    })
+
+def random_predictions(demog) -> pd.DataFrame:
+    """Predicciones aleatorias usadas como fallback si falla el pipeline ML"""
+    probability = np.random.uniform(0.1, 0.9, size=len(demog))
+    return pd.DataFrame({
+        "user_id": demog["user_id"].astype(str),
+        "probability": probability,
+        "is_target": probability > 0.5,
+        "created_at": datetime.now()
+    })
+
+def seed_predictions(conn, preds):
+    """Inserta o actualiza predicciones fila por fila (modo compatible)"""
+    for uid_str, p, b, created_at in zip(preds["user_id"], preds["probability"], preds["is_target"], preds["created_at"]):
         exists = conn.execute(
             select(prediction_results_table.c.user_id)
             .where(prediction_results_table.c.user_id == uid_str)
@@ -224,7 +277,7 @@ def add_predictions(conn, demog, prod, tx):
           "user_id": uid_str,
           "probability": float(p),
           "is_target": bool(b),
-          "created_at": datetime.now()
+          "created_at": created_at
         }
         if exists:
             conn.execute(
@@ -235,74 +288,254 @@ def add_predictions(conn, demog, prod, tx):
         else:
             conn.execute(prediction_results_table.insert().values(row))
 
-def main(from_api: bool):
+def add_predictions(conn, demog, prod, tx):
+    seed_predictions(conn, score_predictions(demog, prod, tx))
+
+# ----------------------------------------------------------------------
+# Modo --bulk: COPY FROM STDIN a staging + un upsert set-based por tabla
+# ----------------------------------------------------------------------
+COPY_CHUNK_ROWS = 100_000
+
+def demographics_rows(df) -> pd.DataFrame:
+    """Mismo mapeo que seed_demographics, vectorizado"""
+    return pd.DataFrame({
+        'user_id': df['user_id'],
+        'age': df['age'],
+        'income_range': df['income_range'],
+        'risk_profile': df['risk_profile'],
+        'occupation': df['occupation'] if 'occupation' in df.columns else 'Professional',
+        'profile_category': 'standard',
+        'segment': 'potential',
+        'acquisition_date': date.today(),
+        'last_contact_date': None,
+        'status': 'pending',
+        'priority': 'medium',
+        'probability': 0.5
+    })
+
+def products_rows(df) -> pd.DataFrame:
+    """Mismo mapeo que seed_products; el id es la posición en el CSV + 1"""
+    now = datetime.now()
+    return pd.DataFrame({
+        'id': np.arange(1, len(df) + 1),
+        'user_id': df['user_id'].values,
+        'product_type': df['product_type'].values,
+        'contract_date': pd.to_datetime(df['contract_date']).values if 'contract_date' in df.columns else date.today(),
+        'status': 'active',
+        'product_value': 1000.0,
+        'created_at': now,
+        'updated_at': now
+    })
+
+def transactions_rows(df, start_id: int = 1) -> pd.DataFrame:
+    """Mismo mapeo que seed_transactions; el id es la posición en el CSV + 1"""
+    now = datetime.now()
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + len(df)),
+        'user_id': df['user_id'].values,
+        'transaction_date': pd.to_datetime(df['date']).dt.date.values if 'date' in df.columns else date.today(),
+        'amount': df['amount'].values,
+        'transaction_type': 'payment',
+        'created_at': now,
+        'updated_at': now
+    })
+
+def bulk_merge(conn, table: Table, rows: pd.DataFrame, key: str, chunk_rows: int = COPY_CHUNK_ROWS) -> int:
+    """
+    Carga ``rows`` en ``table`` con COPY FROM STDIN y un único upsert.
+
+    Las filas se transmiten por chunks a una tabla temporal sin restricciones
+    y luego se fusionan con INSERT ... SELECT ... ON CONFLICT (key) DO UPDATE,
+    todo dentro de la transacción de ``conn``. Si ``key`` se repite gana la
+    última fila, como en el upsert fila a fila.
+    """
+    cols = list(rows.columns)
+    col_list = ", ".join(cols)
+    staging = f"stg_{table.name}"
+    dbapi_conn = conn.connection.dbapi_connection
+
+    with dbapi_conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        cur.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {col_list} FROM {table.name} WITH NO DATA")
+        # Posición de cada fila en la carga: COPY la numera en orden
+        cur.execute(f"ALTER TABLE {staging} ADD COLUMN stg_row BIGSERIAL")
+        for start in range(0, len(rows), chunk_rows):
+            buf = StringIO()
+            rows.iloc[start:start + chunk_rows].to_csv(buf, index=False, header=False, na_rep="")
+            buf.seek(0)
+            cur.copy_expert(f"COPY {staging} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf)
+
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols if c != key)
+        cur.execute(f"""
+            INSERT INTO {table.name} ({col_list})
+            SELECT DISTINCT ON ({key}) {col_list} FROM {staging} ORDER BY {key}, stg_row DESC
+            ON CONFLICT ({key}) DO UPDATE SET {updates}
+        """)
+        merged = cur.rowcount
+
+        # Los ids explícitos no avanzan la secuencia: alinearla para inserts posteriores
+        if key == "id":
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"GREATEST((SELECT MAX(id) FROM {table.name}), 1))"
+            )
+    return merged
+
+def load_transaction_chunks(conn, chunks, bulk: bool, chunk_rows: int):
+    """
+    Carga las transacciones chunk a chunk y acumula sus agregados por usuario.
+
+    Returns:
+        tuple: (TransactionAggregates, filas cargadas)
+    """
+    loaded = 0
+
+    def loaded_chunks():
+        nonlocal loaded
+        for chunk in chunks:
+            if bulk:
+                bulk_merge(conn, transactions_table, transactions_rows(chunk, start_id=loaded + 1), "id", chunk_rows)
+            else:
+                seed_transactions(conn, chunk, start_id=loaded + 1)
+            loaded += len(chunk)
+            logging.info(f"transactions: {loaded} filas cargadas")
+            yield chunk
+
+    return aggregate_transaction_chunks(loaded_chunks()), loaded
+
+def timed_load(name: str, load, n_rows, stats: list):
+    """
+    Ejecuta una carga y registra filas/segundo.
+
+    Si ``n_rows`` es None se usa el número de filas devuelto por ``load``.
+    """
+    start = time.perf_counter()
+    loaded = load()
+    if n_rows is None:
+        n_rows = loaded
+    elapsed = time.perf_counter() - start
+    rate = n_rows / elapsed if elapsed > 0 else float("inf")
+    stats.append((name, n_rows, elapsed, rate))
+    logging.info(f"{name}: {n_rows} filas en {elapsed:.2f}s ({rate:,.0f} filas/s)")
+
+def require_prediction_index():
+    """
+    El merge de prediction_results usa ON CONFLICT (user_id), que necesita
+    uq_prediction_results_user_id. Se crea con la migración (CONCURRENTLY) si
+    falta; con user_id duplicados se detiene antes de cargar nada.
+    """
+    try:
+        created = migrate_indexes(engine, only=["uq_prediction_results_user_id"])
+    except DuplicateKeysError as e:
+        raise SystemExit(f"No se puede usar --bulk: {e}")
+    if created:
+        logging.info(f"Índice creado antes de la carga: {', '.join(created)}")
+
+def main(from_api: bool, bulk: bool = False, chunk_rows: int = COPY_CHUNK_ROWS, stream: bool = False):
+    if bulk:
+        require_prediction_index()
+    tx = None
     if from_api:
         logging.info("Obteniendo datos desde Mockoon API...")
         demog = csv_api("/demographics")
         prod  = csv_api("/products")
-        tx    = csv_api("/transactions")
+        if not stream:
+            tx = csv_api("/transactions")
     else:
         logging.info("Leyendo datos desde archivos CSV locales...")
         demog = csv_local("demographics.csv")
         prod  = csv_local("products.csv")
-        tx    = csv_local("transactions.csv")
+        if not stream:
+            tx = csv_local("transactions.csv")
     
-    logging.info(f"Procesando {len(demog)} demographic records, {len(prod)} products, {len(tx)} transactions")
+    n_tx = f"chunks de {chunk_rows}" if stream else len(tx)
+    logging.info(f"Procesando {len(demog)} demographic records, {len(prod)} products, transactions: {n_tx}")
+    logging.info(f"Modo de carga: {'bulk (COPY + merge)' if bulk else 'por fila (compatibilidad)'}")
+    stats = []
+    tx_aggregates = None
 
     # Usar la conexión directa para todas las operaciones
     with engine.connect() as conn:
         # conn.execution_options(isolation_level="AUTOCOMMIT")  # Comentado según instrucciones
         
         logging.info("Insertando demographics...")
-        seed_demographics(conn, demog)
+        if bulk:
+            timed_load("demographics", lambda: bulk_merge(conn, demographics_table, demographics_rows(demog), "user_id", chunk_rows), len(demog), stats)
+        else:
+            timed_load("demographics", lambda: seed_demographics(conn, demog), len(demog), stats)
         
         logging.info("Insertando products...")
-        seed_products(conn, prod)
+        if bulk:
+            timed_load("products", lambda: bulk_merge(conn, products_table, products_rows(prod), "id", chunk_rows), len(prod), stats)
+        else:
+            timed_load("products", lambda: seed_products(conn, prod), len(prod), stats)
         
         logging.info("Insertando transactions...")
-        seed_transactions(conn, tx)
+        if stream:
+            def load_stream():
+                nonlocal tx_aggregates
+                tx_aggregates, loaded = load_transaction_chunks(conn, transaction_chunks(from_api, chunk_rows), bulk, chunk_rows)
+                return loaded
+            timed_load("transactions", load_stream, None, stats)
+        elif bulk:
+            timed_load("transactions", lambda: bulk_merge(conn, transactions_table, transactions_rows(tx), "id", chunk_rows), len(tx), stats)
+        else:
+            timed_load("transactions", lambda: seed_transactions(conn, tx), len(tx), stats)
         
+        # ---------- Estado de features por usuario ----------
+        logging.info("Reconstruyendo el estado de features por usuario...")
+        try:
+            if tx_aggregates is None:
+                tx_aggregates = TransactionAggregates.from_transactions(tx)
+            # Savepoint: un fallo aquí no debe abortar la carga ya realizada
+            with conn.begin_nested():
+                timed_load("feature_state", lambda: replace_feature_state(conn, tx_aggregates), len(tx_aggregates), stats)
+        except Exception as e:
+            logging.error(f"No se pudo reconstruir el estado de features: {e}")
+
         # ---------- Predicción ----------
         logging.info("Generando predicciones con el pipeline ML real...")
         try:
-            add_predictions(conn, demog, prod, tx)
+            preds = score_predictions(demog, prod, tx, tx_aggregates)
         except Exception as e:
             logging.error(f"Error al generar predicciones: {e}")
             
             # En caso de error, generar predicciones aleatorias como fallback
             logging.info("Generando predicciones aleatorias como fallback...")
-            import random
-            for r in demog.itertuples():
-                user_id = r.user_id
-                uid_str = str(user_id)
-                probability = random.uniform(0.1, 0.9)
-                is_target = probability > 0.5
-                exists = conn.execute(
-                    select(prediction_results_table.c.user_id)
-                    .where(prediction_results_table.c.user_id == uid_str)
-                ).scalar_one_or_none()
-                row = {
-                    "user_id": uid_str,
-                    "probability": probability,
-                    "is_target": is_target,
-                    "created_at": datetime.now()
-                }
-                if exists:
-                    conn.execute(
-                        prediction_results_table.update()
-                        .where(prediction_results_table.c.user_id == uid_str)
-                        .values(row)
-                    )
-                else:
-                    conn.execute(prediction_results_table.insert().values(row))
+            preds = random_predictions(demog)
+        
+        if bulk:
+            timed_load("prediction_results", lambda: bulk_merge(conn, prediction_results_table, preds, "user_id", chunk_rows), len(preds), stats)
+        else:
+            timed_load("prediction_results", lambda: seed_predictions(conn, preds), len(preds), stats)
+        
+        # Los datos de origen cambiaron: snapshots de métricas y cubo del mapa
+        # de calor se recalculan en la próxima lectura
+        try:
+            with conn.begin_nested():
+                invalidate_all_snapshots(conn)
+        except Exception as e:
+            logging.error(f"No se pudieron invalidar los snapshots de métricas: {e}")
         
         conn.execute(text("COMMIT"))
         
+    # Los workers de la API vacían su caché de features en la próxima consulta
+    # y dejan de servir las respuestas de métricas guardadas
+    bump_feature_cache_epoch()
+    bump_data_version()
     logging.info("✓ Datos guardados en la base de datos")
+    for name, n_rows, elapsed, rate in stats:
+        logging.info(f"  {name:<20} {n_rows:>10} filas  {elapsed:>8.2f}s  {rate:>12,.0f} filas/s")
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--from-api", action="store_true",
                    help="Usar Mockoon en vez de CSV locales")
+    p.add_argument("--bulk", action="store_true",
+                   help="Cargar con COPY FROM STDIN + upsert set-based por tabla")
+    p.add_argument("--chunk-rows", type=int, default=COPY_CHUNK_ROWS,
+                   help="Filas por bloque de COPY en modo --bulk y por chunk en modo --stream")
+    p.add_argument("--stream", action="store_true",
+                   help="Leer transactions.csv por chunks en lugar de cargarlo completo")
     args = p.parse_args()
-    main(args.from_api)
\ No newline at end of file
+    main(args.from_api, args.bulk, args.chunk_rows, args.stream)
@@ -0,0 +1,88 @@
+"""
+Pruebas de la inferencia con el Booster nativo y el evaluador plano de XGBoost
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from app import model_registry
+from app.booster_predictor import booster_predictor
+from app.flat_tree_predictor import FlatTreePredictor, FLAT_MODEL_FILE
+from app.model_registry import load_bundle, MODEL_FILE
+
+
+def train_classifier(n_features=6, **params):
+    rng = np.random.default_rng(0)
+    columns = [f"f{i}" for i in range(n_features)]
+    X = pd.DataFrame(rng.normal(size=(200, n_features)), columns=columns)
+    y = (X["f0"] + rng.normal(scale=0.5, size=200) > 0).astype(int)
+    params = {"n_estimators": 20, "max_depth": 3, **params}
+    model = xgb.XGBClassifier(**params).fit(X, y)
+    return model, X
+
+
+def test_booster_matches_predict_proba():
+    """Mismas probabilidades que el wrapper, con columnas desordenadas y valores ausentes"""
+    model, X = train_classifier()
+    X.iloc[::5, 2] = np.nan
+    predictor = booster_predictor(model, list(model.feature_names_in_))
+    assert predictor is not None
+
+    expected = model.predict_proba(X)
+    shuffled = X[list(reversed(X.columns))]
+    np.testing.assert_allclose(predictor.predict_proba(shuffled), expected, rtol=0, atol=1e-7)
+    np.testing.assert_allclose(predictor.predict_proba(X.to_numpy()), expected, rtol=0, atol=1e-7)
+    assert predictor.matrix(X).dtype == np.float32 and predictor.matrix(X).flags["C_CONTIGUOUS"]
+
+
+def test_unsupported_models_keep_sklearn_path():
+    """Modelos multiclase, lineales o de regresión siguen usando predict_proba del wrapper"""
+    rng = np.random.default_rng(1)
+    multiclass = xgb.XGBClassifier(n_estimators=3).fit(rng.random((60, 3)), rng.integers(0, 3, size=60))
+    linear, _ = train_classifier(booster="gblinear")
+    assert booster_predictor(multiclass) is None
+    assert booster_predictor(linear) is None
+    regressor = xgb.XGBRegressor(n_estimators=3).fit(rng.random((60, 3)), rng.random(60))
+    assert booster_predictor(regressor) is None
+
+
+def test_loaded_bundle_scores_with_booster(tmp_path):
+    """Una versión del registro puntúa con el Booster y coincide con el modelo"""
+    model, X = train_classifier()
+    (tmp_path / MODEL_FILE).write_bytes(pickle.dumps(model))
+    bundle = load_bundle(tmp_path, "v1")
+
+    assert bundle.predictor is not None and bundle.info()["backend"] == "booster"
+    np.testing.assert_allclose(bundle.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-7)
+
+
+def test_flat_predictor_matches_predict_proba(tmp_path):
+    """El evaluador plano exportado reproduce predict_proba (árboles desbalanceados y ausentes)"""
+    model, X = train_classifier(max_depth=5, n_estimators=40)
+    X.iloc[::4, 0] = np.nan
+    exported = tmp_path / FLAT_MODEL_FILE
+    FlatTreePredictor.from_model(model).save(exported)
+    predictor = FlatTreePredictor.load(exported)
+
+    expected = model.predict_proba(X)
+    np.testing.assert_allclose(predictor.predict_proba(X), expected, rtol=0, atol=1e-6)
+    for i in range(5):
+        np.testing.assert_allclose(predictor.predict_proba(X.iloc[[i]].to_numpy()), expected[[i]], rtol=0, atol=1e-6)
+    assert predictor.verify(model) < 1e-6
+
+
+def test_registry_uses_exported_flat_model(tmp_path, monkeypatch):
+    """Con INFERENCE_BACKEND=flat la versión usa el archivo exportado y delega los lotes grandes"""
+    monkeypatch.setattr(model_registry, "INFERENCE_BACKEND", "flat")
+    model, X = train_classifier()
+    (tmp_path / MODEL_FILE).write_bytes(pickle.dumps(model))
+    FlatTreePredictor.from_model(model).save(tmp_path / FLAT_MODEL_FILE)
+    bundle = load_bundle(tmp_path, "v1")
+
+    assert bundle.info()["backend"] == "flat"
+    assert bundle.predictor.large_batch is not None
+    small, large = X.iloc[:bundle.predictor.max_rows], X
+    np.testing.assert_allclose(bundle.predict_proba(small), model.predict_proba(small), rtol=0, atol=1e-6)
+    np.testing.assert_allclose(bundle.predict_proba(large), model.predict_proba(large), rtol=0, atol=1e-6)
@@ -0,0 +1,68 @@
+"""
+Pruebas del tamaño del pool de conexiones y el modo PgBouncer
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.database import pool_settings, engine_options
+from app.observability import instrument_pool, render_metrics
+
+
+def test_pool_size_fits_the_connection_budget():
+    """Los pools de todos los workers no superan el presupuesto menos las reservadas"""
+    for workers in (1, 2, 4, 8):
+        for budget in (10, 20, 97):
+            settings = pool_settings(workers=workers, max_connections=budget, reserved=3)
+            per_worker = settings["pool_size"] + settings["max_overflow"]
+            assert settings["pool_size"] >= 1
+            assert workers * per_worker <= max(budget - 3, workers)
+    assert pool_settings(workers=4, max_connections=20, reserved=3) == {"pool_size": 3, "max_overflow": 1}
+    assert pool_settings(workers=4, pool_size=2, max_overflow=0) == {"pool_size": 2, "max_overflow": 0}
+
+
+def test_pgbouncer_mode_disables_prepared_statement_caches():
+    """Modo PgBouncer: sin cachés de sentencias preparadas y NullPool opcional"""
+    options = engine_options(pgbouncer=True, null_pool=True)
+    assert options["poolclass"] is NullPool and "pool_size" not in options
+    args = options["connect_args"]
+    assert args["statement_cache_size"] == 0 and args["prepared_statement_cache_size"] == 0
+    assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+
+    default = engine_options(pgbouncer=False, null_pool=False)
+    assert "statement_cache_size" not in default["connect_args"] and default["pool_size"] >= 1
+
+    # El gauge de uso del pool también funciona sin pool (NullPool)
+    engine = create_async_engine("postgresql+asyncpg://u:p@localhost/db", **options)
+    instrument_pool(engine)
+    assert 'prometeo_db_pool_connections{state="checked_out"} 0.0' in render_metrics().decode()
+
+
+
+def pool_gauges():
+    """Valores de prometeo_db_pool_connections por estado"""
+    prefix = 'prometeo_db_pool_connections{state="'
+    return {
+        line[len(prefix):].split('"')[0]: float(line.rsplit(" ", 1)[1])
+        for line in render_metrics().decode().splitlines() if line.startswith(prefix)
+    }
+
+
+def test_pool_gauges_follow_checkouts_and_overflow():
+    """Libres y overflow cuadran en cada checkin, también al cerrar una conexión de overflow"""
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=1)
+    instrument_pool(engine)
+
+    connections = [engine.connect() for _ in range(3)]
+    assert pool_gauges() == {"checked_out": 3, "idle": 0, "overflow": 1, "size": 2, "capacity": 3}
+    # La cola admite dos conexiones: la tercera que vuelve se cierra
+    for conn, (idle, overflow) in zip(connections, [(1, 1), (2, 1), (2, 0)]):
+        conn.close()
+        gauges = pool_gauges()
+        assert (gauges["idle"], gauges["overflow"]) == (idle, overflow)
+    assert pool_gauges()["checked_out"] == 0
+
+    conn = engine.connect()
+    assert pool_gauges()["idle"] == 1
+    conn.close()
+    engine.dispose()
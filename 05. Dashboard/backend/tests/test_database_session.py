@@ -0,0 +1,63 @@
+"""
+Pruebas de la obtención de sesiones de base de datos (get_db / open_session)
+"""
+import pytest
+from sqlalchemy.exc import ProgrammingError
+
+from app import database
+from app.database import open_session, get_db, is_connection_error
+
+
+class FakeSession:
+    """Sesión cuya conexión falla con los errores indicados, uno por intento"""
+    opened = []
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.closed = False
+        FakeSession.opened.append(self)
+
+    async def connection(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_factory(*errors):
+    FakeSession.opened = []
+    pending = list(errors)
+    return lambda: FakeSession(pending)
+
+
+@pytest.mark.asyncio
+async def test_connection_errors_are_retried():
+    """Errores de conexión: se reintenta y se cierran las sesiones fallidas"""
+    factory = fake_factory(ConnectionRefusedError("refused"), TimeoutError())
+    db = await open_session(max_retries=3, retry_delay=0, session_factory=factory)
+    assert len(FakeSession.opened) == 3 and db is FakeSession.opened[-1]
+    assert [s.closed for s in FakeSession.opened] == [True, True, False]
+
+    factory = fake_factory(*(OSError("down") for _ in range(3)))
+    with pytest.raises(OSError):
+        await open_session(max_retries=3, retry_delay=0, session_factory=factory)
+    assert len(FakeSession.opened) == 3
+
+
+@pytest.mark.asyncio
+async def test_other_errors_are_not_retried(monkeypatch):
+    """Un error que no es de conexión se propaga sin reintentar, también desde la petición"""
+    error = ProgrammingError("SELECT", {}, Exception("syntax error"))
+    assert not is_connection_error(error)
+    factory = fake_factory(error)
+    with pytest.raises(ProgrammingError):
+        await open_session(max_retries=3, retry_delay=0, session_factory=factory)
+    assert len(FakeSession.opened) == 1
+
+    monkeypatch.setattr(database, "SessionLocal", fake_factory())
+    gen = get_db(retry_delay=0)
+    db = await gen.__anext__()
+    with pytest.raises(ConnectionError):
+        await gen.athrow(ConnectionError("fallo dentro del endpoint"))
+    assert db.closed and len(FakeSession.opened) == 1
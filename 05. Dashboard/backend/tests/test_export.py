@@ -0,0 +1,73 @@
+"""
+Pruebas de la exportación columnar de clientes
+"""
+import io
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from app.api import app
+from app.export import COLUMNS, encode_batches, export_query, parse_columns
+
+
+async def batches(*partitions):
+    for rows in partitions:
+        yield rows
+
+
+async def collect(partitions, columns, fmt):
+    chunks = [chunk async for chunk in encode_batches(partitions, columns, fmt)]
+    return chunks, io.BytesIO(b"".join(chunks))
+
+
+@pytest.mark.asyncio
+async def test_batches_round_trip_in_arrow_and_parquet():
+    """Cada lote se entrega por separado y el archivo completo se lee con pyarrow"""
+    columns = ["id", "user_id", "probability", "is_target", "acquisition_date"]
+    first = [(1, "user_1", 0.9, True, datetime(2024, 1, 2)), (2, "user_2", None, None, None)]
+    second = [(3, "user_3", 0.1, False, datetime(2024, 3, 4))]
+
+    chunks, data = await collect(batches(first, [], second), columns, "arrow")
+    assert len(chunks) >= 3
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.column_names == columns and table.num_rows == 3
+    assert table.column("probability").to_pylist() == [0.9, None, 0.1]
+    assert table.schema.field("acquisition_date").type == pa.timestamp("us")
+
+    _, data = await collect(batches(first, second), columns, "parquet")
+    parquet = pq.ParquetFile(data)
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.read().to_pylist() == table.to_pylist()
+
+    # Sin filas: archivo válido con el esquema
+    _, data = await collect(batches(), ["id", "status"], "parquet")
+    empty = pq.read_table(data)
+    assert empty.num_rows == 0 and empty.column_names == ["id", "status"]
+
+
+def test_projection_and_filters():
+    """La proyección evita el JOIN si no se piden columnas de predicción; pending incluye NULL"""
+    assert parse_columns(None) == list(COLUMNS)
+    assert parse_columns("user_id, probability,user_id") == ["user_id", "probability"]
+    with pytest.raises(HTTPException) as exc:
+        parse_columns("user_id,password")
+    assert exc.value.status_code == 400 and "password" in exc.value.detail
+
+    def sql(query):
+        return str(query.compile(dialect=postgresql.dialect()))
+
+    plain = sql(export_query(["user_id", "probability"], min_probability=0.5))
+    assert "JOIN" not in plain and "demographics.probability >=" in plain
+    joined = sql(export_query(["user_id", "prediction_probability"], statuses=["pending", "contacted"]))
+    assert "LEFT OUTER JOIN prediction_results" in joined
+    assert "demographics.status IS NULL" in joined
+
+    client = TestClient(app)
+    assert client.get("/api/v1/export/clients?columns=nope").status_code == 400
+    assert client.get("/api/v1/export/clients?format=csv").status_code == 422
+    assert client.get("/api/v1/export/clients?min_probability=2").status_code == 422
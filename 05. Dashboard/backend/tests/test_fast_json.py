@@ -0,0 +1,71 @@
+"""
+Pruebas de la serialización JSON rápida del router v1
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app import fast_json
+from app.api import api_v1
+from app.fast_json import V1_RESPONSE_CLASS, FastJSONResponse, dumps, json_response
+from app.schemas import KPISummary
+
+
+def test_numpy_and_non_finite_values():
+    """Arrays y escalares de NumPy, NaN como null, modelos de Pydantic y fechas"""
+    payload = {
+        "values": np.array([[0.25, 0.5], [np.nan, 1.0]]),
+        "strided": np.arange(6)[::2],
+        "count": np.int64(7),
+        "mean": np.float32(0.5),
+        "summary": KPISummary(total_clients=1, churn_risk_mean=0.1, contacted=0, at_risk_count=0, conversion_rate=0.0),
+        "at": datetime(2024, 5, 1, 12, 30),
+        1: "clave numérica",
+    }
+    decoded = json.loads(dumps(payload))
+    assert decoded["values"] == [[0.25, 0.5], [None, 1.0]]
+    assert decoded["strided"] == [0, 2, 4]
+    assert decoded["count"] == 7 and decoded["mean"] == 0.5
+    assert decoded["summary"]["total_clients"] == 1
+    assert decoded["at"] == "2024-05-01T12:30:00" and decoded["1"] == "clave numérica"
+
+
+def summary_app():
+    app = FastAPI()
+
+    @app.get("/summary", response_model=KPISummary)
+    async def summary(response: Response):
+        response.headers["X-Snapshot-Stale"] = "false"
+        return json_response({"total_clients": 3, "churn_risk_mean": 0.5, "contacted": 1, "extra": [1, 2]}, response)
+
+    return app
+
+
+def test_fast_json_is_opt_in(monkeypatch):
+    """Sin FAST_JSON_ENABLED=1 el router v1 usa JSONResponse y el response_model se aplica"""
+    assert api_v1.default_response_class is V1_RESPONSE_CLASS
+    if "FAST_JSON_ENABLED" not in os.environ:
+        assert V1_RESPONSE_CLASS is JSONResponse
+    monkeypatch.setattr(fast_json, "FAST_JSON_ENABLED", False)
+
+    result = TestClient(summary_app()).get("/summary")
+    assert result.status_code == 200
+    assert "extra" not in result.json() and result.json()["total_clients"] == 3
+    assert result.headers["x-snapshot-stale"] == "false"
+
+
+def test_json_response_skips_response_model_and_keeps_headers(monkeypatch):
+    """Con orjson activo la respuesta directa no se revalida contra response_model y conserva las cabeceras"""
+    monkeypatch.setattr(fast_json, "FAST_JSON_ENABLED", True)
+    monkeypatch.setattr(fast_json, "V1_RESPONSE_CLASS", FastJSONResponse)
+
+    result = TestClient(summary_app()).get("/summary")
+    assert result.status_code == 200
+    assert result.json() == {"total_clients": 3, "churn_risk_mean": 0.5, "contacted": 1, "extra": [1, 2]}
+    assert result.headers["x-snapshot-stale"] == "false"
+    assert result.headers["content-type"] == "application/json"
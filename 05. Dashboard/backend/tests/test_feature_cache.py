@@ -0,0 +1,90 @@
+"""
+Pruebas de la caché de features y predicciones por cliente
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import ml_service
+from app.feature_cache import FeatureCache, source_versions, bump_feature_cache_epoch
+from app.features.transaction_aggregates import TransactionAggregates
+from app.inference_executor import InferenceExecutor
+from benchmarks.profile_feature_pipeline import synthetic_inputs
+
+TRAINING_CATEGORIES = ["entertainment", "food", "health", "shopping", "supermarket", "transport", "travel"]
+
+
+def test_lru_is_bounded_and_expires(tmp_path, monkeypatch):
+    """Desaloja por entradas y bytes, expira por TTL y se vacía con una época nueva"""
+    epoch = tmp_path / "feature_cache.epoch"
+    cache = FeatureCache(max_entries=3, max_bytes=10_000, ttl=60, epoch_file=epoch)
+    vector = np.zeros(30, dtype=np.float32)
+    for i in range(5):
+        cache.put(f"u{i}", 1, "v1", vector, 0.5)
+    assert len(cache) == 3 and cache.get("u0", 1, "v1") is None and cache.evictions == 2
+
+    assert cache.get("u4", 1, "v1").probability == 0.5
+    assert cache.get("u4", 2, "v1") is None          # datos de origen distintos
+    assert cache.get("u3", 1, "v2") is None          # otra versión del modelo
+    assert cache.stats()["stale"] == 2 and len(cache) == 1
+
+    cache.put("u5", 1, "v1", np.zeros(10_000, dtype=np.float32), 0.1)
+    assert len(cache) == 0 and cache.bytes == 0      # no cabe en max_bytes
+
+    cache.put("u6", 1, "v1", vector, 0.3)
+    monkeypatch.setattr("app.feature_cache.time.monotonic", lambda: 1e12)
+    assert cache.get("u6", 1, "v1") is None and cache.expired == 1
+
+    cache.put("u7", 1, "v1", vector, 0.3)
+    bump_feature_cache_epoch(epoch)
+    cache.check_epoch()
+    assert len(cache) == 0
+
+
+def test_source_versions_track_each_client():
+    """Solo cambia la versión del cliente cuyas filas de origen cambiaron"""
+    demographics, products, transactions = synthetic_inputs(200, 20, categories=TRAINING_CATEGORIES)
+    demographics["status"] = "pending"
+    columns = ["age", "income_range", "risk_profile", "occupation"]
+    base = source_versions(demographics, products, transactions, demographic_columns=columns)
+    assert len(set(base)) == len(demographics)
+
+    changed = transactions.copy()
+    changed.loc[changed["user_id"] == "user_3", "amount"] += 1
+    demographics.loc[demographics["user_id"] == "user_5", "status"] = "contacted"
+    after = source_versions(demographics, products, changed, demographic_columns=columns)
+    assert list(np.flatnonzero(after != base)) == [2]
+
+    aggs = TransactionAggregates.from_transactions(transactions)
+    from_aggs = source_versions(demographics, products, transaction_aggregates=aggs, demographic_columns=columns)
+    assert np.array_equal(from_aggs, source_versions(
+        demographics, products, transaction_aggregates=aggs.select(demographics["user_id"]), demographic_columns=columns
+    ))
+
+
+@pytest.mark.asyncio
+async def test_predict_reuses_unchanged_clients(monkeypatch):
+    """Una segunda puntuación sirve desde la caché y solo recalcula a los clientes con datos nuevos"""
+    cache = FeatureCache(epoch_file=None)
+    monkeypatch.setattr(ml_service, "feature_cache", cache)
+    monkeypatch.setattr(ml_service, "inference_executor", InferenceExecutor(enabled=False))
+    demographics, products, transactions = synthetic_inputs(500, 50, categories=TRAINING_CATEGORIES)
+    aggs = TransactionAggregates.from_transactions(transactions)
+
+    first = await ml_service.predict(demographics, aggs, products_df=products)
+    assert cache.stats()["misses"] == 50 and len(cache) == 50
+
+    second = await ml_service.predict(demographics, aggs, products_df=products)
+    assert cache.stats()["hits"] == 50
+    pd.testing.assert_series_equal(first["probability"], second["probability"])
+
+    new_tx = transactions[transactions["user_id"] == "user_7"].head(3).assign(amount=500.0)
+    updated = TransactionAggregates.combine([aggs, TransactionAggregates.from_transactions(new_tx)])
+    third = await ml_service.predict(demographics, updated, products_df=products)
+    assert cache.stats()["misses"] == 51
+    uncached = await ml_service.predict(demographics, updated, products_df=products)
+    cache.clear()
+    fresh = await ml_service.predict(demographics, updated, products_df=products)
+    np.testing.assert_allclose(third["probability"], fresh["probability"])
+    np.testing.assert_allclose(uncached["probability"], fresh["probability"])
+    assert list(third["user_id"]) == list(demographics["user_id"])
@@ -0,0 +1,230 @@
+"""
+Pruebas de la ingesta de transacciones por chunks del pipeline de features
+"""
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.features import generate_features
+from app.features.transaction_aggregates import (
+    TransactionAggregates,
+    aggregate_transactions_csv,
+    iter_transaction_chunks,
+    transaction_features,
+)
+
+REFERENCE_DATE = pd.Timestamp("2024-01-01")
+
+
+def synthetic_transactions(n_rows=400, n_users=25, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "transaction_id": [f"tx-{i}" for i in range(n_rows)],
+        "user_id": [f"user_{u:03d}" for u in rng.integers(1, n_users + 1, size=n_rows)],
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, size=n_rows), unit="D"),
+        "amount": rng.gamma(2.0, 40.0, size=n_rows).round(2),
+        "merchant_category": rng.choice(["food", "shopping", "travel", "transport"], size=n_rows),
+        "description": "compra",
+    })
+
+
+def to_csv_buffer(df):
+    buf = StringIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    return buf
+
+
+def test_chunks_skip_description_and_use_explicit_dtypes():
+    """La lectura por chunks no carga la columna description"""
+    chunks = list(iter_transaction_chunks(to_csv_buffer(synthetic_transactions(50)), chunksize=20))
+    assert [len(c) for c in chunks] == [20, 20, 10]
+    assert "description" not in chunks[0].columns
+    assert pd.api.types.is_datetime64_any_dtype(chunks[0]["date"])
+    assert chunks[0]["merchant_category"].dtype.name == "category"
+
+
+@pytest.mark.parametrize("chunksize", [7, 13, 100, 10_000])
+def test_streamed_aggregates_match_full_dataframe(chunksize):
+    """Las features desde chunks coinciden con las calculadas sobre el DataFrame completo"""
+    tx = synthetic_transactions()
+    full = transaction_features(TransactionAggregates.from_transactions(tx), REFERENCE_DATE)
+    streamed = transaction_features(aggregate_transactions_csv(to_csv_buffer(tx), chunksize), REFERENCE_DATE)
+    pd.testing.assert_frame_equal(full, streamed, check_exact=False, check_categorical=False)
+
+
+def test_generate_features_accepts_precomputed_aggregates():
+    """generate_features produce el mismo dataset con transacciones o con sus agregados"""
+    tx = synthetic_transactions()
+    users = sorted(tx["user_id"].unique())
+    demog = pd.DataFrame({
+        "user_id": users,
+        "age": np.linspace(20, 65, len(users)).astype(int),
+        "income_range": "50k-100k",
+        "risk_profile": "moderate",
+        "occupation": "Analista",
+    })
+    prod = pd.DataFrame({
+        "user_id": users,
+        "product_type": "checking_account",
+        "contract_date": pd.Timestamp("2021-06-01"),
+    })
+
+    expected = generate_features(demog, prod, tx, reference_date=REFERENCE_DATE)
+    streamed = generate_features(
+        demog, prod,
+        transaction_aggregates=aggregate_transactions_csv(to_csv_buffer(tx), chunksize=37),
+        reference_date=REFERENCE_DATE,
+    )
+    pd.testing.assert_frame_equal(expected, streamed, check_exact=False)
+
+
+def test_feature_state_upsert_is_additive():
+    """El upsert del estado suma los parciales del batch y conserva la última fecha"""
+    from sqlalchemy.dialects import postgresql
+    from app.database import UserFeatureState, UserMonthState
+    from app.feature_store import state_upsert_statement
+
+    sql = str(state_upsert_statement(UserFeatureState).compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id) DO UPDATE" in sql
+    assert "n_tx = (user_feature_state.n_tx + excluded.n_tx)" in sql
+    assert "greatest(user_feature_state.last_date, excluded.last_date)" in sql
+
+    sql = str(state_upsert_statement(UserMonthState).compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id, mes) DO UPDATE" in sql
+
+
+def test_incremental_batches_match_full_recompute():
+    """Sumar batches nuevos al estado equivale a recalcular sobre todo el historial"""
+    tx = synthetic_transactions(n_rows=600)
+    state = TransactionAggregates.from_transactions(tx.iloc[:500])
+    for batch in (tx.iloc[500:550], tx.iloc[550:]):
+        state = state.merge(TransactionAggregates.from_transactions(batch))
+
+    full = transaction_features(TransactionAggregates.from_transactions(tx), REFERENCE_DATE)
+    pd.testing.assert_frame_equal(full, transaction_features(state, REFERENCE_DATE),
+                                  check_exact=False, check_categorical=False)
+
+
+def training_inputs():
+    tx = synthetic_transactions()
+    users = sorted(tx["user_id"].unique())
+    demog = pd.DataFrame({
+        "user_id": users,
+        "age": np.linspace(20, 65, len(users)).astype(int),
+        "income_range": np.resize(["30k-50k", "50k-100k", "100k-150k"], len(users)),
+        "risk_profile": np.resize(["conservative", "moderate"], len(users)),
+        "occupation": "Analista",
+    })
+    prod = pd.DataFrame({
+        "user_id": users,
+        "product_type": np.resize(["checking_account", "savings_account"], len(users)),
+        "contract_date": pd.Timestamp("2021-06-01"),
+    })
+    return demog, prod, tx
+
+
+def test_fitted_transformer_is_batch_independent(tmp_path):
+    """Con un transformador ajustado, un cliente puntuado solo coincide con el batch completo"""
+    from app.features import FeatureTransformer
+
+    demog, prod, tx = training_inputs()
+    raw = generate_features(demog, prod, tx, reference_date=REFERENCE_DATE, raw=True)
+    transformer = FeatureTransformer().fit(raw)
+    # Sin transformador se ajusta sobre el propio batch: mismo resultado que antes
+    pd.testing.assert_frame_equal(generate_features(demog, prod, tx, reference_date=REFERENCE_DATE),
+                                  transformer.transform(raw))
+
+    transformer = FeatureTransformer.load(transformer.save(tmp_path / "feature_transformer.json"))
+    full = generate_features(demog, prod, tx, reference_date=REFERENCE_DATE, transformer=transformer)
+    single = generate_features(demog.iloc[[3]], prod, tx, reference_date=REFERENCE_DATE, transformer=transformer)
+    pd.testing.assert_frame_equal(single, full.iloc[[3]].reset_index(drop=True), check_dtype=False)
+    assert single["age"].iloc[0] != 0
+
+
+def test_transform_row_matches_dataframe_transform():
+    """transform_row da el mismo resultado que transform y codifica valores nuevos como desconocidos"""
+    from app.features import FeatureTransformer
+
+    demog, prod, tx = training_inputs()
+    raw = generate_features(demog, prod, tx, reference_date=REFERENCE_DATE, raw=True)
+    transformer = FeatureTransformer().fit(raw)
+    expected = transformer.transform(raw).iloc[5]
+
+    row = transformer.transform_row(raw.iloc[5].to_dict())
+    assert list(row) == list(expected.index)
+    for column, value in row.items():
+        assert value == pytest.approx(expected[column], nan_ok=True)
+
+    unseen = transformer.transform_row({**raw.iloc[5].to_dict(), "risk_profile": "speculative"})
+    assert unseen["risk_profile"] == -1
+
+
+def original_label_codes(df, column):
+    """Codificación de etiquetas de generate_features antes del FeatureTransformer"""
+    from sklearn.preprocessing import LabelEncoder
+
+    values = df[column]
+    if values.dtype.name == "category":
+        values = values.astype(str)
+    if values.isna().any():
+        values = values.fillna("unknown")
+    return LabelEncoder().fit_transform(values.astype(str))
+
+
+def test_null_labels_keep_the_original_codes_in_batch_and_row(tmp_path):
+    """Los nulos conservan los códigos originales ("nan" en category, "unknown" en el resto) en transform y transform_row"""
+    from app.features import FeatureTransformer
+
+    demog, prod, tx = training_inputs()
+    raw = generate_features(demog, prod, tx, reference_date=REFERENCE_DATE, raw=True)
+    assert raw["segundo_producto"].dtype.name == "category" and raw["segundo_producto"].isna().any()
+    # "nan" < "savings_account" < "unknown": otra etiqueta de nulo movería este código
+    raw.loc[0, "segundo_producto"] = "savings_account"
+    raw.loc[2, "income_range"] = None
+    raw["occupation"] = raw["occupation"].astype(object)
+    raw.loc[5, "occupation"] = None
+
+    transformer = FeatureTransformer().fit(raw)
+    encoded = transformer.transform(raw)
+    for c in set(transformer.label_codes).intersection(transformer.columns):
+        np.testing.assert_array_equal(encoded[c].to_numpy(), original_label_codes(raw, c))
+    assert transformer.null_labels["segundo_producto"] == "nan"
+    assert transformer.null_labels["occupation"] == "unknown"
+
+    transformer = FeatureTransformer.load(transformer.save(tmp_path / "feature_transformer.json"))
+    for i in (2, 5, int(raw["segundo_producto"].isna().idxmax())):
+        row = transformer.transform_row(raw.iloc[i].to_dict())
+        for c in set(transformer.label_codes).intersection(transformer.columns):
+            assert row[c] == encoded[c].iloc[i]
+
+    # Archivos sin null_labels: el de los nulos se deduce del vocabulario
+    legacy = FeatureTransformer.from_dict({
+        "scale_params": {}, "columns": ["income_range", "occupation"],
+        "label_codes": {"income_range": {"high": 0, "nan": 1}, "occupation": {"engineer": 0, "unknown": 1}},
+    })
+    assert legacy.transform_row({"income_range": None, "occupation": None}) == {"income_range": 1, "occupation": 1}
+
+
+def test_product_combination_labels_and_stage_timings():
+    """La combinación de productos vectorizada etiqueta cada cliente y se registran los tiempos por etapa"""
+    demog, prod, tx = training_inputs()
+    users = demog["user_id"].tolist()
+    prod = pd.DataFrame({
+        "user_id": [users[0], users[0], users[1], users[2], users[2], users[2]],
+        "product_type": ["savings_account", "checking_account", "investment_account",
+                         "credit_card", "insurance", "investment_account"],
+        "contract_date": pd.to_datetime(["2021-01-01", "2021-06-01", "2022-01-01",
+                                         "2020-01-01", "2020-06-01", "2021-01-01"]),
+    })
+    timings = {}
+    raw = generate_features(demog.iloc[:3], prod, tx, reference_date=REFERENCE_DATE, raw=True,
+                            stage_timings=timings)
+
+    assert raw["combinacion_productos"].astype(str).tolist() == [
+        "checking_account + savings_account", "investment", "multi_producto",
+    ]
+    assert list(timings) == ["carga", "demographics", "products", "transactions", "dataset_final"]
+    assert all(seconds >= 0 for seconds in timings.values())
@@ -0,0 +1,206 @@
+"""
+Pruebas del cubo preagregado del mapa de calor
+"""
+import asyncio
+import uuid
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import app.api as api
+from app.api import app
+from app.database import DATABASE_URL, Base, Client, Contact, HeatmapCell, MetricSnapshot, get_db
+from app.heatmap_cube import (
+    AXES, DIMENSIONS, MEASURES, MISSING, axis_categories, cell_metric, closed_bin_labels, heatmap_matrix,
+    open_bin_labels, parse_edges, rebuild_cube,
+)
+
+
+def cube_cell(probabilities, threshold=0.5, converted=0):
+    """Medidas de una celda como las calcula el cubo (None = probabilidad nula)"""
+    known = np.array([p for p in probabilities if p is not None], dtype=float)
+    return {
+        "n": len(probabilities),
+        "probability_n": len(known),
+        "probability_sum": float(known.sum()),
+        "probability_sq_sum": float((known ** 2).sum()),
+        "at_risk": int((known >= threshold).sum()),
+        "converted": converted,
+    }
+
+
+def merge(*cells):
+    return {m: sum(c[m] for c in cells) for m in (*MEASURES, "converted")}
+
+
+def test_metrics_from_summed_cells_match_raw_values():
+    """Sumar celdas y luego calcular la métrica equivale a calcularla sobre los clientes"""
+    rng = np.random.default_rng(7)
+    groups = [list(rng.random(n)) for n in (5, 40, 1)]
+    groups[1][3] = None
+    cell = merge(*(cube_cell(g, converted=i) for i, g in enumerate(groups)))
+    values = np.array([p for g in groups for p in g if p is not None], dtype=float)
+
+    assert cell_metric(cell, "count") == 46
+    assert cell_metric(cell, "mean_probability") == pytest.approx(values.mean())
+    assert cell_metric(cell, "std_probability") == pytest.approx(values.std())
+    assert cell_metric(cell, "at_risk") == int((values >= 0.5).sum())
+    assert cell_metric(cell, "at_risk_rate") == pytest.approx((values >= 0.5).sum() / 46)
+    assert cell_metric(cell, "conversion") == pytest.approx(3 / 46)
+
+    empty = cube_cell([None, None])
+    assert cell_metric(empty, "count") == 2 and cell_metric(empty, "mean_probability") is None
+    with pytest.raises(ValueError):
+        cell_metric(cell, "median")
+
+
+def test_axis_categories_keep_bin_order():
+    """Los ejes agrupados siguen el orden de sus rangos sin huecos; N/A siempre al final"""
+    assert axis_categories("age", ["56+", MISSING, "18-25", "36-45"]) == ["18-25", "26-35", "36-45", "46-55", "56+", MISSING]
+    assert axis_categories("probability", ["0.1-0.2", "0.0-0.1"]) == ["0.0-0.1", "0.1-0.2"]
+    assert axis_categories("segment", ["premium", MISSING, "potential"]) == ["potential", "premium", MISSING]
+    assert axis_categories("income_range", ["150k+", "0-50k", "100k-150k", "50k-100k"]) == \
+        ["0-50k", "50k-100k", "100k-150k", "150k+"]
+    assert set(AXES.values()) == set(DIMENSIONS)
+
+
+def test_bin_labels_from_edges():
+    """Etiquetas de los rangos a partir de los bordes configurados"""
+    assert open_bin_labels(parse_edges("18,26,36,46,56")) == ["<18", "18-25", "26-35", "36-45", "46-55", "56+"]
+    assert closed_bin_labels(parse_edges("0,0.25,0.5,0.75,1")) == ["0.00-0.25", "0.25-0.50", "0.50-0.75", "0.75-1.00"]
+    with pytest.raises(ValueError):
+        parse_edges("30,20")
+
+
+def test_heatmap_matrix_is_dense():
+    """Una fila por categoría de Y y una columna por categoría de X; celdas vacías en 0"""
+    cells = [
+        {"x": "18-25", "y": "premium", **cube_cell([0.2, 0.4])},
+        {"x": "36-45", "y": "potential", **cube_cell([0.9], converted=1)},
+    ]
+    matrix = heatmap_matrix(cells, "age", "segment", "mean_probability")
+    assert matrix["x_categories"] == ["18-25", "26-35", "36-45"]
+    assert matrix["y_categories"] == ["potential", "premium"]
+    assert matrix["values"] == [[0, 0, 0.9], [0.3, 0, 0]]
+    assert heatmap_matrix(cells, "age", "segment", "count")["values"] == [[0, 0, 1], [2, 0, 0]]
+    assert heatmap_matrix(cells, "age", "segment", "conversion")["values"][0][2] == 1.0
+
+
+def test_heatmap_endpoint_validates_axes_and_metric():
+    """Mismo contrato de errores que mock_api"""
+    async def no_db():
+        yield None
+
+    app.dependency_overrides[get_db] = no_db
+    try:
+        client = TestClient(app)
+        response = client.get("/api/v1/metrics/heatmap?x=priority&y=income_range")
+        assert response.status_code == 400 and "Variable 'x' no válida" in response.json()["detail"]
+        response = client.get("/api/v1/metrics/heatmap?x=age&y=priority")
+        assert response.status_code == 400 and "Variable 'y' no válida" in response.json()["detail"]
+        response = client.get("/api/v1/metrics/heatmap?x=age&y=status&metric=median")
+        assert response.status_code == 400 and "Métrica no válida" in response.json()["detail"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_variables_are_not_cached_while_the_cube_is_stale(monkeypatch):
+    """Las categorías se leen del cubo: con el snapshot invalidado van con no-store"""
+    calls = []
+
+    async def no_db():
+        yield None
+
+    async def stale_snapshot(db, name, **params):
+        return {}, MetricSnapshot(key=name, dirty=True, refreshed_at=datetime.now())
+
+    async def categories(db):
+        calls.append(1)
+        return {"segment": ["a", "b"]}
+
+    monkeypatch.setattr(api, "get_snapshot", stale_snapshot)
+    monkeypatch.setattr(api, "cube_categories", categories)
+    app.dependency_overrides[get_db] = no_db
+    try:
+        client = TestClient(app)
+        for _ in range(2):
+            # Parámetro propio: clave de caché que ninguna otra prueba usa
+            response = client.get("/api/v1/metrics/heatmap/variables?stale=1")
+            assert response.status_code == 200
+            assert response.headers["Cache-Control"] == "no-store"
+            assert response.headers["X-Snapshot-Stale"] == "true"
+        assert len(calls) == 2
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def cube_by_status(db):
+    result = await db.execute(select(HeatmapCell.status, func.sum(HeatmapCell.n)).group_by(HeatmapCell.status))
+    return dict(result.all())
+
+
+@pytest.mark.asyncio
+async def test_concurrent_status_updates_count_the_client_once(monkeypatch):
+    """Dos cambios simultáneos del mismo cliente dejan el cubo igual que una reconstrucción"""
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    except OSError as e:
+        await engine.dispose()
+        pytest.skip(f"Base de datos no disponible: {e}")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def test_db():
+        async with Session() as db:
+            yield db
+
+    # Pausa tras restar la celda anterior: sin bloqueo de fila, la segunda
+    # petición lee el mismo estado anterior y lo resta otra vez
+    apply_client_delta = api.apply_client_delta
+
+    async def slow_delta(db, ids, sign, threshold):
+        await apply_client_delta(db, ids, sign, threshold)
+        if sign < 0:
+            await asyncio.sleep(0.3)
+
+    monkeypatch.setattr(api, "apply_client_delta", slow_delta)
+    monkeypatch.setattr(api, "schedule_refresh", lambda: None)
+    monkeypatch.setattr(api, "bump_data_version", lambda: None)
+    app.dependency_overrides[get_db] = test_db
+    user_id = f"cube_race_{uuid.uuid4().hex[:8]}"
+    try:
+        async with Session() as db:
+            client = Client(user_id=user_id, age=30, segment="retail", status="pending", probability=0.7)
+            db.add(client)
+            await db.flush()
+            await rebuild_cube(db, api.THRESHOLD)
+            await db.commit()
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            responses = await asyncio.gather(*(
+                http.patch(f"/api/v1/clients/{client.id}/status", json={"new_status": new_status})
+                for new_status in ("contacted", "converted")
+            ))
+        assert [r.status_code for r in responses] == [200, 200]
+
+        async with Session() as db:
+            incremental = await cube_by_status(db)
+            await rebuild_cube(db, api.THRESHOLD)
+            assert incremental == await cube_by_status(db)
+            await db.rollback()
+    finally:
+        app.dependency_overrides.clear()
+        async with Session() as db:
+            client_ids = select(Client.id).where(Client.user_id == user_id).scalar_subquery()
+            await db.execute(delete(Contact).where(Contact.client_id.in_(client_ids)))
+            await db.execute(delete(Client).where(Client.user_id == user_id))
+            await rebuild_cube(db, api.THRESHOLD)
+            await db.commit()
+        await engine.dispose()
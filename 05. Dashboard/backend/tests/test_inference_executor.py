@@ -0,0 +1,83 @@
+"""
+Pruebas del ejecutor de inferencia fuera del event loop
+"""
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.inference_executor import InferenceExecutor, InferenceOverloaded
+
+
+def slow_square(x, delay=0.2):
+    time.sleep(delay)
+    return x * x
+
+
+@pytest.mark.asyncio
+async def test_inference_runs_off_the_event_loop():
+    """El event loop sigue atendiendo tareas mientras el pool ejecuta trabajo bloqueante"""
+    executor = InferenceExecutor(threads=1, processes=0)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        assert await executor.run_inference(slow_square, 3) == 9
+    finally:
+        task.cancel()
+        executor.shutdown()
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_backpressure_rejects_when_pool_is_full():
+    """Con el pool lleno la petición espera como máximo queue_timeout y falla con InferenceOverloaded"""
+    executor = InferenceExecutor(threads=1, processes=0, max_pending=1, queue_timeout=0.05)
+    try:
+        running = asyncio.create_task(executor.run_inference(slow_square, 2, delay=0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(InferenceOverloaded):
+            await executor.run_inference(slow_square, 3)
+        assert await running == 4
+        assert executor.stats()["threads"]["pending"] == 0
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_features_run_in_a_separate_process():
+    """run_features usa el pool de procesos; deshabilitado, todo corre en el hilo del loop"""
+    executor = InferenceExecutor(threads=1, processes=1)
+    try:
+        assert await executor.run_features(os.getpid) != os.getpid()
+    finally:
+        executor.shutdown()
+
+    inline = InferenceExecutor(enabled=False)
+    assert await inline.run_inference(threading.get_ident) == threading.get_ident()
+
+
+def loaded_modules():
+    import sys
+    return set(sys.modules)
+
+
+@pytest.mark.asyncio
+async def test_warm_up_starts_every_slim_feature_process():
+    """El calentamiento arranca todos los procesos y estos no cargan la API ni la base de datos"""
+    executor = InferenceExecutor(threads=1, processes=2)
+    try:
+        assert executor.warm_up() == 2
+        modules = await executor.run_features(loaded_modules)
+    finally:
+        executor.shutdown()
+    assert "app.feature_worker" in modules and "app.features" in modules
+    assert not {"app.api", "app.ml_service", "app.database", "app.observability", "sqlalchemy"} & modules
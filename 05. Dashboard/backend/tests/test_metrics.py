@@ -56,4 +56,37 @@ def test_probability_distribution():
         assert "range" in bucket and "no_contacted" in bucket and "contacted" in bucket
         assert isinstance(bucket["range"], str)
         assert isinstance(bucket["no_contacted"], int)
-        assert isinstance(bucket["contacted"], int) 
\ No newline at end of file
+        assert isinstance(bucket["contacted"], int) 
+
+
+def test_kpi_summary_query_is_single_statement():
+    """El resumen de KPIs se resuelve en una sola consulta agregada"""
+    from sqlalchemy.dialects import postgresql
+    from app.api import kpi_summary_query
+
+    sql = str(kpi_summary_query().compile(dialect=postgresql.dialect()))
+    assert sql.count("FROM demographics") == 1
+    assert sql.count("FROM contacts") == 1
+    assert "FILTER (WHERE" in sql
+
+
+def test_distribution_edges():
+    """Los bordes se generan uniformes o se validan si vienen explícitos"""
+    from fastapi import HTTPException
+    from app.api import distribution_edges
+
+    assert distribution_edges(buckets=4, edges=None) == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert distribution_edges(buckets=10, edges="0, 0.2,0.5,1") == [0.0, 0.2, 0.5, 1.0]
+    for invalid in ["0.5", "0,0.5,0.3", "a,b", "0,nan,1", "0,1,inf", "-inf,0"]:
+        with pytest.raises(HTTPException):
+            distribution_edges(buckets=10, edges=invalid)
+
+
+def test_probability_histogram_query_bins_in_sql():
+    """El histograma se agrupa en SQL en lugar de traer todas las probabilidades"""
+    from sqlalchemy.dialects import postgresql
+    from app.api import probability_histogram_query
+
+    sql = str(probability_histogram_query([0.0, 0.5, 1.0]).compile(dialect=postgresql.dialect()))
+    assert "width_bucket" in sql
+    assert "GROUP BY bucket" in sql
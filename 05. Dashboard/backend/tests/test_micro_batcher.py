@@ -0,0 +1,60 @@
+"""
+Pruebas del micro-batcher de predicciones online
+"""
+import asyncio
+
+import pytest
+
+from app.micro_batcher import MicroBatcher
+
+
+def recording_batcher(**kwargs):
+    batches = []
+
+    async def double(items):
+        batches.append(list(items))
+        return [2 * x for x in items]
+
+    return MicroBatcher(double, **kwargs), batches
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    """Sin carga la petición sale sola; las que llegan mientras corre un lote se procesan juntas"""
+    batcher, batches = recording_batcher(max_wait_ms=20, max_rows=100)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    assert results == [2 * i for i in range(10)]
+    assert batches == [[0], list(range(1, 10))]
+    assert batcher.stats()["largest_batch"] == 9
+
+
+@pytest.mark.asyncio
+async def test_max_rows_flushes_without_waiting():
+    """Al llegar a max_rows el lote se procesa sin esperar la ventana"""
+    batcher, batches = recording_batcher(max_wait_ms=10_000, max_rows=4)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(8))), timeout=1)
+    assert results == [2 * i for i in range(8)]
+    assert [len(b) for b in batches] == [1, 4, 3]
+
+
+@pytest.mark.asyncio
+async def test_batch_errors_reach_every_request():
+    """Si el lote falla, todas sus peticiones reciben la excepción"""
+    async def fail(items):
+        raise ValueError("modelo no disponible")
+
+    batcher = MicroBatcher(fail, max_wait_ms=5)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_predict_online_matches_single_row_prediction():
+    """La predicción agrupada coincide con la de una sola fila para el mismo cliente"""
+    from app.ml_service import predict_online, predict_client_probability
+
+    features = {"age": 41, "income_range": "50k-100k", "risk_profile": "moderate", "numero_productos": 2}
+    online = await asyncio.gather(*(predict_online(features, user_id=f"u{i}") for i in range(3)))
+    assert [r["user_id"] for r in online] == ["u0", "u1", "u2"]
+    assert online[0]["probability"] == pytest.approx(predict_client_probability(features))
+    assert online[0]["is_target"] == (online[0]["probability"] >= 0.5)
@@ -0,0 +1,77 @@
+"""
+Pruebas de la migración de índices suplementarios
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from app.database import ix_demographics_probability_id, uq_prediction_results_user_id
+from scripts import migrate_indexes as migration
+
+
+class RecordingConnection:
+    """Conexión mínima que registra el SQL y devuelve ``duplicates`` al contarlos"""
+
+    def __init__(self, duplicates=0):
+        self.duplicates = duplicates
+        self.sql = []
+
+    def execute(self, statement, *args):
+        self.sql.append(str(statement))
+        conn = self
+
+        class Result:
+            rowcount = conn.duplicates
+
+            def scalar(self):
+                return conn.duplicates
+
+        return Result()
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RecordingEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def connect(self):
+        return self.conn
+
+    @contextmanager
+    def begin(self):
+        yield self.conn
+
+
+def test_indexes_are_built_concurrently():
+    """Los índices se crean con CONCURRENTLY y se descarta antes un índice inválido"""
+    conn = RecordingConnection()
+    migration.create_index_concurrently(conn, uq_prediction_results_user_id)
+    assert conn.sql == [
+        "DROP INDEX CONCURRENTLY IF EXISTS uq_prediction_results_user_id",
+        "CREATE UNIQUE INDEX CONCURRENTLY uq_prediction_results_user_id ON prediction_results (user_id)",
+    ]
+    conn = RecordingConnection()
+    migration.create_index_concurrently(conn, ix_demographics_probability_id)
+    assert conn.sql[1].startswith("CREATE INDEX CONCURRENTLY ix_demographics_probability_id ON demographics")
+
+
+def test_duplicates_are_only_deleted_on_request(monkeypatch):
+    """Con duplicados la migración se detiene salvo con dedupe"""
+    monkeypatch.setattr(migration, "missing_indexes", lambda conn: [uq_prediction_results_user_id])
+
+    conn = RecordingConnection(duplicates=3)
+    with pytest.raises(migration.DuplicateKeysError):
+        migration.migrate_indexes(RecordingEngine(conn))
+    assert not any(sql.startswith(("DELETE", "CREATE")) for sql in conn.sql)
+
+    conn = RecordingConnection(duplicates=3)
+    assert migration.migrate_indexes(RecordingEngine(conn), dedupe=True) == ["uq_prediction_results_user_id"]
+    assert [sql.split()[0] for sql in conn.sql] == ["SELECT", "DELETE", "DROP", "CREATE"]
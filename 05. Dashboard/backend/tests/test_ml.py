@@ -14,4 +14,28 @@ async def test_predict_returns_expected_columns():
             result = await predict(df_dummy)
     mock_gen.assert_called_once()
     assert set(result.columns) == {'user_id','probability','is_target','created_at'}
-    assert len(result) == 2
\ No newline at end of file
+    assert len(result) == 2
+
+def test_prediction_upsert_uses_on_conflict():
+    """write_batch escribe con un upsert en bloque sobre user_id"""
+    from sqlalchemy.dialects import postgresql
+    from app.ml_service import prediction_upsert_statement
+
+    sql = str(prediction_upsert_statement().compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id) DO UPDATE" in sql
+
+
+def test_prediction_records_keep_last_per_user():
+    """Un mismo usuario repetido en el batch se escribe una sola vez"""
+    from datetime import datetime
+    from app.ml_service import _prediction_records
+
+    df = pd.DataFrame({
+        'user_id': ['u1', 'u2', 'u1'],
+        'probability': [0.1, 0.2, 0.9],
+        'is_target': [False, False, True],
+        'created_at': datetime.now(),
+    })
+    records = _prediction_records(df)
+    assert [r['user_id'] for r in records] == ['u2', 'u1']
+    assert records[1]['probability'] == 0.9 and records[1]['is_target'] is True
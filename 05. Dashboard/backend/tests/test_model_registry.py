@@ -0,0 +1,108 @@
+"""
+Pruebas del registro de modelos con recarga en caliente
+"""
+import asyncio
+import pickle
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from app.model_registry import ModelRegistry, ModelLoadError, publish_version, load_bundle
+
+
+def train_model(path, seed, n_features=4):
+    rng = np.random.default_rng(seed)
+    model = xgb.XGBClassifier(n_estimators=5, max_depth=2)
+    model.fit(rng.random((60, n_features)), rng.integers(0, 2, size=60))
+    with open(path, "wb") as f:
+        pickle.dump(model, f)
+    return path
+
+
+@pytest.fixture
+def registry_dir(tmp_path):
+    root = tmp_path / "registry"
+    publish_version(root, "v1", train_model(tmp_path / "m1.pkl", 1), threshold=0.4, activate=True)
+    publish_version(root, "v2", train_model(tmp_path / "m2.pkl", 2), threshold=0.6)
+    return root
+
+
+def test_publish_writes_versioned_artifacts(registry_dir):
+    """Cada versión guarda modelo, umbral y esquema; CURRENT apunta a la activada"""
+    registry = ModelRegistry(registry_dir)
+    assert registry.versions() == ["v1", "v2"]
+    assert registry.current_pointer() == "v1"
+
+    bundle = registry.load_current()
+    assert bundle.version == "v1"
+    assert bundle.threshold == 0.4
+    assert bundle.feature_names is None or len(bundle.feature_names) == 4
+    assert bundle.load_seconds > 0 and bundle.warmup_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_activate_swaps_atomically_and_keeps_in_flight_bundle(registry_dir):
+    """Una petición que ya tomó la versión activa la conserva durante la recarga"""
+    registry = ModelRegistry(registry_dir)
+    registry.load_current()
+    in_flight = registry.current
+
+    bundle = await registry.activate("v2", publish=True)
+    assert registry.current is bundle and bundle.version == "v2"
+    assert registry.current_pointer() == "v2"
+    assert in_flight.version == "v1" and in_flight.threshold == 0.4
+    assert in_flight.model.predict_proba(np.zeros((1, 4))).shape == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_failed_load_keeps_previous_version(registry_dir):
+    """Si la versión nueva no carga, la anterior sigue activa"""
+    broken = registry_dir / "v3"
+    broken.mkdir()
+    (broken / "xgb_model.pkl").write_bytes(b"no es un pickle")
+
+    registry = ModelRegistry(registry_dir)
+    registry.load_current()
+    with pytest.raises(ModelLoadError):
+        await registry.activate("v3")
+    assert registry.current.version == "v1"
+    assert registry.status()["last_error"]
+
+    with pytest.raises(ModelLoadError):
+        await registry.activate("../v1")
+
+
+@pytest.mark.asyncio
+async def test_watch_current_follows_pointer(registry_dir):
+    """Cada worker adopta la versión escrita en CURRENT por otro proceso"""
+    registry = ModelRegistry(registry_dir)
+    registry.load_current()
+    task = asyncio.create_task(registry.watch_current(interval=0.01))
+    try:
+        ModelRegistry(registry_dir).publish_pointer("v2")
+        for _ in range(500):
+            if registry.current.version == "v2":
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+    assert registry.current.version == "v2"
+
+
+def test_reload_endpoint_requires_configured_admin_token(monkeypatch):
+    """Sin ADMIN_TOKEN la recarga no existe (404); con él exige el token correcto"""
+    from fastapi.testclient import TestClient
+    from app.api import app
+
+    client = TestClient(app)
+    url = "/api/v1/admin/model/reload?version=../v1"
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post(url).status_code == 404
+    assert client.post(url, headers={"X-Admin-Token": ""}).status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secreto")
+    assert client.post(url).status_code == 403
+    assert client.post(url, headers={"X-Admin-Token": "otro"}).status_code == 403
+    # Token válido: llega al registro, que rechaza la versión sin tocar la activa
+    assert client.post(url, headers={"X-Admin-Token": "secreto"}).status_code == 422
@@ -0,0 +1,84 @@
+"""
+Pruebas de las métricas de Prometheus
+"""
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.api import app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+client = TestClient(app)
+
+
+def test_metrics_reports_latency_per_route_template():
+    """La latencia se etiqueta con la plantilla de la ruta, no con la URL"""
+    client.get("/")
+    client.get("/api/v1/model")
+    client.get("/no-existe")
+    client.post("/api/v1/predict", json={"user_id": "u1", "features": {"age": 40, "numero_productos": 2}})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'prometeo_http_request_duration_seconds_count{method="GET",route="/api/v1/model",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "prometeo_http_requests_in_progress" in text
+    assert 'route="/api/v1/predict",status="200"' in text
+    assert 'prometeo_model_inference_seconds_count{backend=' in text
+
+
+def run_python(code: str, multiproc_dir: Path, **env_vars) -> str:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir), **env_vars}
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def test_multiprocess_metrics_sum_all_workers(tmp_path):
+    """Con PROMETHEUS_MULTIPROC_DIR, /metrics suma lo observado por cada worker"""
+    worker = (
+        "import os\n"
+        "from app import observability as o\n"
+        "o.observe_inference('booster', 0.002)\n"
+        "o.observe_feature_stages({'transactions': 0.5, 'transform': 0.1})\n"
+        "o.REQUESTS_IN_PROGRESS.labels('GET').inc()\n"
+        "print(os.getpid())\n"
+    )
+    pids = [int(run_python(worker, tmp_path)) for _ in range(3)]
+
+    # Un worker que se cierra deja de sumar en los gauges, no en los histogramas
+    text = run_python(
+        f"from app import observability as o\no.mark_worker_dead({pids[0]})\nprint(o.render_metrics().decode())",
+        tmp_path,
+    )
+    assert 'prometeo_model_inference_seconds_count{backend="booster"} 3.0' in text
+    assert 'prometeo_feature_stage_seconds_count{stage="transactions"} 3.0' in text
+    assert 'prometeo_http_requests_in_progress{method="GET"} 2.0' in text
+
+
+def test_pool_gauges_count_only_the_serving_process(tmp_path):
+    """Los procesos del pool de features no suman su pool a los gauges ni dejan archivos"""
+    worker = (
+        "from app import database, observability as o\n"
+        "from app.inference_executor import InferenceExecutor\n"
+        "o.instrument_pool(database.engine)\n"
+        "o.instrument_pool(database.engine)\n"
+        "ex = InferenceExecutor(threads=1, processes=1)\n"
+        "ex.warm_up()\n"
+        "children = list(ex.process_pool.executor()._processes)\n"
+        "ex.shutdown()\n"
+        "print(*children)\n"
+        "print(o.render_metrics().decode())\n"
+    )
+    pool = {"DB_POOL_SIZE": "3", "DB_MAX_OVERFLOW": "2", "DB_PGBOUNCER": "0", "DB_NULL_POOL": "0"}
+    first, text = run_python(worker, tmp_path, **pool).split("\n", 1)
+    children = first.split()
+    assert children
+    assert 'prometeo_db_pool_connections{state="capacity"} 5.0' in text
+    assert 'prometeo_db_pool_connections{state="checked_out"} 0.0' in text
+    assert not [f for f in os.listdir(tmp_path) if any(f.endswith(f"_{pid}.db") for pid in children)]
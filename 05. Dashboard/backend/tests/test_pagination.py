@@ -0,0 +1,28 @@
+"""
+Pruebas de la paginación por cursor de la lista de prioridad
+"""
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_roundtrip():
+    """El cursor conserva la clave (probability, id) de la última fila"""
+    assert decode_cursor(encode_cursor(0.8731, 42)) == (0.8731, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+def test_cursor_is_opaque():
+    """El cursor no expone la clave en texto plano ni usa caracteres reservados de URL"""
+    cursor = encode_cursor(0.5, 10)
+    assert "0.5" not in cursor
+    assert all(ch not in cursor for ch in "+/=&?")
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor(0.5, 1)[:-3], "eyJwIjoxfQ"])
+def test_invalid_cursor_is_rejected(cursor):
+    """Un cursor malformado produce un 400"""
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
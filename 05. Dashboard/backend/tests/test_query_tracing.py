@@ -0,0 +1,91 @@
+"""
+Pruebas de las trazas de consultas SQL y el registro de consultas lentas
+"""
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.query_tracing import (
+    NO_ROUTE, QueryRouteMiddleware, QueryStats, instrument_engine, normalize_statement, statement_fingerprint,
+)
+
+
+def test_fingerprint_ignores_literals_and_parameters():
+    """La misma consulta con otros valores comparte huella"""
+    a = normalize_statement("SELECT * FROM demographics WHERE id IN (1, 2, 3) AND status = 'pending' LIMIT 10")
+    b = normalize_statement("SELECT *  FROM demographics\n WHERE id IN (7, 8) AND status = 'contacted' LIMIT 50")
+    assert a == b == "SELECT * FROM demographics WHERE id IN (?, ...) AND status = ? LIMIT ?"
+    assert statement_fingerprint(a) == statement_fingerprint(b)
+    assert normalize_statement("SELECT probability::text FROM t1 WHERE id = $1") == "SELECT probability::text FROM t1 WHERE id = ?"
+
+
+def test_stats_rank_by_total_time_and_log_slow_queries(caplog):
+    """Top-N por tiempo total, huellas acotadas y registro de las lentas"""
+    stats = QueryStats(slow_query_ms=50, max_statements=2)
+    for i in range(3):
+        stats.record(f"SELECT * FROM a WHERE id = {i}", 10.0, 1, "/a")
+    with caplog.at_level(logging.WARNING, logger="app.query_tracing.slow"):
+        stats.record("SELECT * FROM b", 80.0, 100, "/b")
+    assert "Consulta lenta (80.0 ms, filas=100, ruta=/b" in caplog.text
+
+    top = stats.top(10)
+    assert [(t["statement"], t["calls"], t["total_ms"]) for t in top] == [
+        ("SELECT * FROM b", 1, 80.0),
+        ("SELECT * FROM a WHERE id = ?", 3, 30.0),
+    ]
+    assert top[1]["mean_ms"] == 10.0 and top[1]["routes"] == {"/a": 3}
+    assert stats.top(1, order_by="calls")[0]["calls"] == 3
+    assert [q["route"] for q in stats.slow_queries()] == ["/b"]
+
+    stats.record("SELECT * FROM c", 1.0, 0, NO_ROUTE)
+    assert len(stats.top(10)) == 2 and "SELECT * FROM a WHERE id = ?" not in {t["statement"] for t in stats.top(10)}
+
+
+def test_engine_queries_are_tagged_with_the_calling_route(tmp_path):
+    """Las sentencias del engine quedan asociadas a la plantilla de la ruta que las ejecutó"""
+    stats = QueryStats(slow_query_ms=10_000)
+    engine = create_engine(f"sqlite:///{tmp_path / 'tracing.db'}")
+    instrument_engine(engine, stats, enabled=True)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (id, name) VALUES (1, 'a'), (2, 'b'), (3, 'c')"))
+
+    app = FastAPI()
+    app.add_middleware(QueryRouteMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        with engine.connect() as conn:
+            return {"n": len(conn.execute(text("SELECT * FROM items WHERE id <= :id"), {"id": item_id}).all())}
+
+    client = TestClient(app)
+    assert client.get("/items/2").json() == {"n": 2}
+    assert client.get("/items/3").json() == {"n": 3}
+
+    select_stat = next(t for t in stats.top(10) if t["statement"].startswith("SELECT"))
+    assert select_stat["calls"] == 2
+    assert select_stat["routes"] == {"/items/{item_id}": 2}
+    create_stat = next(t for t in stats.top(10) if t["statement"].startswith("CREATE"))
+    assert create_stat["routes"] == {NO_ROUTE: 1}
+
+
+def test_debug_routes_require_a_configured_admin_token(monkeypatch):
+    """/debug/queries no se registra sin ADMIN_TOKEN y, registrada, exige el token"""
+    from app.api import app, debug_router
+
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert TestClient(app).get("/api/v1/debug/queries").status_code == 404
+
+    debug_app = FastAPI()
+    debug_app.include_router(debug_router)
+    client = TestClient(debug_app)
+    assert client.get("/api/v1/debug/queries").status_code == 404
+    assert client.delete("/api/v1/debug/queries").status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secreto")
+    assert client.get("/api/v1/debug/queries").status_code == 403
+    assert client.delete("/api/v1/debug/queries", headers={"X-Admin-Token": "otro"}).status_code == 403
+    response = client.get("/api/v1/debug/queries", headers={"X-Admin-Token": "secreto"})
+    assert response.status_code == 200 and "top" in response.json()
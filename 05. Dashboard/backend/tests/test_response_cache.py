@@ -0,0 +1,105 @@
+"""
+Pruebas de la caché de respuestas con ETag
+"""
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.response_cache import (
+    DataVersion, MemoryBackend, ResponseCache, ResponseCacheMiddleware, SQLiteBackend, etag_matches,
+)
+
+
+def build_app(cache: ResponseCache):
+    """App con un endpoint cacheable que cuenta sus ejecuciones"""
+    app = FastAPI()
+    calls = {"summary": 0, "live": 0}
+
+    @app.get("/summary")
+    async def summary(n: int = 0, m: int = 0):
+        calls["summary"] += 1
+        # El contenido cambia cada dos versiones de los datos
+        return {"n": n, "m": m, "version": cache.data_version.read()[1] // 2}
+
+    @app.get("/live")
+    async def live(response: Response):
+        calls["live"] += 1
+        response.headers["Cache-Control"] = "no-store"
+        return {"calls": calls["live"]}
+
+    app.add_middleware(ResponseCacheMiddleware, cache=cache, paths=["/summary", "/live"])
+    return TestClient(app), calls
+
+
+def test_hits_skip_the_endpoint_and_etag_gives_304():
+    """Segundo GET desde la caché; If-None-Match con el ETag vigente devuelve 304"""
+    cache = ResponseCache(MemoryBackend(), DataVersion(None))
+    client, calls = build_app(cache)
+
+    first = client.get("/summary?n=1&m=2")
+    assert first.status_code == 200 and first.headers["x-cache"] == "MISS"
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and first.headers["cache-control"] == "no-cache"
+
+    second = client.get("/summary?m=2&n=1")
+    assert second.headers["x-cache"] == "HIT" and second.json() == first.json()
+    assert second.headers["etag"] == etag and calls["summary"] == 1
+
+    not_modified = client.get("/summary?n=1&m=2", headers={"If-None-Match": f'W/{etag}, "otro"'})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert calls["summary"] == 1 and cache.stats()["not_modified"] == 1
+
+    assert client.get("/live").json() == {"calls": 1}
+    assert client.get("/live").json() == {"calls": 2}
+    assert "etag" not in client.get("/live").headers
+
+
+def test_data_version_bump_invalidates_and_changes_the_etag():
+    """Tras un cambio de datos se recalcula y el ETag anterior ya no da 304"""
+    cache = ResponseCache(MemoryBackend(), DataVersion(None))
+    client, calls = build_app(cache)
+    etag = client.get("/summary").headers["etag"]
+
+    cache.data_version.bump()
+    response = client.get("/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["x-cache"] == "MISS"
+    assert response.headers["etag"] != etag and calls["summary"] == 2
+    assert not etag_matches(None, etag) and etag_matches("*", etag)
+
+
+def test_version_file_keeps_its_size_and_never_repeats_after_deletion(tmp_path):
+    """El archivo se reemplaza en cada bump; si se borra, la versión nueva no coincide con ninguna anterior"""
+    path = tmp_path / "data_version"
+    version = DataVersion(path)
+    seen = {version.get()}
+    for _ in range(20):
+        seen.add(version.bump())
+    # Identificador y contador, no un byte por cambio
+    assert path.stat().st_size < 64 and version.read()[1] == 20
+
+    path.unlink()
+    restarted = DataVersion(path)
+    assert restarted.get() not in seen
+    seen.add(restarted.get())
+    assert restarted.bump() not in seen and version.get() == restarted.get()
+
+    path.write_text("corrupto")
+    assert version.get() not in seen
+
+
+def test_sqlite_backend_and_version_file_are_shared_between_workers(tmp_path):
+    """Dos workers con el backend sqlite y el mismo archivo de versión comparten respuestas"""
+    def worker():
+        return ResponseCache(SQLiteBackend(tmp_path / "cache.sqlite3"), DataVersion(tmp_path / "data_version"))
+
+    client_a, calls_a = build_app(worker())
+    client_b, calls_b = build_app(worker())
+
+    etag = client_a.get("/summary?n=5").headers["etag"]
+    response = client_b.get("/summary?n=5")
+    assert response.headers["x-cache"] == "HIT" and response.headers["etag"] == etag
+    assert (calls_a["summary"], calls_b["summary"]) == (1, 0)
+
+    # Un cambio publicado desde otro proceso (p. ej. seed_data) invalida en ambos
+    DataVersion(tmp_path / "data_version").bump()
+    assert client_b.get("/summary?n=5").headers["x-cache"] == "MISS"
+    assert client_a.get("/summary?n=5").headers["x-cache"] == "HIT"
@@ -0,0 +1,97 @@
+"""
+Pruebas del subsistema de snapshots de métricas
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Response
+from sqlalchemy.dialects import postgresql
+
+from app.api import app  # registra los builders de los endpoints
+from app.database import MetricSnapshot
+from app.snapshot import (
+    SNAPSHOT_BUILDERS, snapshot_key, apply_snapshot_headers, schedule_refresh, get_snapshot,
+    snapshot_builder, CHANGE_PROBABILITY, CHANGE_STATUS,
+)
+
+
+def test_snapshot_key_is_stable():
+    """La clave no depende del orden de los parámetros"""
+    assert snapshot_key("metrics_summary", {}) == "metrics_summary"
+    assert snapshot_key("heatmap", {"x_var": "age", "y_var": "segment"}) == \
+        snapshot_key("heatmap", {"y_var": "segment", "x_var": "age"})
+
+
+def test_read_endpoints_register_builders():
+    """Cada endpoint de lectura declara de qué cambios depende su snapshot"""
+    assert CHANGE_STATUS in SNAPSHOT_BUILDERS["metrics_summary"][1]
+    assert CHANGE_PROBABILITY in SNAPSHOT_BUILDERS["probability_distribution"][1]
+    # El cubo se mantiene con deltas; write_batch no toca demographics.probability
+    assert SNAPSHOT_BUILDERS["heatmap"][1] == ()
+
+
+def test_snapshot_headers_report_staleness():
+    """Las cabeceras informan antigüedad y si el snapshot está invalidado"""
+    row = MetricSnapshot(key="metrics_summary", dirty=True,
+                         refreshed_at=datetime.now() - timedelta(seconds=5))
+    response = Response()
+    apply_snapshot_headers(response, row)
+    assert float(response.headers["X-Snapshot-Age"]) >= 5
+    assert response.headers["X-Snapshot-Stale"] == "true"
+
+
+def test_schedule_refresh_without_event_loop():
+    """Desde código síncrono no falla aunque no haya event loop"""
+    schedule_refresh()
+
+
+class UpsertRecorder:
+    """Sesión mínima: devuelve una fila sucia y registra el upsert posterior"""
+
+    def __init__(self, row, upsert_applies):
+        self.row = row
+        self.upsert_applies = upsert_applies
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        session = self
+
+        class Result:
+            def scalars(self):
+                return self
+
+            def first(self):
+                if len(session.statements) == 1:
+                    return session.row
+                return ("key",) if session.upsert_applies else None
+
+        return Result()
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("upsert_applies", [True, False])
+async def test_inline_rebuild_only_clears_the_generation_it_read(upsert_applies):
+    """El recálculo en línea no marca limpio un snapshot invalidado de nuevo durante el cálculo"""
+    snapshot_builder("test_counter", depends_on=(CHANGE_STATUS,))(lambda db: _payload())
+    row = MetricSnapshot(key="test_counter", payload="{}", dirty=True, generation=7,
+                         refreshed_at=datetime.now() - timedelta(hours=1))
+    db = UpsertRecorder(row, upsert_applies)
+    try:
+        payload, stored = await get_snapshot(db, "test_counter")
+    finally:
+        SNAPSHOT_BUILDERS.pop("test_counter")
+
+    upsert = db.statements[1].compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT (key) DO UPDATE" in str(upsert)
+    assert "WHERE metric_snapshots.generation = " in str(upsert)
+    assert 7 in upsert.params.values()
+    assert payload == {"n": 1}
+    assert stored.dirty is not upsert_applies
+
+
+async def _payload():
+    return {"n": 1}